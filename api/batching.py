@@ -0,0 +1,185 @@
+import threading
+import queue
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    """A single caller's texts waiting to be merged into a batch."""
+
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Coalesce concurrent prediction requests into a single model call.
+
+    Callers block in ``submit`` while a background thread collects requests
+    for up to ``max_wait_ms`` milliseconds (or until ``max_batch_size`` texts
+    are queued), runs ``predict_fn`` once over the merged texts and hands
+    every caller back its own slice of the results.
+
+    With ``max_concurrent_batches`` > 1 up to that many batches run at the
+    same time (e.g. one per inference worker process); while all of them are
+    busy, new requests keep accumulating into the next batch.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[str]], List],
+        max_batch_size: int = 128,
+        max_wait_ms: float = 5.0,
+        queue_depth_gauge=None,
+        batch_size_histogram=None,
+        wait_time_histogram=None,
+        max_concurrent_batches: int = 1,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_concurrent_batches < 1:
+            raise ValueError("max_concurrent_batches must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.queue_depth_gauge = queue_depth_gauge
+        self.batch_size_histogram = batch_size_histogram
+        self.wait_time_histogram = wait_time_histogram
+        self.max_concurrent_batches = max_concurrent_batches
+
+        self._queue = queue.Queue()
+        self._carry: Optional[_PendingRequest] = None
+        self._worker: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._batch_slots = threading.BoundedSemaphore(max_concurrent_batches)
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        """Start the batching thread if it is not running yet."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped = False
+                if self.max_concurrent_batches > 1:
+                    self._executor = ThreadPoolExecutor(self.max_concurrent_batches, thread_name_prefix="predict-batch")
+                self._worker = threading.Thread(target=self._run, name="predict-batcher", daemon=True)
+                self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the batching thread after draining queued requests."""
+        with self._lock:
+            self._stopped = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(None)
+            worker.join(timeout)
+
+    def submit(self, texts: List[str], timeout: Optional[float] = None) -> List:
+        """Queue texts for prediction and wait for this caller's results."""
+        if not texts:
+            raise ValueError("Empty text list provided")
+        self.start()
+        request = _PendingRequest(list(texts))
+        self._queue.put(request)
+        self._update_queue_depth()
+        return request.future.result(timeout=timeout)
+
+    def _update_queue_depth(self):
+        if self.queue_depth_gauge is not None:
+            self.queue_depth_gauge.set(self._queue.qsize() + (1 if self._carry is not None else 0))
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[_PendingRequest]:
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        first = self._next_request(timeout=None)
+        if first is None:
+            return []
+
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            request = self._next_request(timeout=remaining)
+            if request is None:
+                break
+            if size + len(request.texts) > self.max_batch_size:
+                # Keep the request for the next batch instead of overfilling this one
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free batch slot first so requests pile up while all slots are busy
+            self._batch_slots.acquire()
+            batch = self._collect_batch()
+            self._update_queue_depth()
+            if batch:
+                self._dispatch(batch)
+            else:
+                self._batch_slots.release()
+            if self._stopped and self._queue.empty() and self._carry is None:
+                break
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _dispatch(self, batch: List[_PendingRequest]):
+        if self._executor is None:
+            try:
+                self._process(batch)
+            finally:
+                self._batch_slots.release()
+            return
+        future = self._executor.submit(self._process, batch)
+        future.add_done_callback(lambda _: self._batch_slots.release())
+
+    def _process(self, batch: List[_PendingRequest]):
+        merged = [text for request in batch for text in request.texts]
+        started = time.perf_counter()
+
+        if self.batch_size_histogram is not None:
+            self.batch_size_histogram.observe(len(merged))
+        if self.wait_time_histogram is not None:
+            for request in batch:
+                self.wait_time_histogram.observe(started - request.enqueued_at)
+
+        try:
+            results = self.predict_fn(merged)
+            if len(results) != len(merged):
+                raise RuntimeError(
+                    f"Batch prediction returned {len(results)} results for {len(merged)} texts"
+                )
+        except Exception as e:
+            logger.error(f"Batched prediction failed for {len(batch)} requests: {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        logger.debug(f"Batched {len(batch)} requests ({len(merged)} texts) in one model call")
+        offset = 0
+        for request in batch:
+            end = offset + len(request.texts)
+            request.future.set_result(list(results[offset:end]))
+            offset = end
@@ -0,0 +1,153 @@
+import io
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from preprocessing.storage import extract_year, read_dataset, resolve_path
+
+logger = logging.getLogger(__name__)
+
+YEAR_COLUMNS = ("year", "Tahun")
+TOPIC_COLUMNS = ("topics", "topic", "Topic")
+YEAR_KEY = "__year__"
+
+
+def _first_present(df: pd.DataFrame, candidates) -> Optional[str]:
+    for column in candidates:
+        if column in df.columns:
+            return column
+    return None
+
+
+class CachedDataset:
+    """A parsed dataset kept in memory and reloaded only when the file changes.
+
+    ``path`` goes through ``resolve_path`` on every check, so a Parquet copy
+    written next to the legacy file is picked up without a restart.
+    """
+
+    def __init__(self, path: str, reader: Callable[[str], pd.DataFrame] = read_dataset,
+                 resolver: Callable[[str], str] = resolve_path):
+        self.path = path
+        self.reader = reader
+        self.resolver = resolver
+        self._frame: Optional[pd.DataFrame] = None
+        self._signature: Optional[Tuple[int, int, str]] = None
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Optional[Tuple[int, int, str]]:
+        path = self.resolver(self.path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, path
+
+    def get(self) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        """Return ``(frame, version)``, or ``(None, None)`` if the file does not exist."""
+        signature = self._stat()
+        if signature is None:
+            return None, None
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    frame = self.reader(signature[2])
+                    year_column = _first_present(frame, YEAR_COLUMNS)
+                    if year_column is not None:
+                        frame[YEAR_KEY] = extract_year(frame[year_column])
+                    self._frame, self._signature = frame, signature
+                    logger.info(f"Loaded {len(frame)} records from {signature[2]}")
+        frame, signature = self._frame, self._signature
+        return frame, f"{signature[0]}-{signature[1]}"
+
+
+def public_columns(df: pd.DataFrame) -> List[str]:
+    return [column for column in df.columns if column != YEAR_KEY]
+
+
+def select(df: pd.DataFrame, columns: Optional[List[str]] = None, year: Optional[int] = None,
+           topic: Optional[int] = None) -> pd.DataFrame:
+    """Apply server-side filters and column projection. Raises ValueError on bad input."""
+    if year is not None:
+        if YEAR_KEY not in df.columns:
+            raise ValueError("Dataset has no year column")
+        df = df[df[YEAR_KEY] == year]
+    if topic is not None:
+        topic_column = _first_present(df, TOPIC_COLUMNS)
+        if topic_column is None:
+            raise ValueError("Dataset has no topic column")
+        df = df[pd.to_numeric(df[topic_column], errors="coerce") == topic]
+
+    available = public_columns(df)
+    if columns:
+        unknown = [column for column in columns if column not in available]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        return df[columns]
+    return df[available]
+
+
+def query_fingerprint(columns: Optional[List[str]] = None, year: Optional[int] = None,
+                      topic: Optional[int] = None) -> str:
+    """Short hash of the filters and projection a cursor was issued for."""
+    raw = json.dumps({"c": columns or None, "y": year, "t": topic}, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def encode_cursor(offset: int, version: str, query: str) -> str:
+    raw = json.dumps({"o": offset, "v": version, "q": query}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, query: str) -> Tuple[int, str]:
+    """Return ``(offset, version)``; raises ValueError if the cursor belongs to another query."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset, version, cursor_query = int(data["o"]), str(data["v"]), str(data["q"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_query != query:
+        raise ValueError("Cursor was issued for different filters or columns")
+    return offset, version
+
+
+def to_records(df: pd.DataFrame) -> List[dict]:
+    """JSON-safe records (NaN becomes null)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def iter_ndjson(df: pd.DataFrame, chunk_size: int = 1000) -> Iterator[bytes]:
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+        if text and not text.endswith("\n"):
+            text += "\n"
+        yield text.encode("utf-8")
+
+
+def iter_arrow(df: pd.DataFrame, chunk_size: int = 10000) -> Iterator[bytes]:
+    """Stream the frame as Arrow IPC record batches (requires pyarrow)."""
+    # Imported eagerly so a missing pyarrow fails before the response starts
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+    def generate():
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+        for start in range(0, len(df), chunk_size):
+            batch = pa.RecordBatch.from_pandas(df.iloc[start:start + chunk_size], schema=schema, preserve_index=False)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        writer.close()
+        yield sink.getvalue()
+
+    return generate()
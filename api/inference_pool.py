@@ -0,0 +1,170 @@
+import gc
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of a pool worker, set by _init_worker
+_worker_state = {}
+
+
+def _init_worker(predict_fn, restore_fn, snapshot, threads: int):
+    _worker_state["predict_fn"] = predict_fn
+    if threads:
+        # ONNX Runtime sessions are created lazily in the worker and read this
+        os.environ.setdefault("ONNX_INTRA_OP_THREADS", str(threads))
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except (ImportError, AttributeError):
+            pass
+    # No-op for forked workers, which already hold the parent's model
+    restore_fn(snapshot)
+
+
+def _worker_predict(texts: List[str], predict_fn=None, args=()) -> List:
+    return (predict_fn or _worker_state["predict_fn"])(texts, *args)
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+class InferencePool:
+    """Run predictions in worker processes that share the parent's loaded model.
+
+    ``snapshot_fn`` runs in the parent before workers start; it makes sure the
+    model is loaded and returns ``(version, ...)`` describing it. With the
+    ``fork`` start method the workers inherit the model copy-on-write (the
+    garbage collector is frozen first so it does not touch, and thereby copy,
+    the inherited pages, and unfrozen again once they are up so replaced
+    models can still be collected); other start methods call
+    ``restore_fn(snapshot)`` in each worker to load the same version. When
+    the parent's version changes (hot swap or rollback) ``refresh`` re-forks
+    the pool; a call that sees the new version first waits for that instead
+    of forking itself.
+
+    Every fork runs on the pool's own thread, never on a request or
+    model-loader thread, so forks are serialized and the forking thread
+    holds no other lock. The other threads alive at fork time (uvicorn,
+    micro-batchers, prediction cache, job manager) only take their own
+    locks, which workers never use; the locks a worker does take (lazy
+    bundle components, embedding and ONNX caches) are only held in the
+    parent while a model is loaded, which has finished before the registry
+    notifies its swap listeners. Logging re-creates its locks after fork.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[str]], List], snapshot_fn: Callable[[], Tuple[Hashable, ...]],
+                 restore_fn: Callable[[Tuple], None], workers: int = 2, start_method: str = "fork",
+                 threads_per_worker: int = 1):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.predict_fn = predict_fn
+        self.snapshot_fn = snapshot_fn
+        self.restore_fn = restore_fn
+        self.workers = workers
+        self.start_method = start_method
+        self.threads_per_worker = threads_per_worker
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._snapshot: Optional[Tuple] = None
+        # Guards _executor/_snapshot; (re)forking itself is serialized on the owner thread
+        self._lock = threading.Lock()
+        self._owner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-pool")
+        self._owner_thread: Optional[threading.Thread] = None
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot[0] if snapshot is not None else None
+
+    def _on_owner(self, fn: Callable):
+        """Run ``fn`` on the pool's own thread and wait for it (inline if already there)."""
+        if threading.current_thread() is self._owner_thread:
+            return fn()
+
+        def run():
+            self._owner_thread = threading.current_thread()
+            return fn()
+
+        return self._owner.submit(run).result()
+
+    def _create_executor(self, snapshot) -> ProcessPoolExecutor:
+        if self.start_method == "fork":
+            gc.collect()
+            gc.freeze()
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.predict_fn, self.restore_fn, snapshot, self.threads_per_worker),
+            )
+            # Start every worker now, while the parent is in a known state
+            for future in [executor.submit(_worker_ready) for _ in range(self.workers)]:
+                future.result()
+        finally:
+            if self.start_method == "fork":
+                # The workers keep their frozen copy; the parent must be able to free replaced models
+                gc.unfreeze()
+        logger.info(f"Started {self.workers} inference workers ({self.start_method}) for model {snapshot[0]}")
+        return executor
+
+    def _sync_executor(self) -> ProcessPoolExecutor:
+        # Runs on the owner thread
+        snapshot = self.snapshot_fn()
+        executor = self._executor
+        if executor is None or self._snapshot is None or self._snapshot[0] != snapshot[0]:
+            executor = self._create_executor(snapshot)
+            with self._lock:
+                previous, self._executor, self._snapshot = self._executor, executor, snapshot
+            if previous is not None:
+                # Batches already queued on the old workers still complete
+                previous.shutdown(wait=False)
+        return executor
+
+    def _current_executor(self) -> ProcessPoolExecutor:
+        snapshot = self.snapshot_fn()
+        executor = self._executor
+        if executor is not None and self._snapshot is not None and self._snapshot[0] == snapshot[0]:
+            return executor
+        # Normally a swap is re-forking the pool already; this queues behind it on the owner thread
+        return self._on_owner(self._sync_executor)
+
+    def start(self):
+        """Load the model and fork the workers ahead of the first request."""
+        self._current_executor()
+
+    def refresh(self):
+        """Re-fork a started pool if the parent's model version changed; run on every registry swap."""
+        def run():
+            if self._executor is not None:
+                self._sync_executor()
+
+        self._on_owner(run)
+
+    def predict(self, texts: List[str], predict_fn: Optional[Callable] = None, args: Tuple = ()) -> List:
+        """Run ``predict_fn(texts, *args)`` (default: the pool's predict_fn) in a worker.
+
+        ``predict_fn`` must be a module-level function so it can be sent to the worker.
+        """
+        executor = self._current_executor()
+        try:
+            return executor.submit(_worker_predict, list(texts), predict_fn, tuple(args)).result()
+        except BrokenProcessPool:
+            logger.error("Inference worker died, the pool will be restarted on the next request")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor, self._snapshot = None, None
+            raise
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor, self._snapshot = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
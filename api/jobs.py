@@ -0,0 +1,369 @@
+import io
+import os
+import sys
+import time
+import uuid
+import runpy
+import inspect
+import logging
+import importlib
+import threading
+import contextlib
+import multiprocessing
+import queue as queue_module
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stage name -> ("script", path run as __main__) or ("function", "module:callable" returning a truthy result).
+# Functions receive the job parameters they accept as keyword arguments, and a ``progress`` callback if they take one.
+STAGES = {
+    "scrape": ("script", os.path.join(ROOT_DIR, "preprocessing", "scraping.py")),
+    "preprocess": ("script", os.path.join(ROOT_DIR, "preprocessing", "preprocessing.py")),
+    "train": ("function", "model.retrain_model:retrain_model"),
+    "update": ("function", "model.incremental:update_model"),
+    "predict": ("function", "model.batch_predict:predict_dataset"),
+}
+JOB_KINDS = {
+    "scrape": ["scrape", "preprocess"],
+    "preprocess": ["preprocess"],
+    "train": ["train"],
+    # Fold new documents into the current model; refits fully past the drift thresholds
+    "update": ["update"],
+    "predict": ["predict"],
+    # Retrain, then relabel the corpus with the new model
+    "relabel": ["train", "predict"],
+}
+# Imported once when the worker starts so the first job does not pay for them
+PRELOAD_MODULES = ("pandas", "pyarrow", "nltk", "crawl4ai", "bertopic")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class Job:
+    """One submitted pipeline run and its progress."""
+
+    __slots__ = ("id", "kind", "stages", "params", "status", "stage", "error", "progress", "result", "events",
+                 "created_at", "started_at", "finished_at")
+
+    def __init__(self, kind: str, stages: List[str], params: Optional[Dict] = None, max_events: int = 200):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.stages = stages
+        self.params = dict(params or {})
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.progress: Optional[Dict] = None
+        self.result = None
+        self.events = deque(maxlen=max_events)
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE_STATES
+
+    def describe(self, events: bool = False) -> Dict:
+        info = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stages": self.stages,
+            "params": self.params,
+            "stage": self.stage,
+            "error": self.error,
+            "progress": self.progress,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if events:
+            info["events"] = list(self.events)
+        return info
+
+
+class _EventWriter(io.TextIOBase):
+    """stdout replacement in the worker that forwards every printed line as a progress event."""
+
+    def __init__(self, events, job_id: str, passthrough):
+        self.events = events
+        self.job_id = job_id
+        self.passthrough = passthrough
+        self._buffer = ""
+
+    def write(self, text: str) -> int:
+        self.passthrough.write(text)
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.events.put({"job_id": self.job_id, "type": "log", "message": line, "time": time.time()})
+        return len(text)
+
+    def flush(self):
+        self.passthrough.flush()
+
+
+class _EventLogHandler(logging.Handler):
+    def __init__(self, events, job_id: str):
+        super().__init__(level=logging.INFO)
+        self.events = events
+        self.job_id = job_id
+
+    def emit(self, record):
+        self.events.put({"job_id": self.job_id, "type": "log", "message": record.getMessage(), "time": time.time()})
+
+
+def _run_stage(kind: str, target: str, params: Dict, progress: Callable):
+    if kind == "script":
+        try:
+            runpy.run_path(target, run_name="__main__")
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError(f"{os.path.basename(target)} exited with status {e.code}")
+        return None
+    module_name, function_name = target.split(":")
+    function = getattr(importlib.import_module(module_name), function_name)
+    accepted = inspect.signature(function).parameters
+    kwargs = {key: value for key, value in params.items() if key in accepted}
+    if "progress" in accepted:
+        kwargs["progress"] = progress
+    result = function(**kwargs)
+    if not result:
+        raise RuntimeError(f"{target} reported failure")
+    return result
+
+
+def _worker_main(tasks, events, preload):
+    """Persistent job worker: imports stay warm between jobs."""
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+    events.put({"type": "ready", "pid": os.getpid()})
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id = task["job_id"]
+        handler = _EventLogHandler(events, job_id)
+        logging.getLogger().addHandler(handler)
+
+        def progress(**fields):
+            events.put({"job_id": job_id, "type": "progress", "progress": fields, "time": time.time()})
+
+        try:
+            result = None
+            with contextlib.redirect_stdout(_EventWriter(events, job_id, sys.__stdout__)):
+                for stage, kind, target in task["stages"]:
+                    events.put({"job_id": job_id, "type": "stage", "stage": stage, "time": time.time()})
+                    result = _run_stage(kind, target, task["params"], progress)
+            if not isinstance(result, (dict, list, str, int, float)):
+                result = None
+            events.put({"job_id": job_id, "type": "finished", "result": result, "time": time.time()})
+        except BaseException as e:
+            events.put({"job_id": job_id, "type": "failed", "error": f"{type(e).__name__}: {e}", "time": time.time()})
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+
+class JobManager:
+    """Run pipeline jobs one at a time in a persistent worker process.
+
+    Submitting a kind (with the same parameters) that is already queued or
+    running returns the existing job instead of starting an overlapping run. Queued jobs are cancelled by
+    dropping them; a running job is cancelled by terminating the worker,
+    which is then restarted for the next job.
+    """
+
+    def __init__(self, job_kinds: Dict[str, List[str]] = None, stages: Dict[str, tuple] = None,
+                 start_method: str = "spawn",
+                 preload=PRELOAD_MODULES, max_history: int = 100,
+                 on_finish: Optional[Callable[[Job], None]] = None):
+        self.job_kinds = job_kinds or JOB_KINDS
+        self.stages = stages or STAGES
+        self.preload = tuple(preload)
+        self.max_history = max_history
+        self.on_finish = on_finish
+        self._context = multiprocessing.get_context(start_method)
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = deque()
+        self._running: Optional[Job] = None
+        self._lock = threading.RLock()
+        self._process = None
+        self._tasks = None
+        self._events = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def _start_worker(self):
+        self._tasks = self._context.Queue()
+        self._events = self._context.Queue()
+        self._process = self._context.Process(target=_worker_main, args=(self._tasks, self._events, self.preload),
+                                              name="pipeline-job-worker", daemon=True)
+        self._process.start()
+        listener = threading.Thread(target=self._listen, args=(self._process, self._events),
+                                    name="pipeline-job-events", daemon=True)
+        self._listener = listener
+        listener.start()
+        logger.info(f"Started pipeline job worker (pid {self._process.pid})")
+
+    def start(self):
+        with self._lock:
+            self._stopped = False
+            if self._process is None or not self._process.is_alive():
+                self._start_worker()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            self._stopped = True
+            process, tasks = self._process, self._tasks
+            self._process = None
+        if process is not None and process.is_alive():
+            tasks.put(None)
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def submit(self, kind: str, params: Optional[Dict] = None):
+        """Queue a job of ``kind``; returns ``(job, created)``."""
+        if kind not in self.job_kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        params = dict(params or {})
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.params == params and not job.done:
+                    return job, False
+            job = Job(kind, list(self.job_kinds[kind]), params)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._trim_history()
+            self.start()
+            self._dispatch_next()
+            return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job. Raises KeyError for unknown ids."""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.done:
+                return job
+            if job.status == QUEUED:
+                self._pending.remove(job)
+                self._finish(job, CANCELLED)
+                return job
+            # Running: the worker is mid-script, so stop it and start a fresh one
+            process = self._process
+            self._process = None
+            self._finish(job, CANCELLED)
+        if process is not None:
+            process.terminate()
+            process.join(5)
+        with self._lock:
+            if not self._stopped:
+                self._start_worker()
+                self._dispatch_next()
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Job:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self._jobs[job_id]
+        while not job.done:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        return job
+
+    def _trim_history(self):
+        while len(self._jobs) > self.max_history:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job.done), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def _dispatch_next(self):
+        if self._running is not None or not self._pending or self._process is None:
+            return
+        job = self._pending.popleft()
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._running = job
+        self._tasks.put({"job_id": job.id, "stages": [(stage, *self.stages[stage]) for stage in job.stages],
+                         "params": job.params})
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if self._running is job:
+            self._running = None
+        logger.info(f"Job {job.id} ({job.kind}) {status}" + (f": {error}" if error else ""))
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.warning(f"Job completion callback failed: {e}")
+
+    def _listen(self, process, events):
+        while True:
+            try:
+                event = events.get(timeout=1.0)
+            except queue_module.Empty:
+                if process.is_alive():
+                    continue
+                with self._lock:
+                    if self._process is process:
+                        # The worker died on its own (crash, OOM kill)
+                        job = self._running
+                        if job is not None:
+                            self._finish(job, FAILED, f"Job worker exited with code {process.exitcode}")
+                        self._process = None
+                        # Restarted lazily otherwise, so a worker that cannot start does not loop
+                        if not self._stopped and self._pending:
+                            self._start_worker()
+                            self._dispatch_next()
+                return
+            except (EOFError, OSError):
+                return
+            self._handle_event(process, event)
+
+    def _handle_event(self, process, event: Dict):
+        with self._lock:
+            if self._process is not process:
+                return
+            job = self._jobs.get(event.get("job_id"))
+            if job is None or job.done:
+                return
+            if event["type"] == "progress":
+                # Only the latest progress is kept, so frequent updates do not push logs out of the event buffer
+                job.progress = event["progress"]
+                return
+            job.events.append({key: value for key, value in event.items() if key not in ("job_id", "result")})
+            if event["type"] == "stage":
+                job.stage = event["stage"]
+            elif event["type"] == "finished":
+                job.result = event.get("result")
+                self._finish(job, SUCCEEDED)
+                self._dispatch_next()
+            elif event["type"] == "failed":
+                self._finish(job, FAILED, event.get("error"))
+                self._dispatch_next()
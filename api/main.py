@@ -1,14 +1,23 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from prometheus_fastapi_instrumentator import Instrumentator
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
-import subprocess
-import pandas as pd
 import os
 import time
+import uuid
+import secrets
 import logging
-from model.predict import predict_topic
+from model.predict import (predict_topic, predict_topic_scores, model_snapshot, restore_model, get_active_slot,
+                           default_model_path, registry as model_registry, FAST_INFERENCE, FAST_INFERENCE_MIN_SIMILARITY,
+                           EMBEDDING_BACKEND, ONNX_EMBEDDING_DIR)
+from api.batching import MicroBatcher
+from api.inference_pool import InferencePool
+from api.jobs import JobManager, FAILED
+from api.prediction_cache import PredictionCache, settings_fingerprint
+from api import dataset as data_store
+from preprocessing.storage import resolve_path
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +33,13 @@ instrumentator.instrument(app).expose(app)
 model_predictions_total = Counter('model_predictions_total', 'Total number of model predictions')
 model_prediction_errors_total = Counter('model_prediction_errors_total', 'Total number of model prediction errors')
 model_prediction_duration = Histogram('model_prediction_duration_seconds', 'Time spent on model predictions')
+prediction_queue_depth = Gauge('model_prediction_queue_depth', 'Number of prediction requests waiting to be batched')
+prediction_batch_size = Histogram('model_prediction_batch_size', 'Number of texts per batched model call',
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+prediction_batch_wait = Histogram('model_prediction_batch_wait_seconds', 'Time a request waits before its batch runs',
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+prediction_cache_hits_total = Counter('model_prediction_cache_hits_total', 'Texts answered from the prediction cache')
+prediction_cache_misses_total = Counter('model_prediction_cache_misses_total', 'Texts not found in the prediction cache')
 model_accuracy = Gauge('model_accuracy', 'Current model accuracy')
 scraping_requests_total = Counter('scraping_requests_total', 'Total number of scraping requests')
 scraping_errors_total = Counter('scraping_errors_total', 'Total number of scraping errors')
@@ -31,51 +47,322 @@ scraping_errors_total = Counter('scraping_errors_total', 'Total number of scrapi
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 DATA_PATH = os.path.join(BASE_DIR, "../data/cleaned/cleaned_data.csv") 
-SCRAPING_PATH = os.path.join(BASE_DIR, "../preprocessing/scraping.py") 
-PREPROCESSING_PATH = os.path.join(BASE_DIR, "../preprocessing/preprocessing.py")
+MODEL_DIR = os.path.realpath(os.path.join(BASE_DIR, "../model"))
+DATA_DIR = os.path.realpath(os.path.join(BASE_DIR, "../data"))
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+# Largest NDJSON body accepted by /jobs/predict/upload
+PREDICT_UPLOAD_MAX_BYTES = int(os.environ.get("PREDICT_UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
 
-@app.post("/scrape")
-def run_scraping(background_tasks: BackgroundTasks):
-    """Menjalankan proses scraping secara asynchronous."""
-    scraping_requests_total.inc()
-    
-    def scrape():
+# Parsed dataset (Parquet copy preferred), reloaded only when the file changes on disk
+cleaned_dataset = data_store.CachedDataset(DATA_PATH)
+
+# Token protecting the /admin endpoints; they are disabled (403) while it is unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Micro-batching configuration for /predict
+PREDICT_BATCHING_ENABLED = os.environ.get("PREDICT_BATCHING_ENABLED", "1") == "1"
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "128"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "5"))
+# Largest top_k accepted by /predict; top-k batches always compute this many alternatives
+PREDICT_MAX_TOP_K = int(os.environ.get("PREDICT_MAX_TOP_K", "10"))
+
+# Cache of prediction results per (model version, normalized text)
+PREDICTION_CACHE_ENABLED = os.environ.get("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", "3600"))
+# SQLite file keeping cached predictions across restarts; empty keeps the cache in memory only
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH", "")
+# Row cap of the SQLite file, shared by every model version stored in it
+PREDICTION_CACHE_DISK_MAX_ROWS = int(os.environ.get("PREDICTION_CACHE_DISK_MAX_ROWS", "100000"))
+
+# Inference worker processes sharing the loaded model (0 = predict in the API process)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+INFERENCE_START_METHOD = os.environ.get("INFERENCE_START_METHOD", "fork")
+INFERENCE_THREADS_PER_WORKER = int(os.environ.get("INFERENCE_THREADS_PER_WORKER", "1"))
+
+inference_pool = InferencePool(
+    predict_topic,
+    model_snapshot,
+    restore_model,
+    workers=INFERENCE_WORKERS,
+    start_method=INFERENCE_START_METHOD,
+    threads_per_worker=INFERENCE_THREADS_PER_WORKER,
+) if INFERENCE_WORKERS > 0 else None
+if inference_pool is not None:
+    # Re-fork the workers as soon as a version is swapped in, not on the request after it
+    model_registry.add_swap_listener(lambda slot: inference_pool.refresh())
+
+def run_prediction(texts: List[str]) -> List[str]:
+    if inference_pool is not None:
+        return inference_pool.predict(texts)
+    return predict_topic(texts)
+
+def run_scored_prediction(texts: List[str]) -> List[dict]:
+    if inference_pool is not None:
+        return inference_pool.predict(texts, predict_topic_scores, (PREDICT_MAX_TOP_K,))
+    return predict_topic_scores(texts, PREDICT_MAX_TOP_K)
+
+predict_batcher = MicroBatcher(
+    run_prediction,
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=PREDICT_MAX_WAIT_MS,
+    queue_depth_gauge=prediction_queue_depth,
+    batch_size_histogram=prediction_batch_size,
+    wait_time_histogram=prediction_batch_wait,
+    max_concurrent_batches=max(1, INFERENCE_WORKERS),
+)
+# Requests asking for top_k are batched separately so label-only requests never pay for scores
+scored_predict_batcher = MicroBatcher(
+    run_scored_prediction,
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=PREDICT_MAX_WAIT_MS,
+    batch_size_histogram=prediction_batch_size,
+    wait_time_histogram=prediction_batch_wait,
+    max_concurrent_batches=max(1, INFERENCE_WORKERS),
+)
+
+prediction_cache = PredictionCache(
+    max_items=PREDICTION_CACHE_SIZE,
+    ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+    disk_path=PREDICTION_CACHE_PATH or None,
+    disk_max_rows=PREDICTION_CACHE_DISK_MAX_ROWS,
+    hit_counter=prediction_cache_hits_total,
+    miss_counter=prediction_cache_misses_total,
+) if PREDICTION_CACHE_ENABLED else None
+# Cached results are only valid for the settings they were computed with, also across restarts
+PREDICTION_SETTINGS = settings_fingerprint({
+    "fast_inference": FAST_INFERENCE,
+    "fast_inference_min_similarity": FAST_INFERENCE_MIN_SIMILARITY,
+    "embedding_backend": EMBEDDING_BACKEND,
+    "onnx_embedding_dir": ONNX_EMBEDDING_DIR if EMBEDDING_BACKEND == "onnx" else None,
+    "max_top_k": PREDICT_MAX_TOP_K,
+})
+
+def cached_prediction(texts: List[str], namespace: str, compute):
+    """Answer texts from the prediction cache; only distinct misses are sent to ``compute``."""
+    if prediction_cache is None:
+        return compute(texts)
+    slot = get_active_slot()
+    keys = slot.normalizer(texts) if slot.normalizer is not None else texts
+    return prediction_cache.get_or_compute(f"{slot.version}#{PREDICTION_SETTINGS}", namespace, keys, texts, compute)
+
+@app.on_event("startup")
+def start_inference_pool():
+    if inference_pool is not None:
+        # Load the model and fork the workers before serving traffic
+        inference_pool.start()
+
+@app.on_event("shutdown")
+def stop_predict_batcher():
+    predict_batcher.stop()
+    scored_predict_batcher.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+
+def remove_upload(path: Optional[str]):
+    """Delete a file received by /jobs/predict/upload; other paths are left alone."""
+    if path and os.path.dirname(path) == UPLOAD_DIR:
         try:
-            logger.info("Starting scraping process...")
-            subprocess.run(["python", SCRAPING_PATH], check=True)
-            subprocess.run(["python", PREPROCESSING_PATH], check=True)
-            logger.info("Scraping completed successfully")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Scraping failed: {e}")
-            scraping_errors_total.inc()
-        except Exception as e:
-            logger.error(f"Unexpected error during scraping: {e}")
-            scraping_errors_total.inc()
-    
-    background_tasks.add_task(scrape)
-    return {"message": "Scraping sedang berjalan", "status": "started"}
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def on_job_finished(job):
+    if job.kind == "scrape" and job.status == FAILED:
+        scraping_errors_total.inc()
+    if job.kind == "predict":
+        remove_upload(job.params.get("source"))
+
+# Scrape/preprocess/train jobs run one at a time in a persistent worker process with warm imports
+job_manager = JobManager(on_finish=on_job_finished)
+
+@app.on_event("shutdown")
+def stop_job_manager():
+    job_manager.stop()
+
+def submit_job(kind: str):
+    try:
+        job, created = job_manager.submit(kind)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if created:
+        logger.info(f"Job {job.id} ({kind}) submitted")
+    return job, created
+
+@app.post("/scrape", status_code=202)
+def run_scraping():
+    """Menjalankan proses scraping + preprocessing sebagai job di background."""
+    scraping_requests_total.inc()
+    job, created = submit_job("scrape")
+    message = "Scraping sedang berjalan" if created else "Scraping sudah berjalan, memakai job yang ada"
+    return {"message": message, "status": job.status, "job_id": job.id, "deduplicated": not created}
+
+class BatchPredictJobRequest(BaseModel):
+    # Paths are relative to the data directory
+    source: str = "cleaned/cleaned_data.csv"
+    target: str = "topic_modeling_results.parquet"
+    column: Optional[str] = None
+    columns: Optional[List[str]] = None
+    chunk_size: int = 2000
+
+def resolve_data_path(path: str, must_exist: bool = True) -> str:
+    """Resolve a dataset path, only allowing files inside the data directory."""
+    resolved = os.path.realpath(os.path.join(DATA_DIR, path))
+    if os.path.commonpath([resolved, DATA_DIR]) != DATA_DIR:
+        raise HTTPException(status_code=400, detail="Dataset path must be inside the data directory")
+    if must_exist and not os.path.exists(resolve_path(resolved)):
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {path}")
+    return resolved
+
+def submit_batch_predict(req: BatchPredictJobRequest, source: str):
+    if req.chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1")
+    if not req.target.endswith((".parquet", ".csv")):
+        raise HTTPException(status_code=400, detail="target must be a .parquet or .csv file")
+    params = {
+        "source": source,
+        "target": resolve_data_path(req.target, must_exist=False),
+        "column": req.column,
+        "columns": req.columns,
+        "chunk_size": req.chunk_size,
+    }
+    job, created = job_manager.submit("predict", params)
+    return dict(job.describe(), deduplicated=not created)
+
+@app.post("/jobs/predict", status_code=202)
+def create_batch_predict_job(req: Optional[BatchPredictJobRequest] = None):
+    """Label a whole dataset on the server in streaming chunks; poll /jobs/{job_id} for progress."""
+    req = req or BatchPredictJobRequest()
+    return submit_batch_predict(req, resolve_data_path(req.source))
+
+@app.post("/jobs/predict/upload", status_code=202)
+async def upload_batch_predict_job(request: Request, target: str = Query("topic_modeling_results.parquet"),
+                                   column: Optional[str] = Query(None), chunk_size: int = Query(2000)):
+    """Stream an NDJSON body to the server and label it as a batch prediction job.
+
+    The uploaded file is deleted once the job finishes, fails or is cancelled.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Upload exceeds {PREDICT_UPLOAD_MAX_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > PREDICT_UPLOAD_MAX_BYTES:
+        raise too_large
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.ndjson")
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > PREDICT_UPLOAD_MAX_BYTES:
+                    raise too_large
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        req = BatchPredictJobRequest(target=target, column=column, chunk_size=chunk_size)
+        job = submit_batch_predict(req, path)
+    except BaseException:
+        remove_upload(path)
+        raise
+    if job["deduplicated"]:
+        # The existing job reads its own copy of the data
+        remove_upload(path)
+    return job
+
+@app.post("/jobs/{kind}", status_code=202)
+def create_job(kind: str):
+    """Membuat job `scrape`, `preprocess`, atau `train`; job sejenis yang masih berjalan dipakai ulang."""
+    job, created = submit_job(kind)
+    return dict(job.describe(), deduplicated=not created)
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [job.describe() for job in job_manager.jobs()]}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status dan progress event sebuah job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.describe(events=True)
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    try:
+        job = job_manager.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.describe()
 
 @app.get("/data")
-def get_scraped_data():
-    """Mengembalikan hasil scraping yang sudah diproses."""
+def get_scraped_data(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    columns: Optional[str] = Query(None, description="Kolom yang dikembalikan, dipisah koma"),
+    year: Optional[int] = None,
+    topic: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson|arrow)$")
+):
+    """Mengembalikan hasil scraping yang sudah diproses (dengan paginasi, filter, dan streaming)."""
     try:
-        if os.path.exists(DATA_PATH):
-            df = pd.read_csv(DATA_PATH)
-            logger.info(f"Data retrieved successfully, {len(df)} records")
-            return {
-                "message": "Data retrieved successfully",
-                "count": len(df),
-                "data": df.to_dict(orient="records")
-            }
-        else:
+        df, version = cleaned_dataset.get()
+        if df is None:
             logger.warning("Data file not found")
             return {"message": "Data belum tersedia, silakan jalankan scraping.", "status": "no_data"}
+        
+        selected_columns = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+        query = data_store.query_fingerprint(selected_columns, year=year, topic=topic)
+        if cursor:
+            offset, cursor_version = data_store.decode_cursor(cursor, query)
+            if cursor_version != version:
+                raise HTTPException(status_code=409, detail="Data telah berubah, mulai paginasi dari awal")
+        
+        df = data_store.select(df, selected_columns, year=year, topic=topic)
+        total = len(df)
+        end = total if limit is None else min(offset + limit, total)
+        page = df.iloc[offset:end]
+        
+        # Large exports are streamed instead of being built as one JSON body
+        if format == "ndjson":
+            return StreamingResponse(data_store.iter_ndjson(page), media_type="application/x-ndjson")
+        if format == "arrow":
+            return StreamingResponse(data_store.iter_arrow(page), media_type="application/vnd.apache.arrow.stream")
+        
+        logger.info(f"Data retrieved successfully, {len(page)} of {total} records")
+        return {
+            "message": "Data retrieved successfully",
+            "count": total,
+            "offset": offset,
+            "returned": len(page),
+            "next_cursor": data_store.encode_cursor(end, version, query) if end < total else None,
+            "data": data_store.to_records(page)
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=f"Format not available: {e}")
     except Exception as e:
         logger.error(f"Error retrieving data: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving data")
 
 class PredictRequest(BaseModel):
     texts: List[str]
+    # Number of alternative topics with scores to return per text (0 = labels only)
+    top_k: int = 0
+
+def compact_top_k(results: List[dict], k: int) -> dict:
+    """Top-k alternatives as parallel arrays, with each distinct topic label listed once."""
+    topic_ids = [result["topic_ids"][:k] for result in results]
+    labels = {}
+    for result, ids in zip(results, topic_ids):
+        labels.update(zip(map(str, ids), result["labels"]))
+    return {
+        "topic_ids": topic_ids,
+        "scores": [result["scores"][:k] for result in results],
+        "labels": labels,
+    }
 
 @app.post("/predict")
 def predict(req: PredictRequest):
@@ -90,8 +377,19 @@ def predict(req: PredictRequest):
         if len(req.texts) > 100:  # Limit batch size
             raise HTTPException(status_code=400, detail="Too many texts provided (max 100)")
         
-        # Make prediction
-        result = predict_topic(req.texts)
+        if not 0 <= req.top_k <= PREDICT_MAX_TOP_K:
+            raise HTTPException(status_code=400, detail=f"top_k must be between 0 and {PREDICT_MAX_TOP_K}")
+        
+        # Make prediction (coalesced with concurrent requests when batching is enabled)
+        top_k = None
+        if req.top_k:
+            compute = scored_predict_batcher.submit if PREDICT_BATCHING_ENABLED else run_scored_prediction
+            scored = cached_prediction(req.texts, "top_k", compute)
+            result = [item["topic"] for item in scored]
+            top_k = compact_top_k(scored, req.top_k)
+        else:
+            compute = predict_batcher.submit if PREDICT_BATCHING_ENABLED else run_prediction
+            result = cached_prediction(req.texts, "labels", compute)
         model_predictions_total.inc()
         
         # Record prediction time
@@ -100,13 +398,18 @@ def predict(req: PredictRequest):
         
         logger.info(f"Prediction completed for {len(req.texts)} texts in {prediction_time:.2f}s")
         
-        return {
+        response = {
             "message": "Prediction completed successfully",
             "input_count": len(req.texts),
             "prediction_time": prediction_time,
             "topics": result
         }
+        if top_k is not None:
+            response["top_k"] = top_k
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         model_prediction_errors_total.inc()
         logger.error(f"Prediction failed: {e}")
@@ -118,9 +421,59 @@ def health_check():
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "model_loaded": os.path.exists(os.path.join(BASE_DIR, "../model/bertopic_model_all-MiniLM-min20.pkl"))
+        # A deployed bundle counts as well as the pickled model
+        "model_loaded": model_registry.active is not None or os.path.exists(default_model_path()),
+        "model_version": model_registry.active_version
     }
 
+class ModelSwapRequest(BaseModel):
+    path: str
+    version: Optional[str] = None
+
+def check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if not secrets.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def resolve_model_path(path: str) -> str:
+    """Resolve a model artifact path, only allowing artifacts inside the model directory."""
+    resolved = os.path.realpath(os.path.join(MODEL_DIR, path))
+    if os.path.commonpath([resolved, MODEL_DIR]) != MODEL_DIR:
+        raise HTTPException(status_code=400, detail="Model path must be inside the model directory")
+    if not os.path.exists(resolved):
+        raise HTTPException(status_code=404, detail=f"Model artifact not found: {path}")
+    return resolved
+
+@app.get("/admin/model")
+def model_status(x_admin_token: Optional[str] = Header(None)):
+    """Status versi model yang aktif, sedang dimuat, dan tersedia untuk rollback."""
+    check_admin_token(x_admin_token)
+    return model_registry.status()
+
+@app.post("/admin/model/swap", status_code=202)
+def swap_model(req: ModelSwapRequest, x_admin_token: Optional[str] = Header(None)):
+    """Memuat model baru di background dan menggantinya secara atomik setelah warmup berhasil."""
+    check_admin_token(x_admin_token)
+    path = resolve_model_path(req.path)
+    try:
+        version = model_registry.load_async(path, req.version)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Model swap to version {version} started")
+    return {"message": "Model sedang dimuat", "status": "loading", "version": version,
+            "active_version": model_registry.active_version}
+
+@app.post("/admin/model/rollback")
+def rollback_model(x_admin_token: Optional[str] = Header(None)):
+    """Mengaktifkan kembali versi model sebelumnya."""
+    check_admin_token(x_admin_token)
+    try:
+        slot = model_registry.rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": "Rollback berhasil", "active_version": slot.version}
+
 @app.post("/update-accuracy")
 def update_model_accuracy(accuracy: float):
     """Update model accuracy metric (typically called after model evaluation)."""
@@ -0,0 +1,219 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(namespace: str, text: str) -> bytes:
+    return hashlib.sha1(f"{namespace}\0{text}".encode("utf-8")).digest()
+
+
+def settings_fingerprint(settings: Dict[str, Any]) -> str:
+    """Short hash of the inference settings results depend on besides the model version."""
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+class _DiskStore:
+    """SQLite tier of the prediction cache, keyed by model version and entry key.
+
+    Several API processes (or a rolling swap) may share the file while
+    serving different versions, so rows of other versions are kept; they
+    only go when their TTL expires or the store grows past ``max_rows``
+    (oldest first).
+    """
+
+    SCHEMA = """
+        DROP TABLE IF EXISTS predictions;
+        CREATE TABLE IF NOT EXISTS prediction_results (
+            version TEXT NOT NULL,
+            key BLOB NOT NULL,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (version, key)
+        );
+        CREATE INDEX IF NOT EXISTS prediction_results_created ON prediction_results (created_at);
+    """
+    # Size and TTL pruning runs once per this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, max_rows: int = 100000):
+        self.path = path
+        self.max_rows = max_rows
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def get_many(self, version: str, keys: List[bytes], min_created: float) -> dict:
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, result FROM prediction_results WHERE version = ? AND created_at >= ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    (version, min_created, *batch),
+                ).fetchall()
+                found.update((bytes(key), json.loads(result)) for key, result in rows)
+        return found
+
+    def put_many(self, version: str, items: List[tuple], created_at: float, min_created: float = 0.0):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prediction_results (version, key, result, created_at) VALUES (?, ?, ?, ?)",
+                [(version, key, json.dumps(value, ensure_ascii=False), created_at) for key, value in items],
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(min_created)
+
+    def prune(self, min_created: float):
+        with self._lock, self._conn:
+            self._prune(min_created)
+
+    def _prune(self, min_created: float):
+        # Caller holds the lock and a transaction
+        self._conn.execute("DELETE FROM prediction_results WHERE created_at < ?", (min_created,))
+        self._conn.execute(
+            "DELETE FROM prediction_results WHERE rowid IN "
+            "(SELECT rowid FROM prediction_results ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+class PredictionCache:
+    """LRU + TTL cache of prediction results for the active model version.
+
+    Entries are keyed by a hash of a namespace (the kind of result, e.g.
+    labels or top-k scores) and the model-normalized text, and belong to the
+    model version that computed them. Looking up a different version (a swap
+    or rollback happened) drops the in-memory entries of the previous one, so
+    results of an old model are never served. An optional SQLite file keeps
+    entries across restarts; it is keyed by version, so processes serving
+    different versions can share it, and is bounded by TTL and ``disk_max_rows``.
+    """
+
+    def __init__(self, max_items: int = 10000, ttl_seconds: float = 3600, disk_path: Optional[str] = None,
+                 hit_counter=None, miss_counter=None, disk_max_rows: int = 100000):
+        self.max_items = max(1, max_items)
+        self.ttl = ttl_seconds
+        self.hit_counter = hit_counter
+        self.miss_counter = miss_counter
+
+        self._memory: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._disk = _DiskStore(disk_path, disk_max_rows) if disk_path else None
+
+    def _min_created(self, now: float) -> float:
+        return now - self.ttl if self.ttl > 0 else 0.0
+
+    def _use_version(self, version: str, now: float):
+        if version == self._version:
+            return
+        if self._version is not None:
+            logger.info(f"Model changed from {self._version} to {version}, clearing prediction cache")
+        self._memory.clear()
+        self._version = version
+        if self._disk is not None:
+            self._disk.prune(self._min_created(now))
+
+    def lookup(self, version: str, namespace: str, texts: List[str]) -> List[Any]:
+        """Cached results for ``texts`` in order, ``None`` where there is no valid entry."""
+        now = time.time()
+        keys = [cache_key(namespace, text) for text in texts]
+        results: List[Any] = [None] * len(keys)
+        misses = []
+        with self._lock:
+            self._use_version(version, now)
+            min_created = self._min_created(now)
+            for i, key in enumerate(keys):
+                entry = self._memory.get(key)
+                if entry is not None and entry[1] >= min_created:
+                    self._memory.move_to_end(key)
+                    results[i] = entry[0]
+                else:
+                    if entry is not None:
+                        del self._memory[key]
+                    misses.append(i)
+
+        if misses and self._disk is not None:
+            stored = self._disk.get_many(version, list({keys[i] for i in misses}), min_created)
+            if stored:
+                with self._lock:
+                    if self._version == version:
+                        for key, value in stored.items():
+                            self._remember(key, value, now)
+                for i in misses:
+                    results[i] = stored.get(keys[i])
+
+        hits = sum(result is not None for result in results)
+        if self.hit_counter is not None and hits:
+            self.hit_counter.inc(hits)
+        if self.miss_counter is not None and hits < len(results):
+            self.miss_counter.inc(len(results) - hits)
+        return results
+
+    def store(self, version: str, namespace: str, texts: List[str], values: List[Any]):
+        now = time.time()
+        items = [(cache_key(namespace, text), value) for text, value in zip(texts, values)]
+        with self._lock:
+            if version != self._version:
+                # Computed while the model was being swapped; do not cache it for the new one
+                return
+            for key, value in items:
+                self._remember(key, value, now)
+        if self._disk is not None:
+            try:
+                self._disk.put_many(version, items, now, self._min_created(now))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist predictions to {self._disk.path}: {e}")
+
+    def _remember(self, key: bytes, value: Any, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get_or_compute(self, version: str, namespace: str, keys: List[str], texts: List[str],
+                       compute: Callable[[List[str]], List[Any]]) -> List[Any]:
+        """Results for ``texts``, calling ``compute`` only on the distinct cache misses.
+
+        ``keys`` are the normalized forms of ``texts`` the entries are stored
+        under; ``compute`` receives the original texts.
+        """
+        results = self.lookup(version, namespace, keys)
+        missing = {}
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[i], []).append(i)
+        if not missing:
+            return results
+
+        computed = compute([texts[positions[0]] for positions in missing.values()])
+        if len(computed) != len(missing):
+            raise RuntimeError(f"Prediction returned {len(computed)} results for {len(missing)} texts")
+        for positions, value in zip(missing.values(), computed):
+            for i in positions:
+                results[i] = value
+        self.store(version, namespace, list(missing), list(computed))
+        return results
+
+    def __len__(self):
+        return len(self._memory)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._version = None
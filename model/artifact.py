@@ -0,0 +1,382 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = "ptiik-bertopic-bundle"
+BUNDLE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+EMBEDDING_DIR = "embedding_model"
+# Optional ONNX export of the encoder (model/onnx_backend.py), used with EMBEDDING_BACKEND=onnx
+EMBEDDING_ONNX_DIR = "embedding_onnx"
+TOPIC_EMBEDDINGS_FILE = "topic_embeddings.npy"
+CTFIDF_FILES = ("c_tf_idf_data.npy", "c_tf_idf_indices.npy", "c_tf_idf_indptr.npy")
+TOPICS_FILE = "topics.json"
+LABELS_FILE = "labels.json"
+TOPIC_MAPPING_FILE = "topic_mapping.npy"
+UMAP_FILE = "umap.joblib"
+HDBSCAN_FILE = "hdbscan.joblib"
+# Check file checksums from the manifest when bundle components are loaded. Off by default: hashing
+# the encoder and UMAP/HDBSCAN files costs a full read of the bundle on every load; bundles are
+# checked once with `python model/convert_to_cpu.py --verify <bundle>` instead
+VERIFY_CHECKSUMS = os.environ.get("BUNDLE_VERIFY_CHECKSUMS", "0") == "1"
+
+
+def is_bundle(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_checksums(bundle_dir: str) -> Dict[str, str]:
+    """sha256 of every file in a bundle (except the manifest), keyed by relative path."""
+    checksums = {}
+    for root, _, names in os.walk(bundle_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, bundle_dir).replace(os.sep, '/')
+            if relative != MANIFEST_NAME:
+                checksums[relative] = _sha256(path)
+    return dict(sorted(checksums.items()))
+
+
+def verify_bundle(bundle_dir: str, manifest: Optional[Dict] = None, names: Optional[List[str]] = None) -> List[str]:
+    """Relative paths whose checksum does not match the manifest (missing files included).
+
+    ``names`` limits the check to those files and directories of the bundle.
+    """
+    if manifest is None:
+        with open(os.path.join(bundle_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    mismatched = []
+    for relative, expected in manifest.get("checksums", {}).items():
+        if names is not None and not any(relative == name or relative.startswith(f"{name}/") for name in names):
+            continue
+        path = os.path.join(bundle_dir, *relative.split('/'))
+        if not os.path.exists(path) or _sha256(path) != expected:
+            mismatched.append(relative)
+    return mismatched
+
+
+def export_bundle(topic_model, bundle_dir: str, embedding_model_name: str, label_table=None,
+                  preprocessing: Optional[Dict] = None, compress: int = 3, onnx: bool = False) -> Dict:
+    """Write a fitted BERTopic model as a serving bundle and return its manifest.
+
+    The bundle holds only what inference needs: the embedding model as
+    safetensors, the fitted UMAP/HDBSCAN models (joblib, ``compress``
+    level), topic embeddings and the c-TF-IDF matrix as plain ``.npy`` files
+    (memory-mappable), the topic words/labels, optionally an int8 ONNX
+    export of the encoder, and a JSON manifest with the sha256 of every
+    file. The bundle is assembled next to ``bundle_dir`` and moved into
+    place when complete.
+    """
+    import joblib
+    import hdbscan
+    from model.predict import build_topic_label_table
+    from model.normalization import build_normalizer
+
+    final_dir = bundle_dir
+    bundle_dir = f"{os.path.normpath(final_dir)}.tmp"
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.makedirs(bundle_dir)
+    files = []
+
+    # Embedding model weights
+    backend = getattr(topic_model, 'embedding_model', None)
+    sentence_model = getattr(backend, 'embedding_model', backend)
+    if sentence_model is not None and hasattr(sentence_model, 'save'):
+        if hasattr(sentence_model, 'to'):
+            sentence_model.to('cpu')
+        sentence_model.save(os.path.join(bundle_dir, EMBEDDING_DIR), safe_serialization=True)
+        files.append(EMBEDDING_DIR)
+        if onnx:
+            from model.onnx_backend import export_onnx
+            export_onnx(sentence_model, os.path.join(bundle_dir, EMBEDDING_ONNX_DIR), source=embedding_model_name)
+            files.append(EMBEDDING_ONNX_DIR)
+    else:
+        logger.warning("Model has no saveable embedding model; bundle will need embeddings supplied")
+
+    # Dense and sparse topic state as raw arrays
+    topic_embeddings = getattr(topic_model, 'topic_embeddings_', None)
+    if topic_embeddings is not None:
+        np.save(os.path.join(bundle_dir, TOPIC_EMBEDDINGS_FILE), np.asarray(topic_embeddings, dtype=np.float32))
+        files.append(TOPIC_EMBEDDINGS_FILE)
+
+    c_tf_idf = getattr(topic_model, 'c_tf_idf_', None)
+    ctfidf_shape = None
+    if c_tf_idf is not None:
+        c_tf_idf = c_tf_idf.tocsr()
+        ctfidf_shape = list(c_tf_idf.shape)
+        for name, array in zip(CTFIDF_FILES, (c_tf_idf.data.astype(np.float32), c_tf_idf.indices, c_tf_idf.indptr)):
+            np.save(os.path.join(bundle_dir, name), array)
+            files.append(name)
+
+    topics = {str(topic): [[word, float(score)] for word, score in words]
+              for topic, words in topic_model.get_topics().items()}
+    with open(os.path.join(bundle_dir, TOPICS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(topics, f, ensure_ascii=False)
+    files.append(TOPICS_FILE)
+
+    if preprocessing is None:
+        # Text cleaning the model was trained with (current rules for older pickles)
+        preprocessing = build_normalizer(topic_model).spec()
+
+    if label_table is None:
+        label_table = build_topic_label_table(topic_model)
+    with open(os.path.join(bundle_dir, LABELS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(list(label_table), f, ensure_ascii=False)
+    files.append(LABELS_FILE)
+
+    # Cluster id -> topic id mapping used by BERTopic.transform
+    mappings = topic_model.topic_mapper_.get_mappings(original_topics=True)
+    np.save(os.path.join(bundle_dir, TOPIC_MAPPING_FILE), np.array(sorted(mappings.items()), dtype=np.int64))
+    files.append(TOPIC_MAPPING_FILE)
+
+    joblib.dump(topic_model.umap_model, os.path.join(bundle_dir, UMAP_FILE), compress=compress)
+    joblib.dump(topic_model.hdbscan_model, os.path.join(bundle_dir, HDBSCAN_FILE), compress=compress)
+    files.extend([UMAP_FILE, HDBSCAN_FILE])
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "embedding_model": embedding_model_name,
+        "num_topics": len([t for t in topics if int(t) != -1]),
+        "outliers": int(getattr(topic_model, '_outliers', 1)),
+        "membership_probabilities": bool(
+            getattr(topic_model, 'calculate_probabilities', False)
+            and isinstance(topic_model.hdbscan_model, hdbscan.HDBSCAN)
+        ),
+        "c_tf_idf_shape": ctfidf_shape,
+        "preprocessing": preprocessing,
+        "files": files,
+        "checksums": compute_checksums(bundle_dir),
+    }
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(bundle_dir, final_dir)
+    logger.info(f"Exported serving bundle to {final_dir}")
+    return manifest
+
+
+def refresh_bundle(topic_model, bundle_dir: str) -> bool:
+    """Re-export an existing bundle from a retrained model so bundle-serving APIs pick it up.
+
+    Keeps the ONNX export of the current bundle, and its embedding model
+    name unless the retrained model records its own.
+    If the export fails the stale bundle is removed, so the API falls back
+    to the (already updated) pickled model. Returns True when re-exported.
+    """
+    if not is_bundle(bundle_dir):
+        return False
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    try:
+        name = getattr(topic_model, "embedding_model_name", None)
+        if not isinstance(name, str) or not name:
+            name = previous.get("embedding_model") or "sentence-transformers/all-MiniLM-L6-v2"
+        export_bundle(topic_model, bundle_dir, name, onnx=EMBEDDING_ONNX_DIR in previous.get("files", []))
+        return True
+    except Exception as e:
+        logger.warning(f"Could not re-export serving bundle {bundle_dir}, removing it: {e}")
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        return False
+
+
+class _LazyEmbeddingBackend:
+    """Minimal BERTopic-style backend that loads the safetensors encoder on first use."""
+
+    def __init__(self, path: str, device: str = "cpu", verify=None):
+        self.path = path
+        self.device = device
+        self.verify = verify
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedding_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    if self.verify is not None:
+                        self.verify()
+                    logger.info(f"Loading embedding model from {self.path}")
+                    self._model = SentenceTransformer(self.path, device=self.device)
+        return self._model
+
+    def embed_documents(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        return self.embedding_model.encode(documents, show_progress_bar=verbose)
+
+    def embed(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        return self.embed_documents(documents, verbose)
+
+
+class BundledTopicModel:
+    """Read-only topic model served from a bundle written by ``export_bundle``.
+
+    Arrays are memory-mapped so that every worker on a node shares the same
+    pages through the OS page cache, and heavy components (encoder, UMAP,
+    HDBSCAN, c-TF-IDF) are only loaded when first used. With ``verify`` the
+    files of each component are checked against the manifest when that
+    component is loaded, not all at once.
+    """
+
+    def __init__(self, bundle_dir: str, verify: bool = VERIFY_CHECKSUMS):
+        self.bundle_dir = bundle_dir
+        self.verify = verify
+        with open(self._path(MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{bundle_dir} is not a {BUNDLE_FORMAT}")
+        if self.manifest.get("version", 0) > BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {self.manifest.get('version')}")
+        self.check(TOPICS_FILE, LABELS_FILE, TOPIC_MAPPING_FILE)
+
+        self.embedding_model_name = self.manifest.get("embedding_model")
+        self.preprocessing_spec = self.manifest.get("preprocessing")
+        self._outliers = int(self.manifest.get("outliers", 1))
+        self.embedding_model = None
+        if os.path.isdir(self._path(EMBEDDING_DIR)):
+            self.embedding_model = _LazyEmbeddingBackend(self._path(EMBEDDING_DIR),
+                                                         verify=lambda: self.check(EMBEDDING_DIR))
+
+        with open(self._path(TOPICS_FILE), 'r', encoding='utf-8') as f:
+            self._topics = {int(topic): [tuple(pair) for pair in words] for topic, words in json.load(f).items()}
+        with open(self._path(LABELS_FILE), 'r', encoding='utf-8') as f:
+            table = np.array(json.load(f), dtype=object)
+        table.setflags(write=False)
+        self.topic_label_table = table
+
+        mapping = np.load(self._path(TOPIC_MAPPING_FILE))
+        self._mappings = {int(src): int(dst) for src, dst in mapping}
+
+        self._components = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.bundle_dir, name)
+
+    def check(self, *names: str):
+        """Raise ValueError if the given bundle files do not match the manifest (when verifying)."""
+        if not self.verify:
+            return
+        mismatched = verify_bundle(self.bundle_dir, self.manifest, list(names))
+        if mismatched:
+            raise ValueError(f"Bundle {self.bundle_dir} is corrupted, checksum mismatch: {', '.join(mismatched)}")
+
+    def _component(self, name: str, loader, files=()):
+        component = self._components.get(name)
+        if component is None:
+            with self._lock:
+                component = self._components.get(name)
+                if component is None:
+                    self.check(*files)
+                    component = loader()
+                    self._components[name] = component
+        return component
+
+    @property
+    def umap_model(self):
+        import joblib
+        return self._component("umap", lambda: joblib.load(self._path(UMAP_FILE)), (UMAP_FILE,))
+
+    @property
+    def hdbscan_model(self):
+        import joblib
+        return self._component("hdbscan", lambda: joblib.load(self._path(HDBSCAN_FILE)), (HDBSCAN_FILE,))
+
+    @property
+    def topic_embeddings_(self) -> Optional[np.ndarray]:
+        if not os.path.exists(self._path(TOPIC_EMBEDDINGS_FILE)):
+            return None
+        return self._component("topic_embeddings", lambda: np.load(self._path(TOPIC_EMBEDDINGS_FILE), mmap_mode='r'),
+                               (TOPIC_EMBEDDINGS_FILE,))
+
+    @property
+    def c_tf_idf_(self):
+        shape = self.manifest.get("c_tf_idf_shape")
+        if shape is None:
+            return None
+
+        def load():
+            from scipy.sparse import csr_matrix
+            data, indices, indptr = (np.load(self._path(name), mmap_mode='r') for name in CTFIDF_FILES)
+            return csr_matrix((data, indices, indptr), shape=tuple(shape))
+
+        return self._component("c_tf_idf", load, CTFIDF_FILES)
+
+    def get_topics(self) -> Dict[int, List]:
+        return dict(self._topics)
+
+    def get_topic(self, topic: int):
+        return self._topics.get(topic, False)
+
+    def _map_predictions(self, predictions) -> np.ndarray:
+        return np.array([self._mappings.get(int(p), -1) for p in predictions], dtype=np.int64)
+
+    def _map_probabilities(self, probabilities):
+        if probabilities is None or np.ndim(probabilities) != 2:
+            return probabilities
+        num_topics = len(set(self._mappings.values())) - self.manifest.get("outliers", 1)
+        mapped = np.zeros((probabilities.shape[0], num_topics))
+        for from_topic, to_topic in self._mappings.items():
+            if to_topic != -1 and from_topic != -1:
+                mapped[:, to_topic] += probabilities[:, from_topic]
+        return mapped
+
+    def transform(self, documents, embeddings: np.ndarray = None):
+        """Assign topics the same way ``BERTopic.transform`` does for an HDBSCAN model."""
+        import hdbscan
+
+        if isinstance(documents, str):
+            documents = [documents]
+        if embeddings is None:
+            if self.embedding_model is None:
+                raise ValueError("Bundle has no embedding model; pass embeddings explicitly")
+            embeddings = self.embedding_model.embed_documents(list(documents))
+
+        umap_embeddings = np.nan_to_num(self.umap_model.transform(embeddings))
+        predictions, probabilities = hdbscan.approximate_predict(self.hdbscan_model, umap_embeddings)
+        if self.manifest.get("membership_probabilities"):
+            probabilities = hdbscan.membership_vector(self.hdbscan_model, umap_embeddings)
+
+        return self._map_predictions(predictions), self._map_probabilities(probabilities)
+
+
+def load_bundle(bundle_dir: str) -> BundledTopicModel:
+    logger.info(f"Loading serving bundle from {bundle_dir}")
+    return BundledTopicModel(bundle_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import joblib
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    parser = argparse.ArgumentParser(description="Export a pickled BERTopic model as a serving bundle")
+    parser.add_argument("source", help="Path to the pickled BERTopic model")
+    parser.add_argument("output", help="Directory to write the bundle to")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_bundle(joblib.load(args.source), args.output, args.embedding_model)
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import shutil
+import logging
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.storage import PARQUET_SUFFIX, find_title_column, resolve_path, to_arrow  # noqa: E402
+from preprocessing.streaming import iter_chunks, iter_records  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.realpath(os.path.join(BASE_DIR, "..", "data"))
+DEFAULT_SOURCE = os.path.join(DATA_DIR, "cleaned", "cleaned_data.csv")
+DEFAULT_TARGET = os.path.join(DATA_DIR, "topic_modeling_results.parquet")
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+def _parts_dir(target: str) -> str:
+    return f"{target}.parts"
+
+
+def _source_identity(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def _total_rows(path: str) -> Optional[int]:
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def _load_checkpoint(parts_dir: str, expected: Dict) -> int:
+    """Number of chunks already written by an interrupted run of the same job, or 0."""
+    try:
+        with open(os.path.join(parts_dir, CHECKPOINT_NAME), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        checkpoint = None
+    if checkpoint is not None and all(checkpoint.get(key) == value for key, value in expected.items()):
+        return int(checkpoint.get("chunks", 0))
+    # Different source, settings or model: start over
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    return 0
+
+
+def _save_checkpoint(parts_dir: str, state: Dict):
+    path = os.path.join(parts_dir, CHECKPOINT_NAME)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _texts(records: List[Dict], column: str) -> List[str]:
+    return ['' if record.get(column) is None or record.get(column) != record.get(column) else str(record[column])
+            for record in records]
+
+
+def _part_path(parts_dir: str, index: int) -> str:
+    return os.path.join(parts_dir, f"part-{index:05d}{PARQUET_SUFFIX}")
+
+
+def _combine_parts(parts_dir: str, count: int, target: str):
+    """Concatenate the part files into ``target`` (Parquet or CSV), replacing it atomically."""
+    import pyarrow.parquet as pq
+
+    tmp_path = f"{target}.tmp"
+    if target.endswith(".csv"):
+        for index in range(count):
+            df = pq.read_table(_part_path(parts_dir, index)).to_pandas()
+            df.to_csv(tmp_path, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+        if count == 0:
+            open(tmp_path, 'w').close()
+    else:
+        writer = None
+        for index in range(count):
+            table = pq.read_table(_part_path(parts_dir, index))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        else:
+            import pyarrow as pa
+            pq.write_table(pa.table({}), tmp_path)
+    os.replace(tmp_path, target)
+
+
+def predict_dataset(source: str = DEFAULT_SOURCE, target: str = DEFAULT_TARGET, column: Optional[str] = None,
+                    chunk_size: int = 2000, columns: Optional[List[str]] = None, model_path: Optional[str] = None,
+                    progress: Optional[Callable] = None) -> Dict:
+    """Label every record of a dataset with its topic, streaming in chunks.
+
+    ``source`` may be Parquet, CSV, a JSON array or NDJSON; ``target`` is
+    written as Parquet, or CSV when it ends in ``.csv``, with the kept source
+    ``columns`` (default: all) plus ``topics``, ``probabilities`` and
+    ``topic_label`` (the layout of ``topic_modeling_results.csv``). Each chunk
+    is written as a part file next to the target together with a checkpoint,
+    so a run that is interrupted resumes after the last finished chunk as
+    long as the source, settings and model are unchanged.
+    """
+    import pyarrow.parquet as pq
+    from model.predict import activate_latest_model, predict_topic_assignments
+
+    source = resolve_path(source)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Dataset not found: {source}")
+    slot = activate_latest_model(model_path)
+
+    parts_dir = _parts_dir(target)
+    expected = {"source": _source_identity(source), "column": column, "chunk_size": chunk_size,
+                "columns": columns, "model_version": slot.version}
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    done = _load_checkpoint(parts_dir, expected)
+    if done:
+        logger.info(f"Resuming batch prediction after {done} chunks")
+
+    total = _total_rows(source)
+    rows = 0
+    schema = None
+    chunks = 0
+    for index, records in enumerate(iter_chunks(iter_records(source), chunk_size)):
+        chunks = index + 1
+        if index < done:
+            rows += len(records)
+            continue
+        df = pd.DataFrame(records)
+        text_column = column or find_title_column(df.columns, source)
+        if text_column not in df.columns:
+            raise ValueError(f"Text column not found. Available columns: {df.columns.tolist()}")
+        if columns is not None:
+            df = df[[name for name in columns if name in df.columns]]
+
+        topics, scores, labels = predict_topic_assignments(_texts(records, text_column))
+        df = df.assign(topics=topics, probabilities=scores.astype(np.float32), topic_label=labels)
+
+        if schema is None and index > 0:
+            # Resumed run: later parts follow the schema of the first one
+            schema = pq.read_schema(_part_path(parts_dir, 0))
+        table = to_arrow(df, schema)
+        schema = table.schema
+        pq.write_table(table, _part_path(parts_dir, index), compression="zstd")
+
+        rows += len(records)
+        _save_checkpoint(parts_dir, dict(expected, chunks=chunks, rows=rows))
+        if progress is not None:
+            progress(rows_done=rows, rows_total=total, chunks_done=chunks)
+        logger.info(f"Labeled {rows}{f'/{total}' if total else ''} records")
+
+    _combine_parts(parts_dir, chunks, target)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    logger.info(f"Wrote {rows} labeled records to {target}")
+    return {"target": target, "rows": rows, "chunks": chunks, "model_version": slot.version}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Label a dataset with topics in streaming chunks")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Parquet, CSV, JSON or NDJSON dataset")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="Output .parquet or .csv")
+    parser.add_argument("--column", default=None, help="Text column (default: title/Judul)")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(predict_dataset(args.source, args.target, args.column, args.chunk_size), indent=2))
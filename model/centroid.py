@@ -0,0 +1,203 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Above this many topics the nearest centroid is looked up in an NNDescent index instead of a full product
+ANN_MIN_TOPICS = int(os.getenv("FAST_INFERENCE_ANN_MIN_TOPICS", "2000"))
+EPSILON = 1e-12
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, EPSILON)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the ``k`` highest scores per row, best first.
+
+    ``argpartition`` selects the k candidates in linear time; only those k
+    are then sorted.
+    """
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (len(scores), k))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class CentroidAssigner:
+    """Assign documents to the topic whose embedding is most cosine-similar.
+
+    A fast alternative to ``BERTopic.transform``, which reduces every batch
+    with UMAP and runs HDBSCAN ``approximate_predict``. Here the document
+    embeddings are compared directly with the topic embeddings
+    (``topic_embeddings_``, same space as the encoder output) in one matrix
+    product; for very large topic counts an NNDescent index (shipped with
+    umap-learn) is used instead. Documents whose best similarity is below
+    ``min_similarity`` are assigned the outlier topic -1.
+    """
+
+    def __init__(self, topic_embeddings: np.ndarray, topic_ids: np.ndarray, min_similarity: float = 0.0,
+                 ann_min_topics: int = ANN_MIN_TOPICS):
+        topic_ids = np.asarray(topic_ids, dtype=np.int64)
+        if len(topic_ids) != len(topic_embeddings):
+            raise ValueError("topic_ids must have one entry per topic embedding")
+        keep = topic_ids != -1
+        if not keep.any():
+            raise ValueError("Model has no non-outlier topic embeddings")
+        self.topic_ids = topic_ids[keep]
+        self.centroids = _normalize_rows(np.asarray(topic_embeddings)[keep])
+        self.min_similarity = min_similarity
+        self._index = None
+        if len(self.topic_ids) >= ann_min_topics:
+            self._index = self._build_index()
+
+    def _build_index(self):
+        try:
+            from pynndescent import NNDescent
+        except ImportError:
+            logger.warning("pynndescent not installed; using exact centroid search")
+            return None
+        index = NNDescent(self.centroids, metric="dot", n_neighbors=min(30, len(self.centroids) - 1))
+        index.prepare()
+        logger.info(f"Built NNDescent index over {len(self.centroids)} topic centroids")
+        return index
+
+    def similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every document to every topic, shape (documents, topics)."""
+        return _normalize_rows(embeddings) @ self.centroids.T
+
+    def assign(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(topics, similarity of the chosen topic)`` for a batch of embeddings."""
+        documents = _normalize_rows(embeddings)
+        if self._index is not None:
+            neighbors, distances = self._index.query(documents, k=1)
+            best, scores = neighbors[:, 0], 1.0 - distances[:, 0]
+        else:
+            scores_matrix = documents @ self.centroids.T
+            best = scores_matrix.argmax(axis=1)
+            scores = scores_matrix[np.arange(len(best)), best]
+        return self._apply_threshold(self.topic_ids[best], scores), scores
+
+    def assign_top_k(self, embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return ``(topics, top-k topic ids, top-k similarities)``; the first column is the best topic."""
+        documents = _normalize_rows(embeddings)
+        k = min(k, len(self.topic_ids))
+        if self._index is not None:
+            best, distances = self._index.query(documents, k=k)
+            scores = 1.0 - distances
+        else:
+            best, scores = top_k(documents @ self.centroids.T, k)
+        ids = self.topic_ids[best]
+        return self._apply_threshold(ids[:, 0], scores[:, 0]), ids, scores
+
+    def _apply_threshold(self, topics: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        if self.min_similarity > 0:
+            return np.where(scores >= self.min_similarity, topics, -1)
+        return topics
+
+
+def build_assigner(model, min_similarity: float = 0.0) -> Optional[CentroidAssigner]:
+    """Centroid assigner for a fitted or bundled model, or None if it has no topic embeddings."""
+    topic_embeddings = getattr(model, 'topic_embeddings_', None)
+    if topic_embeddings is None:
+        return None
+    # Rows follow the sorted topic ids, starting with -1 when the model has an outlier topic
+    outliers = int(getattr(model, '_outliers', 1))
+    topic_ids = np.arange(len(topic_embeddings)) - outliers
+    try:
+        return CentroidAssigner(topic_embeddings, topic_ids, min_similarity=min_similarity)
+    except ValueError as e:
+        logger.warning(f"Centroid assignment unavailable: {e}")
+        return None
+
+
+def parity_report(model, documents: List[str], embeddings: np.ndarray,
+                  assigner: Optional[CentroidAssigner] = None) -> Dict:
+    """Compare centroid assignment with the full ``transform`` on the same embeddings.
+
+    Reports topic agreement overall and on documents the full transform does
+    not mark as outliers, the timings of both paths, the similarity quantiles
+    of full-transform outliers vs assigned documents (to choose
+    ``min_similarity``) and the most frequent disagreements.
+    """
+    assigner = assigner or build_assigner(model)
+    if assigner is None:
+        raise ValueError("Model has no topic embeddings")
+
+    start = time.perf_counter()
+    full_topics, _ = model.transform(documents, embeddings=embeddings)
+    full_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    fast_topics, scores = assigner.assign(embeddings)
+    fast_seconds = time.perf_counter() - start
+
+    full_topics = np.asarray(full_topics, dtype=np.int64)
+    assigned = full_topics != -1
+    agree = fast_topics == full_topics
+
+    mismatches = {}
+    for full, fast in zip(full_topics[~agree].tolist(), fast_topics[~agree].tolist()):
+        mismatches[(full, fast)] = mismatches.get((full, fast), 0) + 1
+    top_mismatches = sorted(mismatches.items(), key=lambda item: -item[1])[:10]
+
+    def quantiles(values):
+        if not len(values):
+            return None
+        return {q: round(float(np.quantile(values, q / 100)), 4) for q in (5, 25, 50, 75, 95)}
+
+    return {
+        "documents": len(full_topics),
+        "agreement": round(float(agree.mean()), 4),
+        "agreement_excluding_outliers": round(float(agree[assigned].mean()), 4) if assigned.any() else None,
+        "full_transform_outliers": int((~assigned).sum()),
+        "full_transform_seconds": round(full_seconds, 4),
+        "centroid_seconds": round(fast_seconds, 4),
+        "speedup": round(full_seconds / fast_seconds, 1) if fast_seconds > 0 else None,
+        "similarity_assigned": quantiles(scores[assigned]),
+        "similarity_outliers": quantiles(scores[~assigned]),
+        "top_mismatches": [{"full": full, "centroid": fast, "count": count}
+                           for (full, fast), count in top_mismatches],
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    import argparse
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from model.predict import load_model_from_path, default_model_path, embed_documents
+    from model.normalization import build_normalizer
+    from preprocessing.storage import read_dataset, title_column
+
+    parser = argparse.ArgumentParser(description="Parity report: centroid topic assignment vs full BERTopic transform")
+    parser.add_argument("--model", default=None, help="Serving bundle or pickled model (default: the served model)")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                       "data", "cleaned", "cleaned_data.csv"))
+    parser.add_argument("--column", default=None, help="Text column (default: title/Judul)")
+    parser.add_argument("--sample", type=int, default=2000)
+    parser.add_argument("--min-similarity", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model = load_model_from_path(args.model or default_model_path())
+    column = args.column or title_column(args.data)
+    texts = read_dataset(args.data, columns=[column])[column].dropna().astype(str)
+    texts = texts.sample(min(args.sample, len(texts)), random_state=42).tolist()
+    documents = build_normalizer(model)(texts)
+    embeddings = embed_documents(model, documents)
+    if embeddings is None:
+        sys.exit("Model has no embedding backend")
+    report = parity_report(model, documents, embeddings, build_assigner(model, args.min_similarity))
+    print(json.dumps(report, indent=2))
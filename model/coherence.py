@@ -0,0 +1,162 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-12
+DEFAULT_WINDOW_SIZE = 110  # same boolean sliding window gensim uses for c_v
+
+
+def _window_counts(docs: Sequence[np.ndarray], word_ids: np.ndarray, window_size: int):
+    """Count sliding-window occurrences and co-occurrences of ``word_ids`` in ``docs``.
+
+    Returns ``(occurrences, cooccurrences, num_windows)`` where row/column ``k``
+    refers to ``word_ids[k]``.
+    """
+    k = len(word_ids)
+    occurrences = np.zeros(k, dtype=np.float64)
+    cooccurrences = np.zeros((k, k), dtype=np.float64)
+    num_windows = 0
+    max_id = int(word_ids.max()) + 1 if k else 0
+    local_index = np.full(max_id, -1, dtype=np.int64)
+    local_index[word_ids] = np.arange(k)
+
+    for doc in docs:
+        length = len(doc)
+        if length == 0:
+            continue
+        n_windows = max(1, length - window_size + 1)
+        num_windows += n_windows
+
+        positions = np.nonzero(doc < max_id)[0]
+        if len(positions):
+            positions = positions[local_index[doc[positions]] >= 0]
+        if not len(positions):
+            continue
+
+        words = local_index[doc[positions]]
+        present, rows = np.unique(words, return_inverse=True)
+
+        # Each occurrence at position p is inside windows [p - window_size + 1, p]
+        starts = np.clip(positions - window_size + 1, 0, n_windows - 1)
+        ends = np.clip(positions, 0, n_windows - 1) + 1
+        marks = np.zeros((len(present), n_windows + 1), dtype=np.int32)
+        np.add.at(marks, (rows, starts), 1)
+        np.add.at(marks, (rows, ends), -1)
+        membership = (np.cumsum(marks[:, :-1], axis=1) > 0).astype(np.float64)
+
+        occurrences[present] += membership.sum(axis=1)
+        cooccurrences[np.ix_(present, present)] += membership @ membership.T
+
+    return occurrences, cooccurrences, num_windows
+
+
+def _window_counts_job(args):
+    return _window_counts(*args)
+
+
+class CoherenceEvaluator:
+    """Score topic word lists against a corpus that is tokenized and indexed once.
+
+    The corpus is stored as integer token arrays plus a vocabulary. Scoring a
+    batch of topic sets counts (co-)occurrences only for the words those
+    topics use, then computes NPMI and c_v for all topics with array math.
+    ``c_v`` follows gensim's definition (boolean sliding window, NPMI,
+    one-set segmentation, indirect cosine confirmation, arithmetic mean).
+    Window counts here are exact; gensim's incremental window bookkeeping can
+    miss words repeated inside a window, so scores may differ slightly on such
+    corpora.
+    """
+
+    def __init__(self, tokenized_texts: Iterable[List[str]], window_size: int = DEFAULT_WINDOW_SIZE,
+                 n_jobs: int = 1):
+        self.window_size = window_size
+        self.n_jobs = max(1, n_jobs)
+        self.vocabulary: Dict[str, int] = {}
+        docs = []
+        for tokens in tokenized_texts:
+            ids = [self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokens]
+            docs.append(np.asarray(ids, dtype=np.int64))
+        self.docs = docs
+        logger.info(f"Coherence index built: {len(docs)} documents, {len(self.vocabulary)} terms")
+
+    def _counts(self, word_ids: np.ndarray):
+        if self.n_jobs == 1 or len(self.docs) < 2 * self.n_jobs:
+            return _window_counts(self.docs, word_ids, self.window_size)
+
+        shards = [self.docs[i::self.n_jobs] for i in range(self.n_jobs)]
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            parts = list(executor.map(_window_counts_job, [(shard, word_ids, self.window_size) for shard in shards]))
+        occurrences = sum(part[0] for part in parts)
+        cooccurrences = sum(part[1] for part in parts)
+        num_windows = sum(part[2] for part in parts)
+        return occurrences, cooccurrences, num_windows
+
+    def _topic_indices(self, topics: Sequence[Sequence[str]]):
+        """Map topic words to vocabulary ids, dropping padding and unknown words."""
+        topic_ids = []
+        for words in topics:
+            ids = [self.vocabulary[word] for word in words if word and word in self.vocabulary]
+            topic_ids.append(list(dict.fromkeys(ids)))
+        return topic_ids
+
+    def _npmi_matrices(self, topic_ids: List[List[int]]):
+        union = np.array(sorted({word for ids in topic_ids for word in ids}), dtype=np.int64)
+        if not len(union):
+            return union, None
+        occurrences, cooccurrences, num_windows = self._counts(union)
+        num_windows = max(num_windows, 1)
+        p = occurrences / num_windows
+        p_joint = cooccurrences / num_windows
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pmi = np.log((p_joint + EPSILON) / np.outer(p, p))
+            npmi = pmi / -np.log(p_joint + EPSILON)
+        npmi[~np.isfinite(npmi)] = 0.0
+        return union, npmi
+
+    def score_topics(self, topics: Sequence[Sequence[str]], measure: str = "c_v") -> List[float]:
+        """Return one coherence score per topic word list."""
+        if measure not in ("c_v", "c_npmi"):
+            raise ValueError(f"Unsupported coherence measure: {measure}")
+
+        topic_ids = self._topic_indices(topics)
+        union, npmi = self._npmi_matrices(topic_ids)
+        scores = []
+        for ids in topic_ids:
+            if len(ids) < 2:
+                scores.append(float("nan"))
+                continue
+            local = np.searchsorted(union, ids)
+            matrix = npmi[np.ix_(local, local)]
+            if measure == "c_npmi":
+                upper = np.triu_indices(len(ids), k=1)
+                scores.append(float(matrix[upper].mean()))
+                continue
+            # One-set segmentation: each word vector against the whole-topic vector
+            topic_vector = matrix.sum(axis=0)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(topic_vector)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cosines = np.where(norms > 0, matrix @ topic_vector / norms, 0.0)
+            scores.append(float(cosines.mean()))
+        return scores
+
+    def score(self, topics: Sequence[Sequence[str]], measure: str = "c_v") -> float:
+        """Mean coherence of a topic set, ignoring topics with fewer than two known words."""
+        scores = np.array(self.score_topics(topics, measure), dtype=np.float64)
+        scores = scores[~np.isnan(scores)]
+        return float(scores.mean()) if len(scores) else float("nan")
+
+    def score_many(self, topic_sets: Sequence[Sequence[Sequence[str]]], measure: str = "c_v") -> List[float]:
+        """Score several candidate models while counting shared words only once."""
+        flat = [topic for topics in topic_sets for topic in topics]
+        per_topic = self.score_topics(flat, measure)
+        results, offset = [], 0
+        for topics in topic_sets:
+            scores = np.array(per_topic[offset:offset + len(topics)], dtype=np.float64)
+            offset += len(topics)
+            scores = scores[~np.isnan(scores)]
+            results.append(float(scores.mean()) if len(scores) else float("nan"))
+        return results
@@ -1,121 +1,188 @@
-import joblib
-import torch
 import os
+import sys
+import glob
 import logging
-import pickle
+import contextlib
+from typing import Dict, Optional
+
+import numpy as np
+import scipy.sparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.artifact import export_bundle, load_bundle, verify_bundle  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_model_to_cpu():
-    
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    CUDA_MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20.pkl")
-    CPU_MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_cpu.pkl")
-    
-    if not os.path.exists(CUDA_MODEL_PATH):
-        logger.error(f"Model file not found: {CUDA_MODEL_PATH}")
-        return False
-    
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20.pkl")
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_bundle")
+MLFLOW_SCHEMES = ("runs:/", "models:/", "mlflow-artifacts:/")
+
+# Fitted state only needed while training; UMAP.transform and approximate_predict do not read it
+UMAP_TRAINING_STATE = ("graph_", "graph_dists_", "_knn_indices", "_knn_dists", "_sigmas", "_rhos")
+HDBSCAN_TRAINING_STATE = ("_min_spanning_tree", "_single_linkage_tree", "_outlier_scores")
+
+# Share of probe embeddings that must get the same topic from the bundle as from the original model
+MIN_AGREEMENT = 0.95
+PROBES = 256
+
+
+def resolve_source(source: str) -> str:
+    """Local path of a model artifact, downloading MLflow URIs (runs:/..., models:/...) first."""
+    if source.startswith(MLFLOW_SCHEMES):
+        import mlflow
+
+        path = mlflow.artifacts.download_artifacts(artifact_uri=source)
+        if os.path.isdir(path):
+            candidates = sorted(glob.glob(os.path.join(path, "**", "*.pkl"), recursive=True))
+            if len(candidates) != 1:
+                raise ValueError(f"Expected one .pkl model in {source}, found {len(candidates)}")
+            path = candidates[0]
+        logger.info(f"Downloaded {source} to {path}")
+        return path
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Model artifact not found: {source}")
+    return source
+
+
+@contextlib.contextmanager
+def cpu_tensor_loading():
+    """Map every tensor unpickled inside this block to the CPU.
+
+    Pickled torch tensors are restored through ``torch.load`` without a
+    ``map_location``, which fails for CUDA tensors on CPU-only hosts.
+    """
+    import torch
+
+    original_load = torch.load
+
+    def cpu_load(f, *args, **kwargs):
+        kwargs["map_location"] = "cpu"
+        return original_load(f, *args, **kwargs)
+
+    torch.load = cpu_load
     try:
-        logger.info("Loading CUDA model with CPU mapping...")
-        
-        os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
-        
-        # Method 1: Try with custom pickle loader that maps tensors to CPU
-        try:
-            import pickle
-            
-            class CPUUnpickler(pickle.Unpickler):
-                def persistent_load(self, pid):
-                    if pid[0] == 'storage':
-                        # Map storage to CPU
-                        storage = torch.UntypedStorage.from_file(pid[1], False, pid[2])
-                        typed_storage = torch.storage.TypedStorage(
-                            wrap_storage=storage,
-                            dtype=pid[3]
-                        )
-                        return typed_storage.cpu()
-                    else:
-                        return super().persistent_load(pid)
-            
-            # Load with CPU mapping
-            with open(CUDA_MODEL_PATH, 'rb') as f:
-                unpickler = CPUUnpickler(f)
-                model = unpickler.load()
-            
-            logger.info("✓ Model loaded with CPU mapping")
-            
-        except Exception as e:
-            logger.warning(f"Custom unpickler failed: {e}")
-            
-            # Method 2: Try patching torch.load to use CPU
-            original_load = torch.load
-            
-            def cpu_load(f, map_location=None, **kwargs):
-                return original_load(f, map_location='cpu', **kwargs)
-            
-            torch.load = cpu_load
-            
-            try:
-                model = joblib.load(CUDA_MODEL_PATH)
-                logger.info("✓ Model loaded with patched torch.load")
-            finally:
-                torch.load = original_load
-        
-        logger.info("Converting model components to CPU...")
-        
-        # Convert embedding model to CPU
-        if hasattr(model, 'embedding_model'):
-            embedding_model = model.embedding_model
-            
-            # Move to CPU if it's a PyTorch model
-            if hasattr(embedding_model, 'to'):
-                embedding_model.to('cpu')
-                logger.info("✓ Moved embedding model to CPU")
-            
-            # Update device attributes
-            if hasattr(embedding_model, 'device'):
-                embedding_model.device = torch.device('cpu')
-            if hasattr(embedding_model, '_target_device'):
-                embedding_model._target_device = torch.device('cpu')
-            
-            # Handle model modules
-            if hasattr(embedding_model, '_modules'):
-                for name, module in embedding_model._modules.items():
-                    if hasattr(module, 'to'):
-                        module.to('cpu')
-                        logger.info(f"✓ Moved {name} to CPU")
-        
-        # Save CPU-compatible model
-        logger.info(f"Saving CPU-compatible model to {CPU_MODEL_PATH}")
-        joblib.dump(model, CPU_MODEL_PATH)
-        
-        # Test the converted model
-        logger.info("Testing converted model...")
-        test_texts = ["test machine learning", "artificial intelligence"]
-        topics, probs = model.transform(test_texts)
-        logger.info(f"✓ Model test successful: {len(topics)} predictions made")
-        
-        # Replace original model with CPU version
-        logger.info("Replacing original model with CPU version...")
-        os.rename(CUDA_MODEL_PATH, f"{CUDA_MODEL_PATH}.cuda_backup")
-        os.rename(CPU_MODEL_PATH, CUDA_MODEL_PATH)
-        
-        logger.info("✅ Model conversion completed successfully!")
-        logger.info(f"Original CUDA model backed up as: {CUDA_MODEL_PATH}.cuda_backup")
-        
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Model conversion failed: {e}")
-        return False
+        yield
+    finally:
+        torch.load = original_load
+
+
+def load_on_cpu(path: str):
+    """Load a pickled/joblib BERTopic model with all tensors on the CPU."""
+    import joblib
+
+    with cpu_tensor_loading():
+        model = joblib.load(path)
+    backend = getattr(model, "embedding_model", None)
+    sentence_model = getattr(backend, "embedding_model", backend)
+    if hasattr(sentence_model, "to"):
+        sentence_model.to("cpu")
+    return model
+
+
+def _nbytes(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if scipy.sparse.issparse(value):
+        value = value.tocsr()
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    if isinstance(value, tuple):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+def _clear(obj, attributes) -> Dict[str, int]:
+    cleared = {}
+    for name in attributes:
+        if obj is not None and getattr(obj, name, None) is not None:
+            cleared[name] = _nbytes(getattr(obj, name))
+            setattr(obj, name, None)
+    return cleared
+
+
+def strip_training_state(topic_model) -> Dict[str, int]:
+    """Drop training-only state in place; returns the cleared attributes and their array sizes in bytes."""
+    umap_model = topic_model.umap_model
+    # Shared reducers from the training grid wrap the fitted UMAP
+    umap_model = getattr(umap_model, "umap_model", umap_model)
+    cleared = {}
+    cleared.update({f"umap.{name}": size for name, size in _clear(umap_model, UMAP_TRAINING_STATE).items()})
+    hdbscan_cleared = _clear(topic_model.hdbscan_model, HDBSCAN_TRAINING_STATE)
+    cleared.update({f"hdbscan.{name}": size for name, size in hdbscan_cleared.items()})
+    return cleared
+
+
+def probe_embeddings(topic_model, count: int = PROBES, seed: int = 42) -> Optional[np.ndarray]:
+    """Embeddings near the topic centroids, used to compare predictions before and after export."""
+    centroids = getattr(topic_model, "topic_embeddings_", None)
+    if centroids is None:
+        return None
+    centroids = np.asarray(centroids, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = centroids[rng.integers(0, len(centroids), count)]
+    noise = rng.normal(scale=float(np.abs(centroids).mean()) * 0.5, size=picks.shape).astype(np.float32)
+    return picks + noise
+
+
+def convert(source: str, output: str, embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+            strip: bool = True, onnx: bool = False, compress: int = 3) -> Dict:
+    """Export any trained BERTopic artifact as a slim, CPU-mapped, checksummed serving bundle."""
+    path = resolve_source(source)
+    logger.info(f"Loading {path} on CPU")
+    topic_model = load_on_cpu(path)
+
+    probes = probe_embeddings(topic_model)
+    reference = None
+    if probes is not None:
+        reference, _ = topic_model.transform([""] * len(probes), embeddings=probes)
+
+    cleared = strip_training_state(topic_model) if strip else {}
+    for name, size in cleared.items():
+        logger.info(f"Stripped {name} ({size / 1e6:.1f} MB)")
+
+    manifest = export_bundle(topic_model, output, embedding_model_name, compress=compress, onnx=onnx)
+
+    report = {"source": source, "bundle": output, "stripped": sorted(cleared),
+              "source_bytes": os.path.getsize(path),
+              "bundle_bytes": sum(os.path.getsize(os.path.join(root, name))
+                                  for root, _, names in os.walk(output) for name in names)}
+    if reference is not None:
+        bundled, _ = load_bundle(output).transform([""] * len(probes), embeddings=probes)
+        agreement = float(np.mean(np.asarray(bundled) == np.asarray(reference)))
+        report["probe_agreement"] = round(agreement, 4)
+        # UMAP transform is not deterministic without a random_state, so allow a little noise
+        if agreement < MIN_AGREEMENT:
+            raise RuntimeError(f"Bundle predictions agree with the original model on only {agreement:.1%} of probes")
+    report["files"] = len(manifest.get("checksums", {}))
+    return report
+
 
 if __name__ == "__main__":
-    logger.info("=== BERTopic Model CPU Conversion ===")
-    success = convert_model_to_cpu()
-    
-    if success:
-        logger.info("Model is now CPU-compatible!")
-    else:
-        logger.error("Conversion failed. Please check the logs above.")
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a trained BERTopic model (local or MLflow) as a CPU serving bundle")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE,
+                        help="Pickled model path or MLflow URI (runs:/<id>/<path>)")
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT, help="Bundle directory to write")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--no-strip", action="store_true", help="Keep training-only state")
+    parser.add_argument("--onnx", action="store_true", help="Also include an int8 ONNX export of the encoder")
+    parser.add_argument("--compress", type=int, default=3, help="joblib compression level for UMAP/HDBSCAN")
+    parser.add_argument("--verify", metavar="BUNDLE", help="Only check the sha256 of every file of an existing bundle")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify_bundle(args.verify)
+        print(json.dumps({"bundle": args.verify, "ok": not mismatched, "mismatched": mismatched}, indent=2))
+        raise SystemExit(1 if mismatched else 0)
+
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    report = convert(args.source, args.output, args.embedding_model, strip=not args.no_strip, onnx=args.onnx,
+                     compress=args.compress)
+    print(json.dumps(report, indent=2))
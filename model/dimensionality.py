@@ -0,0 +1,58 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PrefittedReducer:
+    """Wrap an already fitted UMAP model so several BERTopic fits can share it.
+
+    BERTopic calls ``fit`` and then ``transform`` on the training embeddings.
+    ``fit`` is a no-op here and ``transform`` returns the precomputed reduction
+    for the training matrix, so the expensive UMAP fit runs only once per
+    embedding model. New documents are reduced by the wrapped model as usual.
+    """
+
+    def __init__(self, umap_model, train_embeddings: np.ndarray, reduced_embeddings: np.ndarray):
+        self.umap_model = umap_model
+        self._train_embeddings = train_embeddings
+        self._reduced_embeddings = reduced_embeddings
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        if self._reduced_embeddings is not None and self._is_training_matrix(X):
+            return self._reduced_embeddings
+        return self.umap_model.transform(X)
+
+    def _is_training_matrix(self, X) -> bool:
+        train = self._train_embeddings
+        if X is train:
+            return True
+        X = np.asarray(X)
+        return X.shape == train.shape and np.array_equal(X, train)
+
+    def __getstate__(self):
+        # Training matrices are only needed while fitting; never pickle them
+        state = self.__dict__.copy()
+        state["_train_embeddings"] = None
+        state["_reduced_embeddings"] = None
+        return state
+
+
+def fit_shared_umap(embeddings: np.ndarray, n_neighbors: int = 15, n_components: int = 5,
+                    min_dist: float = 0.0, metric: str = "cosine", random_state: int = None):
+    """Fit UMAP once with BERTopic's default settings and return a shareable reducer."""
+    from umap import UMAP
+
+    logger.info(f"Fitting shared UMAP on {len(embeddings)} embeddings")
+    umap_model = UMAP(
+        n_neighbors=n_neighbors,
+        n_components=n_components,
+        min_dist=min_dist,
+        metric=metric,
+        random_state=random_state,
+    )
+    reduced = umap_model.fit_transform(embeddings)
+    return PrefittedReducer(umap_model, embeddings, np.nan_to_num(reduced))
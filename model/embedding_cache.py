@@ -0,0 +1,302 @@
+import os
+import json
+import hashlib
+import contextlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(BASE_DIR, "../data/embedding_cache"))
+MEMORY_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "1") == "1"
+
+HASH_DTYPE = "S20"  # sha1 digest
+
+
+def normalize_model_name(model_name: str) -> str:
+    """Treat 'all-MiniLM-L6-v2' and 'sentence-transformers/all-MiniLM-L6-v2' as the same model."""
+    name = model_name.strip()
+    if name.startswith("sentence-transformers/"):
+        name = name[len("sentence-transformers/"):]
+    return name
+
+
+def encoder_name(topic_model) -> Optional[str]:
+    """Name of the encoder a topic model embeds with, used as its embedding cache namespace.
+
+    Prefers the backend's own cache name (ONNX exports), then the name
+    recorded when the model was fitted, then the name the loaded
+    SentenceTransformer was created from. None when it cannot be told.
+    """
+    backend = getattr(topic_model, "embedding_model", None)
+    for name in (getattr(backend, "cache_name", None), getattr(topic_model, "embedding_model_name", None)):
+        if isinstance(name, str) and name:
+            return name
+    sentence_model = getattr(backend, "embedding_model", backend)
+    candidates = (getattr(getattr(sentence_model, "model_card_data", None), "base_model", None),
+                  getattr(getattr(sentence_model, "tokenizer", None), "name_or_path", None))
+    for name in candidates:
+        if isinstance(name, str) and name:
+            return name
+    return None
+
+
+def normalize_text(text) -> str:
+    """Collapse whitespace so trivially different copies share a cache entry."""
+    if text is None:
+        return ""
+    return " ".join(str(text).split())
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + on-disk) cache of embeddings for one embedding model.
+
+    The disk tier is an append-only float32 matrix (``embeddings.f32``) read
+    through ``np.memmap`` plus an aligned array of text hashes (``hashes.bin``).
+    Only offline runs (embedding, training, retraining) write it; serving
+    reads it and keeps request texts in the bounded memory tier only, so
+    client input cannot grow the disk tier.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = CACHE_DIR,
+                 memory_items: int = MEMORY_CACHE_SIZE):
+        self.model_name = normalize_model_name(model_name)
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+        self.directory = None
+        if cache_dir:
+            slug = self.model_name.replace("/", "__")
+            self.directory = os.path.join(cache_dir, slug)
+        self._dim = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._matrix = None
+        self._load_disk_index()
+
+    # Disk tier
+
+    @property
+    def _embeddings_path(self):
+        return os.path.join(self.directory, "embeddings.f32")
+
+    @property
+    def _hashes_path(self):
+        return os.path.join(self.directory, "hashes.bin")
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _lock_path(self):
+        return os.path.join(self.directory, "cache.lock")
+
+    @contextlib.contextmanager
+    def _disk_lock(self):
+        """Exclusive lock on the disk tier, shared by every process using the directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_from_disk(self) -> int:
+        """Pick up rows appended by other processes; call with the disk lock held.
+
+        Returns the number of complete rows. A writer that died between the
+        two appends leaves the files misaligned; the unmatched tail is cut off.
+        """
+        if self._dim is None:
+            if not os.path.exists(self._meta_path):
+                return 0
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self._dim = int(json.load(f)["dim"])
+        hash_size = np.dtype(HASH_DTYPE).itemsize
+        hashes = os.path.getsize(self._hashes_path) // hash_size if os.path.exists(self._hashes_path) else 0
+        rows = os.path.getsize(self._embeddings_path) // (4 * self._dim) if os.path.exists(self._embeddings_path) else 0
+        count = min(hashes, rows)
+        if hashes != rows:
+            logger.warning(f"Embedding cache in {self.directory} has {hashes} hashes for {rows} rows, dropping the tail")
+        for path, size in ((self._hashes_path, count * hash_size), (self._embeddings_path, count * 4 * self._dim)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+        known = self._rows
+        if count < known:
+            self._index = {}
+            known = 0
+        if count > known:
+            with open(self._hashes_path, "rb") as f:
+                f.seek(known * hash_size)
+                appended = np.frombuffer(f.read((count - known) * hash_size), dtype=HASH_DTYPE)
+            for offset, key in enumerate(appended):
+                self._index.setdefault(bytes(key), known + offset)
+        if count != self._rows or self._matrix is None:
+            self._rows = count
+            self._open_matrix(count)
+        return count
+
+    def _load_disk_index(self):
+        if not self.directory or not os.path.exists(self._meta_path):
+            return
+        try:
+            with self._disk_lock():
+                count = self._sync_from_disk()
+            logger.info(f"Embedding cache for {self.model_name}: {count} entries on disk")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache in {self.directory}: {e}")
+            self._index, self._matrix, self._rows = {}, None, 0
+
+    def _open_matrix(self, rows: int):
+        if rows == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._embeddings_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+
+    def _append_to_disk(self, keys: List[bytes], vectors: np.ndarray):
+        if not self.directory or not keys:
+            return
+        try:
+            with self._disk_lock():
+                # Row numbers come from the files, not this process's view of them
+                start = self._sync_from_disk()
+                if self._dim is None:
+                    self._dim = int(vectors.shape[1])
+                    with open(self._meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model_name": self.model_name, "dim": self._dim, "dtype": "float32"}, f)
+                elif vectors.shape[1] != self._dim:
+                    logger.warning(f"Embedding dim {vectors.shape[1]} does not match cache dim {self._dim}, not persisting")
+                    return
+
+                # Another process may have stored some of these meanwhile
+                rows = [i for i, key in enumerate(keys) if key not in self._index]
+                if not rows:
+                    return
+                keys = [keys[i] for i in rows]
+                with open(self._embeddings_path, "ab") as f:
+                    f.write(np.ascontiguousarray(vectors[rows], dtype=np.float32).tobytes())
+                with open(self._hashes_path, "ab") as f:
+                    f.write(np.asarray(keys, dtype=HASH_DTYPE).tobytes())
+                for offset, key in enumerate(keys):
+                    self._index[key] = start + offset
+                self._rows = start + len(keys)
+                self._open_matrix(self._rows)
+        except OSError as e:
+            logger.warning(f"Could not persist embeddings to {self.directory}: {e}")
+
+    # Memory tier
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            return vector
+        row = self._index.get(key)
+        if row is not None and self._matrix is not None:
+            vector = np.array(self._matrix[row])
+            self._remember(key, vector)
+            return vector
+        return None
+
+    def __len__(self):
+        return max(len(self._index), len(self._memory))
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray],
+               persist: bool = True) -> np.ndarray:
+        """Return embeddings for ``texts`` in order, encoding only texts not seen before.
+
+        ``encode_fn`` receives the unique, uncached texts and must return one
+        row per text. With ``persist=False`` new embeddings only enter the
+        memory tier.
+        """
+        texts = [normalize_text(text) for text in texts]
+        keys = [text_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                vector = self._lookup(key)
+                if vector is None:
+                    missing[key] = text
+                else:
+                    found[key] = vector
+            miss_count = sum(1 for key in keys if key in missing)
+            self.hits += len(keys) - miss_count
+            self.misses += miss_count
+
+        if missing:
+            logger.info(f"Embedding cache: encoding {len(missing)} new texts ({len(found)} cached)")
+            new_keys = list(missing.keys())
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            if vectors.ndim != 2 or len(vectors) != len(new_keys):
+                raise ValueError(f"Encoder returned shape {vectors.shape} for {len(new_keys)} texts")
+            with self._lock:
+                if persist:
+                    fresh = [key for key in new_keys if key not in self._index]
+                    rows = [i for i, key in enumerate(new_keys) if key not in self._index]
+                    self._append_to_disk(fresh, vectors[rows])
+                for key, vector in zip(new_keys, vectors):
+                    self._remember(key, vector)
+                    found[key] = vector
+
+        if not keys:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+
+_caches: Dict[tuple, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, cache_dir: Optional[str] = CACHE_DIR) -> EmbeddingCache:
+    """Return the shared cache instance for an embedding model."""
+    key = (normalize_model_name(model_name), cache_dir)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(model_name, cache_dir=cache_dir)
+            _caches[key] = cache
+        return cache
+
+
+def cached_encode(model_name: str, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray],
+                  cache_dir: Optional[str] = CACHE_DIR, persist: bool = True) -> np.ndarray:
+    """Encode texts through the shared embedding cache for ``model_name``.
+
+    Serving passes ``persist=False`` so untrusted request texts are never written to disk.
+    """
+    if not CACHE_ENABLED:
+        return np.asarray(encode_fn(list(texts)), dtype=np.float32)
+    return get_embedding_cache(model_name, cache_dir=cache_dir).encode(texts, encode_fn, persist=persist)
@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.embedding_cache import HASH_DTYPE, cached_encode, encoder_name, text_hash  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# A full refit is triggered when new documents are outliers this much more often than the training corpus,
+INCREMENTAL_OUTLIER_MARGIN = float(os.environ.get("INCREMENTAL_OUTLIER_MARGIN", "0.15"))
+# when their mean similarity to the assigned topic drops by more than this,
+INCREMENTAL_MAX_SIMILARITY_DROP = float(os.environ.get("INCREMENTAL_MAX_SIMILARITY_DROP", "0.1"))
+# or when the documents added since the last full fit exceed this share of the corpus it was fitted on
+INCREMENTAL_MAX_GROWTH = float(os.environ.get("INCREMENTAL_MAX_GROWTH", "0.5"))
+
+
+def topic_indicator(topics: np.ndarray, rows: int, offset: int) -> sp.csr_matrix:
+    """Sparse (rows x documents) matrix with a 1 where document j belongs to the topic of row i.
+
+    Outliers (-1) of a model without an outlier row (``offset == 0``) get an empty column.
+    """
+    topics = np.asarray(topics, dtype=np.int64)
+    row_ids = topics + offset
+    columns = np.flatnonzero(row_ids >= 0)
+    return sp.csr_matrix((np.ones(len(columns), dtype=np.float32), (row_ids[columns], columns)),
+                         shape=(rows, len(topics)))
+
+
+def document_term_counts(topic_model, texts: List[str]) -> sp.csr_matrix:
+    """Bag-of-words counts per document, with the text cleaning BERTopic applies before c-TF-IDF."""
+    documents = topic_model._preprocess_text(np.asarray(texts, dtype=object))
+    return topic_model.vectorizer_model.transform(documents)
+
+
+def topic_similarities(topic_embeddings: np.ndarray, embeddings: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every document to the embedding of its topic."""
+    centroids = np.asarray(topic_embeddings, dtype=np.float32)[rows]
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(centroids, axis=1) * np.linalg.norm(embeddings, axis=1)
+    return (centroids * embeddings).sum(axis=1) / np.maximum(norms, 1e-12)
+
+
+def init_incremental_state(topic_model, texts: List[str], topics, embeddings: np.ndarray):
+    """Record what incremental updates need on a freshly fitted model.
+
+    Stores the hashes of the training texts (to find new documents later),
+    the raw topic x term counts behind ``c_tf_idf_`` and the baseline
+    outlier ratio and topic similarity new documents are compared against.
+    """
+    topics = np.asarray(topics, dtype=np.int64)
+    offset = int(getattr(topic_model, "_outliers", 1))
+    rows = topic_model.c_tf_idf_.shape[0]
+    counts = topic_indicator(topics, rows, offset) @ document_term_counts(topic_model, texts)
+    assigned = topics != -1
+
+    topic_model.document_hashes_ = np.asarray([text_hash(text) for text in texts], dtype=HASH_DTYPE)
+    topic_model.topic_term_counts_ = sp.csr_matrix(counts, dtype=np.float32)
+    topic_model.incremental_state_ = {
+        "base_documents": len(texts),
+        "added_documents": 0,
+        "updates": 0,
+        "outlier_ratio": float(1 - assigned.mean()) if len(topics) else 0.0,
+        "topic_similarity": float(topic_similarities(topic_model.topic_embeddings_, embeddings[assigned],
+                                                     topics[assigned] + offset).mean()) if assigned.any() else 0.0,
+        "fitted_at": time.time(),
+    }
+
+
+def refit_reason(state: Dict, new_documents: int, outlier_ratio: float, topic_similarity: Optional[float]) -> Optional[str]:
+    """Why the new documents call for a full refit instead of an incremental update, or None."""
+    if outlier_ratio > state["outlier_ratio"] + INCREMENTAL_OUTLIER_MARGIN:
+        return f"outlier ratio {outlier_ratio:.2f} vs {state['outlier_ratio']:.2f} at fit time"
+    if topic_similarity is not None and topic_similarity < state["topic_similarity"] - INCREMENTAL_MAX_SIMILARITY_DROP:
+        return f"topic similarity {topic_similarity:.3f} vs {state['topic_similarity']:.3f} at fit time"
+    growth = (state["added_documents"] + new_documents) / max(state["base_documents"], 1)
+    if growth > INCREMENTAL_MAX_GROWTH:
+        return f"corpus grew by {growth:.0%} since the last full fit"
+    return None
+
+
+def _update_representations(topic_model, affected: np.ndarray):
+    """Recompute c-TF-IDF rows, topic words and labels of the affected topics with the fitted IDF."""
+    offset = int(getattr(topic_model, "_outliers", 1))
+    rows = sp.csr_matrix(topic_model.ctfidf_model.transform(topic_model.topic_term_counts_[affected].copy()))
+    # Swap the affected rows: zero them, then scatter in the recomputed ones
+    keep = np.ones(topic_model.c_tf_idf_.shape[0], dtype=np.float32)
+    keep[affected] = 0
+    scatter = sp.csr_matrix((np.ones(len(affected), dtype=np.float32), (affected, np.arange(len(affected)))),
+                            shape=(len(keep), len(affected)))
+    topic_model.c_tf_idf_ = sp.csr_matrix(sp.diags(keep) @ topic_model.c_tf_idf_ + scatter @ rows)
+
+    words = topic_model.vectorizer_model.get_feature_names_out()
+    top_n = topic_model.top_n_words
+    for row, values in zip(affected, rows):
+        topic = int(row) - offset
+        best = np.argsort(-values.data, kind="stable")[:top_n]
+        representation = [(str(words[values.indices[i]]), float(values.data[i])) for i in best if values.data[i] > 0]
+        # Padded like BERTopic pads topics with fewer words than top_n_words
+        topic_model.topic_representations_[topic] = representation + [("", 0.00001)] * (top_n - len(representation))
+        if getattr(topic_model, "topic_labels_", None) is not None:
+            topic_model.topic_labels_[topic] = f"{topic}_" + "_".join(word for word, _ in representation[:4])
+
+
+def update_topic_model(topic_model, texts: List[str], embeddings: np.ndarray, force: bool = False) -> Dict:
+    """Fold new documents into a fitted model without refitting it.
+
+    Documents are assigned to the existing topics with ``transform``; the
+    term counts, c-TF-IDF rows, words, sizes and embeddings of only the
+    topics that received documents are updated. The IDF and the UMAP/HDBSCAN
+    models stay as fitted. Returns ``{"refit": reason}`` without touching the
+    model when the documents cross a drift threshold (unless ``force``).
+    """
+    state = topic_model.incremental_state_
+    offset = int(getattr(topic_model, "_outliers", 1))
+    topics, _ = topic_model.transform(texts, embeddings=embeddings)
+    topics = np.asarray(topics, dtype=np.int64)
+    assigned = topics != -1
+
+    outlier_ratio = float(1 - assigned.mean())
+    similarity = (float(topic_similarities(topic_model.topic_embeddings_, embeddings[assigned],
+                                           topics[assigned] + offset).mean()) if assigned.any() else None)
+    reason = refit_reason(state, len(texts), outlier_ratio, similarity)
+    if reason and not force:
+        return {"refit": reason, "new_documents": len(texts), "outlier_ratio": outlier_ratio}
+
+    rows = topic_model.c_tf_idf_.shape[0]
+    indicator = topic_indicator(topics, rows, offset)
+    topic_model.topic_term_counts_ = topic_model.topic_term_counts_ + indicator @ document_term_counts(topic_model, texts)
+    affected = np.flatnonzero(np.asarray(indicator.sum(axis=1)).ravel())
+
+    # Running mean: old topic embedding weighted by the documents it was computed from
+    sizes = np.array([topic_model.topic_sizes_.get(int(row) - offset, 0) for row in affected], dtype=np.float32)
+    added = np.asarray(indicator[affected].sum(axis=1), dtype=np.float32)
+    topic_embeddings = np.array(topic_model.topic_embeddings_, dtype=np.float32)
+    sums = indicator[affected] @ np.asarray(embeddings, dtype=np.float32)
+    topic_embeddings[affected] = (topic_embeddings[affected] * sizes[:, None] + sums) / (sizes[:, None] + added)
+    topic_model.topic_embeddings_ = topic_embeddings
+
+    _update_representations(topic_model, affected)
+    for row, count in zip(affected, added.ravel()):
+        topic = int(row) - offset
+        topic_model.topic_sizes_[topic] = topic_model.topic_sizes_.get(topic, 0) + int(count)
+    if getattr(topic_model, "topics_", None) is not None:
+        topic_model.topics_ = list(topic_model.topics_) + topics.tolist()
+    topic_model.document_hashes_ = np.concatenate(
+        [topic_model.document_hashes_, np.asarray([text_hash(text) for text in texts], dtype=HASH_DTYPE)])
+    state["added_documents"] += len(texts)
+    state["updates"] += 1
+    state["updated_at"] = time.time()
+    return {"refit": None, "new_documents": len(texts), "outlier_ratio": round(outlier_ratio, 4),
+            "topic_similarity": round(similarity, 4) if similarity is not None else None,
+            "topics_updated": len(affected)}
+
+
+def new_documents(topic_model, texts: List[str]) -> List[str]:
+    """Texts (deduplicated) the model has not been fitted or updated with."""
+    known = set(topic_model.document_hashes_.tolist())
+    fresh = {}
+    for text in texts:
+        key = text_hash(text)
+        if key not in known and key not in fresh:
+            fresh[key] = text
+    return list(fresh.values())
+
+
+def update_model(force: bool = False) -> bool:
+    """Update the served model with the documents added to the training data since it was fitted.
+
+    Falls back to ``retrain_model`` for models without incremental state and
+    when the new documents cross a drift threshold.
+    """
+    import joblib
+    from model.retrain_model import (DATA_PATH, EMBEDDING_MODEL, ORIGINAL_MODEL_PATH, install_model,
+                                     load_training_texts, retrain_model)
+
+    try:
+        if not os.path.exists(ORIGINAL_MODEL_PATH):
+            logger.info("No trained model yet, running a full fit")
+            return retrain_model()
+        texts = load_training_texts(DATA_PATH)
+        if texts is None:
+            return False
+
+        logger.info(f"Loading model from {ORIGINAL_MODEL_PATH}")
+        topic_model = joblib.load(ORIGINAL_MODEL_PATH)
+        if getattr(topic_model, "incremental_state_", None) is None:
+            logger.info("Model has no incremental state, running a full fit")
+            return retrain_model()
+
+        texts = new_documents(topic_model, texts)
+        if not texts:
+            logger.info("No new documents since the last update")
+            return True
+
+        logger.info(f"Embedding {len(texts)} new documents")
+        backend = topic_model.embedding_model
+        sentence_model = getattr(backend, "embedding_model", backend)
+        # Models fitted before the encoder name was recorded get it now, so serving keeps one namespace
+        topic_model.embedding_model_name = encoder_name(topic_model) or EMBEDDING_MODEL
+        embeddings = cached_encode(topic_model.embedding_model_name, texts, sentence_model.encode)
+
+        result = update_topic_model(topic_model, texts, embeddings, force=force)
+        if result["refit"]:
+            logger.info(f"Full refit needed: {result['refit']}")
+            return retrain_model()
+        logger.info(f"Incremental update: {result}")
+        install_model(topic_model)
+        return True
+
+    except Exception as e:
+        logger.error(f"Incremental update failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fold new training documents into the served topic model")
+    parser.add_argument("--force", action="store_true", help="Update incrementally even past the drift thresholds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if update_model(force=args.force):
+        print("✅ Model updated successfully!")
+    else:
+        print("❌ Model update failed!")
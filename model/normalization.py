@@ -0,0 +1,77 @@
+import os
+import logging
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from preprocessing.text_cleaning import CLEANING_VERSION, clean_text, get_stopwords, remove_first_word
+
+logger = logging.getLogger(__name__)
+
+# Memoized normalizations kept per model (unique input texts)
+NORMALIZATION_CACHE_SIZE = int(os.getenv("NORMALIZATION_CACHE_SIZE", "50000"))
+
+STEPS = {
+    "clean_text": None,
+    "remove_first_word": remove_first_word,
+}
+# remove_first_word strips the issue prefix of scraped titles; free-text requests have none
+DEFAULT_STEPS = ("clean_text",)
+
+
+class TextNormalizer:
+    """Inference-time copy of the text cleaning a model was trained with.
+
+    The rules (cleaning version, steps and stopword list) are described by a
+    JSON-serializable spec that is stored with the model artifact, so a
+    served model keeps normalizing its inputs the way its training data was
+    normalized. Results are memoized per unique input text.
+    """
+
+    def __init__(self, version: int = CLEANING_VERSION, steps: Iterable[str] = DEFAULT_STEPS,
+                 stopwords: Optional[Iterable[str]] = None, cache_size: int = NORMALIZATION_CACHE_SIZE):
+        self.version = int(version)
+        self.steps = tuple(steps)
+        unknown = [step for step in self.steps if step not in STEPS]
+        if unknown:
+            raise ValueError(f"Unknown normalization steps: {', '.join(unknown)}")
+        if self.version != CLEANING_VERSION:
+            logger.warning(f"Model was trained with cleaning version {self.version}, "
+                           f"this build implements version {CLEANING_VERSION}")
+        # Resolved now, so a missing NLTK corpus fails the model load rather than the first request
+        if stopwords is None:
+            stopwords = get_stopwords() if "clean_text" in self.steps else ()
+        self.stopwords = frozenset(stopwords)
+        self._normalize_one = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, text: str) -> str:
+        for step in self.steps:
+            if step == "clean_text":
+                text = clean_text(text, self.stopwords)
+            else:
+                text = STEPS[step](text)
+        return text
+
+    def __call__(self, texts: List[str]) -> List[str]:
+        """Normalize a batch; each distinct text is cleaned once."""
+        texts = ['' if text is None or text != text else str(text) for text in texts]
+        normalized = {text: self._normalize_one(text) for text in dict.fromkeys(texts)}
+        return [normalized[text] for text in texts]
+
+    def spec(self) -> Dict:
+        return {"version": self.version, "steps": list(self.steps), "stopwords": sorted(self.stopwords)}
+
+    @classmethod
+    def from_spec(cls, spec: Optional[Dict]) -> "TextNormalizer":
+        if not spec:
+            return cls()
+        return cls(version=spec.get("version", CLEANING_VERSION), steps=spec.get("steps", DEFAULT_STEPS),
+                   stopwords=spec.get("stopwords"))
+
+
+def build_normalizer(model) -> TextNormalizer:
+    """Normalizer for a loaded model, from the spec stored in its artifact if any.
+
+    Models pickled before the spec existed get the current default rules,
+    with the stopword list resolved here; exported bundles store that list.
+    """
+    return TextNormalizer.from_spec(getattr(model, 'preprocessing_spec', None))
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_FORMAT = "ptiik-onnx-embedding"
+CONFIG_NAME = "onnx_config.json"
+MODEL_FILE = "model.onnx"
+# 0 lets ONNX Runtime use one thread per physical core
+ONNX_INTRA_OP_THREADS = "ONNX_INTRA_OP_THREADS"
+
+
+def _pooling_mode(sentence_model) -> str:
+    for module in sentence_model:
+        if type(module).__name__ == "Pooling":
+            config = module.get_config_dict()
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+            if config.get("pooling_mode_max_tokens"):
+                return "max"
+            return "mean"
+    return "mean"
+
+
+def export_onnx(sentence_model, output_dir: str, source: Optional[str] = None, quantize: bool = True,
+                opset: int = 17) -> Dict:
+    """Export a SentenceTransformer's encoder to ONNX, optionally with dynamic int8 quantization.
+
+    Only the transformer runs in ONNX; pooling and normalization are
+    re-applied in numpy by ``OnnxEmbeddingBackend`` from the settings
+    recorded in ``onnx_config.json``.
+    """
+    import torch
+
+    transformer = sentence_model[0]
+    hf_model = transformer.auto_model.to("cpu").eval()
+    tokenizer = transformer.tokenizer
+    os.makedirs(output_dir, exist_ok=True)
+
+    sample = tokenizer(["contoh kalimat untuk ekspor"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    fp32_path = os.path.join(output_dir, "model_fp32.onnx" if quantize else MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(_Encoder(hf_model), tuple(sample[name] for name in input_names), fp32_path,
+                          input_names=input_names, output_names=["token_embeddings"], dynamic_axes=dynamic_axes,
+                          opset_version=opset, do_constant_folding=True)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(output_dir, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+    tokenizer.save_pretrained(output_dir)
+    config = {
+        "format": ONNX_FORMAT,
+        "source": source,
+        "inputs": input_names,
+        "pooling": _pooling_mode(sentence_model),
+        "normalize": any(type(module).__name__ == "Normalize" for module in sentence_model),
+        "max_seq_length": int(transformer.max_seq_length),
+        "quantized": quantize,
+    }
+    with open(os.path.join(output_dir, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    logger.info(f"Exported {'int8' if quantize else 'fp32'} ONNX encoder to {output_dir}")
+    return config
+
+
+def is_onnx_export(path: str) -> bool:
+    return os.path.exists(os.path.join(path, CONFIG_NAME)) and os.path.exists(os.path.join(path, MODEL_FILE))
+
+
+def pool(token_embeddings: np.ndarray, attention_mask: np.ndarray, mode: str, normalize: bool) -> np.ndarray:
+    """Sentence embeddings from token embeddings, as the SentenceTransformer Pooling/Normalize modules compute them."""
+    mask = attention_mask[..., None].astype(np.float32)
+    if mode == "cls":
+        embeddings = token_embeddings[:, 0]
+    elif mode == "max":
+        embeddings = np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+    else:
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    return embeddings.astype(np.float32)
+
+
+class OnnxEmbeddingBackend:
+    """BERTopic-compatible embedding backend running an exported encoder under ONNX Runtime.
+
+    Drop-in for the SentenceTransformer backend (``embed_documents`` /
+    ``embed``), so ``BERTopic.transform`` and ``predict_topic`` use it
+    without changes. Documents are encoded in length-sorted batches. The
+    session is created lazily per process because ONNX Runtime sessions do
+    not survive ``fork``.
+    """
+
+    def __init__(self, model_dir: str, intra_op_threads: Optional[int] = None, batch_size: int = 32):
+        self.model_dir = model_dir
+        with open(os.path.join(model_dir, CONFIG_NAME), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        if self.config.get("format") != ONNX_FORMAT:
+            raise ValueError(f"{model_dir} is not a {ONNX_FORMAT} export")
+        self.intra_op_threads = intra_op_threads
+        self.batch_size = batch_size
+        self._session = None
+        self._session_pid = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_name(self) -> str:
+        """Embedding cache namespace; quantized vectors must not mix with the torch model's."""
+        return f"{self.config.get('source') or 'onnx'}#onnx{'-int8' if self.config.get('quantized') else ''}"
+
+    def _threads(self) -> int:
+        if self.intra_op_threads is not None:
+            return self.intra_op_threads
+        return int(os.environ.get(ONNX_INTRA_OP_THREADS, "0"))
+
+    @property
+    def session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self._threads()
+                    options.inter_op_num_threads = 1
+                    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(os.path.join(self.model_dir, MODEL_FILE), options,
+                                                         providers=["CPUExecutionProvider"])
+                    self._session_pid = os.getpid()
+                    threads = options.intra_op_num_threads or 'auto'
+                    logger.info(f"Loaded ONNX encoder from {self.model_dir} ({threads} threads)")
+        return self._session
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        return self._tokenizer
+
+    def _encode_batch(self, documents: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(documents, padding=True, truncation=True,
+                                max_length=self.config.get("max_seq_length", 256), return_tensors="np")
+        feeds = {name: tokens[name].astype(np.int64) for name in self.config["inputs"]}
+        token_embeddings = self.session.run(None, feeds)[0]
+        return pool(token_embeddings, tokens["attention_mask"], self.config.get("pooling", "mean"),
+                    self.config.get("normalize", False))
+
+    def embed_documents(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        documents = list(documents)
+        if not documents:
+            return np.empty((0, 0), dtype=np.float32)
+        # Similar lengths share a batch, so little padding is computed
+        order = np.argsort([len(document) for document in documents], kind="stable")
+        batches = [self._encode_batch([documents[i] for i in order[start:start + self.batch_size]])
+                   for start in range(0, len(order), self.batch_size)]
+        embeddings = np.empty((len(documents), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+        return embeddings
+
+    def embed(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        return self.embed_documents(documents, verbose)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"], state["_session_pid"], state["_tokenizer"], state["_lock"] = None, None, None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def use_onnx_backend(model, model_dir: str, intra_op_threads: Optional[int] = None) -> bool:
+    """Replace a loaded topic model's embedding backend with the ONNX export in ``model_dir``."""
+    if not is_onnx_export(model_dir):
+        logger.warning(f"No ONNX export in {model_dir}; keeping the PyTorch embedding backend")
+        return False
+    model.embedding_model = OnnxEmbeddingBackend(model_dir, intra_op_threads=intra_op_threads)
+    logger.info(f"Using ONNX embedding backend from {model_dir}")
+    return True
+
+
+def parity_check(reference, candidate, texts: List[str], model=None) -> Dict:
+    """Compare two embedding backends on ``texts``: vector similarity, latency and (with ``model``) topics."""
+
+    def timed(backend):
+        backend.embed_documents(texts[:8])  # warm up (session creation, lazy loading)
+        start = time.perf_counter()
+        embeddings = np.asarray(backend.embed_documents(texts), dtype=np.float32)
+        return embeddings, time.perf_counter() - start
+
+    reference_embeddings, reference_seconds = timed(reference)
+    candidate_embeddings, candidate_seconds = timed(candidate)
+    a = reference_embeddings / np.clip(np.linalg.norm(reference_embeddings, axis=1, keepdims=True), 1e-12, None)
+    b = candidate_embeddings / np.clip(np.linalg.norm(candidate_embeddings, axis=1, keepdims=True), 1e-12, None)
+    cosine = (a * b).sum(axis=1)
+
+    report = {
+        "texts": len(texts),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "cosine_p5": round(float(np.quantile(cosine, 0.05)), 5),
+        "reference_ms_per_text": round(1000 * reference_seconds / len(texts), 3),
+        "candidate_ms_per_text": round(1000 * candidate_seconds / len(texts), 3),
+        "speedup": round(reference_seconds / candidate_seconds, 2) if candidate_seconds > 0 else None,
+    }
+    if model is not None:
+        reference_topics, _ = model.transform(texts, embeddings=reference_embeddings)
+        candidate_topics, _ = model.transform(texts, embeddings=candidate_embeddings)
+        report["topic_agreement"] = round(float(np.mean(np.asarray(reference_topics) == np.asarray(candidate_topics))), 4)
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check it against PyTorch")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Export a SentenceTransformer to ONNX")
+    export_parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    export_parser.add_argument("--output", default=os.path.join(base_dir, "onnx_embedding"))
+    export_parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights")
+    check_parser = commands.add_parser("check", help="Accuracy/latency parity against the PyTorch backend")
+    check_parser.add_argument("--onnx", default=os.path.join(base_dir, "onnx_embedding"))
+    check_parser.add_argument("--data", default=os.path.join(base_dir, "..", "data", "cleaned", "cleaned_data.csv"))
+    check_parser.add_argument("--column", default=None, help="Text column (default: title/Judul)")
+    check_parser.add_argument("--sample", type=int, default=500)
+    check_parser.add_argument("--topics", action="store_true", help="Also compare topics with the served model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from sentence_transformers import SentenceTransformer
+
+    if args.command == "export":
+        sentence_model = SentenceTransformer(args.model, device="cpu")
+        config = export_onnx(sentence_model, args.output, source=args.model, quantize=not args.no_quantize)
+        print(json.dumps(config, indent=2))
+    else:
+        from preprocessing.storage import read_dataset, title_column
+
+        candidate = OnnxEmbeddingBackend(args.onnx)
+        source = candidate.config.get("source") or "sentence-transformers/all-MiniLM-L6-v2"
+        sentence_model = SentenceTransformer(source, device="cpu")
+
+        class _TorchBackend:
+            def embed_documents(self, documents, verbose=False):
+                return sentence_model.encode(documents, show_progress_bar=False)
+
+        column = args.column or title_column(args.data)
+        texts = read_dataset(args.data, columns=[column])[column].dropna().astype(str)
+        texts = texts.sample(min(args.sample, len(texts)), random_state=42).tolist()
+        model = None
+        if args.topics:
+            from model.predict import load_model_from_path, default_model_path
+            model = load_model_from_path(default_model_path())
+        print(json.dumps(parity_check(_TorchBackend(), candidate, texts, model), indent=2))
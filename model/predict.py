@@ -1,9 +1,17 @@
 import joblib
+import numpy as np
 import pandas as pd
 import os
 import logging
+import threading
 import torch
-from typing import List
+from typing import Dict, List, Optional
+from model.embedding_cache import cached_encode, encoder_name
+from model.artifact import EMBEDDING_ONNX_DIR, is_bundle, load_bundle
+from model.registry import ModelRegistry, default_version
+from model.normalization import build_normalizer
+from model.centroid import build_assigner, top_k
+from model.onnx_backend import use_onnx_backend
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,128 +20,345 @@ logger = logging.getLogger(__name__)
 # Model configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20.pkl")
+# Serving bundle exported with model/artifact.py; preferred over the pickle when present
+MODEL_BUNDLE_DIR = os.environ.get("MODEL_BUNDLE_DIR", os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_bundle"))
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# "onnx" runs the encoder exported with model/onnx_backend.py under ONNX Runtime instead of PyTorch
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# ONNX export used for pickled models; bundles carry their own in embedding_onnx/
+ONNX_EMBEDDING_DIR = os.environ.get("ONNX_EMBEDDING_DIR", os.path.join(BASE_DIR, "onnx_embedding"))
 
-# Global model variable
-_model = None
+# Assign topics by cosine similarity to topic centroids instead of UMAP + HDBSCAN (see model/centroid.py)
+FAST_INFERENCE = os.environ.get("FAST_INFERENCE", "0") == "1"
+# Below this centroid similarity a document is labelled as an outlier; 0 always assigns a topic
+FAST_INFERENCE_MIN_SIMILARITY = float(os.environ.get("FAST_INFERENCE_MIN_SIMILARITY", "0"))
 
-def load_model():
-    global _model
-    if _model is None:
-        if not os.path.exists(MODEL_PATH):
-            logger.error(f"Model file not found at {MODEL_PATH}")
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-        
-        logger.info(f"Loading BERTopic model from {MODEL_PATH}")
-        
-        # Check if CUDA is available
-        cuda_available = torch.cuda.is_available()
-        logger.info(f"CUDA available: {cuda_available}")
-        
-        if cuda_available:
-            logger.info("Loading model with CUDA support")
-            _model = joblib.load(MODEL_PATH)
-        else:
-            logger.info("Loading model for CPU-only environment")
-            # Try loading with CPU mapping - simplified approach
+OUTLIER_LABEL = "Outlier"
+WARMUP_TEXTS = ["test text for model verification"]
+
+def build_topic_label_table(model) -> np.ndarray:
+    """Build an immutable array of topic labels indexed by topic id + 1."""
+    precomputed = getattr(model, 'topic_label_table', None)
+    if isinstance(precomputed, np.ndarray):
+        return precomputed
+
+    topic_ids = []
+    try:
+        topic_ids = [int(topic) for topic in model.get_topics().keys()]
+    except Exception as e:
+        logger.warning(f"Could not list topics from model: {e}")
+
+    size = max(topic_ids, default=-1) + 2
+    labels = np.empty(size, dtype=object)
+    labels[0] = OUTLIER_LABEL
+    for topic in range(size - 1):
+        labels[topic + 1] = f"Topic_{topic}"
+
+    for topic in topic_ids:
+        if topic < 0:
+            continue
+        try:
+            topic_words = model.get_topic(topic)
+        except Exception as topic_error:
+            logger.warning(f"Error getting topic words for topic {topic}: {topic_error}")
+            continue
+        if topic_words:
+            # Create label from top 3 words
+            top_words = [word for word, _ in topic_words[:3]]
+            labels[topic + 1] = f"Topic_{topic}: {', '.join(top_words)}"
+
+    labels.setflags(write=False)
+    logger.info(f"Built topic label table with {size - 1} topics")
+    return labels
+
+def set_model(model, version: str = "manual"):
+    """Install a loaded model and rebuild its topic label table."""
+    return registry.install(model, version).model
+
+def get_topic_labels(topics, labels: np.ndarray = None) -> List[str]:
+    """Map topic ids to labels with a single gather over the label table."""
+    if labels is None:
+        labels = get_active_slot().labels
+    topics = np.asarray(topics, dtype=np.int64).ravel()
+    index = topics + 1
+    in_range = (index >= 0) & (index < len(labels))
+    result = labels[np.where(in_range, index, 0)]
+    if not in_range.all():
+        # Topics unknown to the table (should not happen for a consistent model)
+        result[~in_range] = [f"Topic_{topic}" for topic in topics[~in_range]]
+    return result.tolist()
+
+def embed_documents(model, texts: List[str], encoder: Optional[str] = None):
+    """Embed texts with the model's own encoder, going through the shared embedding cache.
+
+    Request texts are looked up in, but never written to, the disk tier.
+
+    ``encoder`` is the cache namespace recorded on the model's registry slot;
+    without it the namespace is resolved from the model. Returns None when
+    the model has no usable embedding backend, in which case BERTopic
+    encodes the documents itself.
+    """
+    backend = getattr(model, 'embedding_model', None)
+    if backend is None or not hasattr(backend, 'embed_documents'):
+        return None
+    model_name = encoder or encoder_name(model) or EMBEDDING_MODEL_NAME
+    return cached_encode(model_name, texts, lambda docs: backend.embed_documents(docs, verbose=False), persist=False)
+
+def _load_pickled_model(model_path: str = MODEL_PATH):
+    """Load the joblib-pickled BERTopic model, mapping CUDA tensors to CPU if needed."""
+    if not os.path.exists(model_path):
+        logger.error(f"Model file not found at {model_path}")
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+    
+    logger.info(f"Loading BERTopic model from {model_path}")
+    
+    # Check if CUDA is available
+    cuda_available = torch.cuda.is_available()
+    logger.info(f"CUDA available: {cuda_available}")
+    
+    if cuda_available:
+        logger.info("Loading model with CUDA support")
+        model = joblib.load(model_path)
+    else:
+        logger.info("Loading model for CPU-only environment")
+        # Try loading with CPU mapping - simplified approach
+        try:
+            # Set environment to force CPU usage
+            os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+            
+            # Method 1: Patch torch.load to force CPU mapping
+            original_load = torch.load
+            
+            def cpu_load(f, map_location=None, **kwargs):
+                return original_load(f, map_location='cpu', **kwargs)
+            
+            torch.load = cpu_load
+            
             try:
-                # Set environment to force CPU usage
-                os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
-                
-                # Method 1: Patch torch.load to force CPU mapping
-                original_load = torch.load
+                # Also patch sklearn imports for compatibility
+                import sklearn.metrics._dist_metrics
                 
-                def cpu_load(f, map_location=None, **kwargs):
-                    return original_load(f, map_location='cpu', **kwargs)
+                # Try to add missing attributes for compatibility
+                if not hasattr(sklearn.metrics._dist_metrics, 'EuclideanDistance'):
+                    from sklearn.metrics import DistanceMetric
+                    sklearn.metrics._dist_metrics.EuclideanDistance = DistanceMetric.get_metric('euclidean')
                 
-                torch.load = cpu_load
+                model = joblib.load(model_path)
+                logger.info("Model loaded successfully with CPU mapping")
+            finally:
+                # Restore original torch.load
+                torch.load = original_load
                 
-                try:
-                    # Also patch sklearn imports for compatibility
-                    import sklearn.metrics._dist_metrics
-                    
-                    # Try to add missing attributes for compatibility
-                    if not hasattr(sklearn.metrics._dist_metrics, 'EuclideanDistance'):
-                        from sklearn.metrics import DistanceMetric
-                        sklearn.metrics._dist_metrics.EuclideanDistance = DistanceMetric.get_metric('euclidean')
-                    
-                    _model = joblib.load(MODEL_PATH)
-                    logger.info("Model loaded successfully with CPU mapping")
-                finally:
-                    # Restore original torch.load
-                    torch.load = original_load
-                    
-            except Exception as cpu_error:
-                logger.warning(f"CPU loading failed: {cpu_error}")
-                
-                # Method 2: Try loading the CPU-converted version if it exists
-                cpu_model_path = MODEL_PATH.replace('.pkl', '_cpu.pkl')
-                if os.path.exists(cpu_model_path):
-                    logger.info(f"Trying CPU-converted model: {cpu_model_path}")
-                    _model = joblib.load(cpu_model_path)
-                    logger.info("CPU-converted model loaded successfully")
-                else:
-                    logger.error("No CPU-compatible model available")
-                    raise cpu_error
-        
-        logger.info("BERTopic model loaded successfully")
-        
-        # Verify model is working
-        try:
-            # Test with a simple prediction
-            test_text = ["test text for model verification"]
-            if hasattr(_model, 'transform'):
-                _ = _model.transform(test_text)
-                logger.info("Model verification successful")
-            else:
-                logger.error("Model loaded but transform method not available")
-                raise AttributeError("Model does not have transform method")
-        except Exception as verify_error:
-            logger.error(f"Model verification failed: {verify_error}")
-            raise verify_error
+        except Exception as cpu_error:
+            logger.warning(f"CPU loading failed: {cpu_error}")
             
-    return _model
+            # Method 2: Try loading the CPU-converted version if it exists
+            cpu_model_path = model_path.replace('.pkl', '_cpu.pkl')
+            if os.path.exists(cpu_model_path):
+                logger.info(f"Trying CPU-converted model: {cpu_model_path}")
+                model = joblib.load(cpu_model_path)
+                logger.info("CPU-converted model loaded successfully")
+            else:
+                logger.error("No CPU-compatible model available")
+                raise cpu_error
+    
+    logger.info("BERTopic model loaded successfully")
+    return model
+
+def load_model_from_path(path: str):
+    """Load a serving bundle directory or a pickled BERTopic model."""
+    if is_bundle(path):
+        model = load_bundle(path)
+        onnx_dir = os.path.join(path, EMBEDDING_ONNX_DIR)
+        if EMBEDDING_BACKEND == "onnx":
+            model.check(EMBEDDING_ONNX_DIR)
+    else:
+        model = _load_pickled_model(path)
+        onnx_dir = ONNX_EMBEDDING_DIR
+    if EMBEDDING_BACKEND == "onnx":
+        use_onnx_backend(model, onnx_dir)
+    return model
+
+def build_fast_assigner(model):
+    return build_assigner(model, FAST_INFERENCE_MIN_SIMILARITY) if FAST_INFERENCE else None
+
+def warmup_model(model):
+    """Run a verification transform so a model is fully loaded before it serves traffic."""
+    try:
+        if hasattr(model, 'transform'):
+            _ = model.transform(WARMUP_TEXTS)
+            logger.info("Model verification successful")
+        else:
+            logger.error("Model loaded but transform method not available")
+            raise AttributeError("Model does not have transform method")
+    except Exception as verify_error:
+        logger.error(f"Model verification failed: {verify_error}")
+        raise verify_error
+
+# Versioned model slots; new versions are loaded and warmed before being swapped in
+registry = ModelRegistry(load_model_from_path, build_topic_label_table, warmup=warmup_model,
+                         normalizer_builder=build_normalizer, assigner_builder=build_fast_assigner,
+                         encoder_resolver=encoder_name)
+_registry_lock = threading.Lock()
+
+def default_model_path() -> str:
+    return MODEL_BUNDLE_DIR if is_bundle(MODEL_BUNDLE_DIR) else MODEL_PATH
+
+def get_active_slot():
+    """Return the active model slot, loading the default model on first use."""
+    slot = registry.active
+    if slot is None:
+        with _registry_lock:
+            slot = registry.active
+            if slot is None:
+                slot = registry.load(default_model_path())
+    return slot
+
+def load_model():
+    return get_active_slot().model
+
+def activate_latest_model(path: str = None):
+    """Make the artifact at ``path`` (default: the served model) active unless it already is.
+
+    Long-lived processes (e.g. the job worker) use this to pick up a model
+    that was retrained since they loaded theirs.
+    """
+    path = path or default_model_path()
+    version = default_version(path)
+    if registry.active_version != version:
+        with _registry_lock:
+            if registry.active_version != version:
+                registry.load(path, version)
+    return registry.active
+
+def model_snapshot():
+    """``(version, path)`` of the active model, loading the default model if needed."""
+    slot = get_active_slot()
+    return slot.version, slot.path
+
+def restore_model(snapshot):
+    """Make the model described by ``model_snapshot()`` active in this process (e.g. a worker)."""
+    version, path = snapshot
+    if registry.active_version == version:
+        return
+    if path is None:
+        raise RuntimeError(f"Model version {version} was installed in memory and cannot be reloaded")
+    registry.load(path, version)
+
+def deduplicate_documents(documents: List[str]):
+    """Distinct documents ordered by length, and the position of every input among them.
+
+    Duplicates are encoded and transformed once; ordering by length puts
+    documents of similar length into the same encoder batch so less padding
+    is computed. ``result[inverse]`` restores the input order.
+    """
+    unique = sorted(dict.fromkeys(documents), key=len)
+    position = {document: i for i, document in enumerate(unique)}
+    return unique, np.fromiter((position[document] for document in documents), dtype=np.int64, count=len(documents))
+
+def _prepare_documents(texts: List[str]):
+    if not texts:
+        raise ValueError("Empty text list provided")
+    
+    # Load model if not already loaded; the slot pins model, labels and normalizer for this call
+    slot = get_active_slot()
+    
+    # Same text cleaning the model's training data went through
+    normalizer = slot.normalizer or build_normalizer(slot.model)
+    documents, inverse = deduplicate_documents(normalizer(texts))
+    
+    logger.info(f"Making predictions for {len(texts)} texts ({len(documents)} distinct) using BERTopic model")
+    return slot, documents, embed_documents(slot.model, documents, slot.encoder), inverse
 
 def predict_topic(texts: List[str]) -> List[str]:
     try:
-        if not texts:
-            raise ValueError("Empty text list provided")
+        slot, documents, embeddings, inverse = _prepare_documents(texts)
         
-        # Load model if not already loaded
-        model = load_model()
+        if slot.assigner is not None and embeddings is not None:
+            topics, _ = slot.assigner.assign(embeddings)
+        else:
+            topics, probabilities = slot.model.transform(documents, embeddings=embeddings)
         
-        # Create dataframe and apply basic preprocessing
-        df = pd.DataFrame({'text': texts})
+        # Convert topic numbers to topic labels/names via the precomputed table, back in input order
+        topic_labels = get_topic_labels(np.asarray(topics)[inverse], slot.labels)
         
-        # Basic text cleaning (same as preprocessing)
-        df['text'] = df['text'].fillna('')
-        df['text'] = df['text'].astype(str)
+        logger.info(f"Predictions completed successfully for {len(texts)} texts")
+        return topic_labels
         
-        # Make predictions
-        logger.info(f"Making predictions for {len(texts)} texts using BERTopic model")
+    except Exception as e:
+        logger.error(f"Prediction failed: {e}")
+        raise
+
+def predict_topic_assignments(texts: List[str]):
+    """Topic ids, the score of each assigned topic and the topic labels, as parallel arrays.
+
+    The score is the assigned topic's probability (0 for outliers, NaN when
+    the model returns no probabilities) or, in the fast inference mode, its
+    centroid similarity. Used for offline labeling of whole datasets.
+    """
+    slot, documents, embeddings, inverse = _prepare_documents(texts)
+    
+    if slot.assigner is not None and embeddings is not None:
+        topics, scores = slot.assigner.assign(embeddings)
+    else:
+        topics, probabilities = slot.model.transform(documents, embeddings=embeddings)
+        topics = np.asarray(topics, dtype=np.int64)
+        if probabilities is None:
+            scores = np.full(len(topics), np.nan)
+        elif np.ndim(probabilities) == 2:
+            probabilities = np.asarray(probabilities)
+            valid = (topics >= 0) & (topics < probabilities.shape[1])
+            scores = np.where(valid, probabilities[np.arange(len(topics)), np.where(valid, topics, 0)], 0.0)
+        else:
+            scores = np.asarray(probabilities, dtype=np.float64).reshape(-1)
+    
+    topics = np.asarray(topics, dtype=np.int64)[inverse]
+    return topics, np.asarray(scores, dtype=np.float64)[inverse], get_topic_labels(topics, slot.labels)
+
+def _probability_top_k(topics: np.ndarray, probabilities, k: int):
+    """Top-k topic ids and scores from the probabilities returned by ``transform``.
+
+    A (documents, topics) matrix yields up to ``k`` alternatives per text; the
+    1-D form (probability of the assigned topic only) yields just that topic.
+    """
+    if probabilities is not None and np.ndim(probabilities) == 2 and np.shape(probabilities)[1] > 0:
+        return top_k(probabilities, k)
+    if probabilities is None:
+        scores = np.full(len(topics), np.nan)
+    else:
+        scores = np.asarray(probabilities, dtype=np.float64).reshape(-1)
+    return topics.reshape(-1, 1), scores.reshape(-1, 1)
+
+def predict_topic_scores(texts: List[str], k: int = 5) -> List[Dict]:
+    """Predict topics with the ``k`` best alternatives and their scores for every text.
+
+    Scores are the topic probabilities ``transform`` already computes (HDBSCAN
+    membership, or the assigned topic's probability only when the model was
+    fit without ``calculate_probabilities``) or, in the fast inference mode,
+    the centroid similarities.
+    """
+    try:
+        slot, documents, embeddings, inverse = _prepare_documents(texts)
         
-        topics, probabilities = model.transform(df['text'].tolist())
+        if slot.assigner is not None and embeddings is not None:
+            topics, ids, scores = slot.assigner.assign_top_k(embeddings, k)
+        else:
+            topics, probabilities = slot.model.transform(documents, embeddings=embeddings)
+            topics = np.asarray(topics, dtype=np.int64)
+            ids, scores = _probability_top_k(topics, probabilities, k)
+        topics, ids, scores = np.asarray(topics)[inverse], ids[inverse], np.asarray(scores)[inverse]
         
-        # Convert topic numbers to topic labels/names
-        topic_labels = []
-        for topic in topics:
-            if topic == -1:
-                topic_labels.append("Outlier")
-            else:
-                # Get topic words for better representation
-                try:
-                    topic_words = model.get_topic(topic)
-                    if topic_words:
-                        # Create label from top 3 words
-                        top_words = [word for word, _ in topic_words[:3]]
-                        topic_labels.append(f"Topic_{topic}: {', '.join(top_words)}")
-                    else:
-                        topic_labels.append(f"Topic_{topic}")
-                except Exception as topic_error:
-                    logger.warning(f"Error getting topic words for topic {topic}: {topic_error}")
-                    topic_labels.append(f"Topic_{topic}")
+        topic_labels = get_topic_labels(topics, slot.labels)
+        id_labels = np.asarray(get_topic_labels(ids, slot.labels), dtype=object).reshape(ids.shape)
+        # Unknown scores (model without probabilities) become null in the JSON response
+        scores = np.round(np.asarray(scores, dtype=np.float64), 4).astype(object)
+        scores[pd.isna(scores)] = None
         
-        logger.info(f"Predictions completed successfully for {len(texts)} texts")
-        return topic_labels
+        logger.info(f"Predictions with top-{k} scores completed for {len(texts)} texts")
+        return [
+            {"topic": label, "topic_ids": row_ids, "scores": row_scores, "labels": row_labels}
+            for label, row_ids, row_scores, row_labels in zip(topic_labels, ids.tolist(), scores.tolist(), id_labels.tolist())
+        ]
         
     except Exception as e:
         logger.error(f"Prediction failed: {e}")
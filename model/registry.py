@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSlot:
+    """A loaded, warmed model version with its topic label table, input normalizer, centroid assigner
+    and the name of the encoder its embeddings are cached under."""
+
+    __slots__ = ("version", "path", "model", "labels", "normalizer", "assigner", "encoder", "loaded_at")
+
+    def __init__(self, version: str, path: Optional[str], model, labels, normalizer=None, assigner=None,
+                 encoder: Optional[str] = None):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.labels = labels
+        self.normalizer = normalizer
+        self.assigner = assigner
+        self.encoder = encoder
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict[str, Any]:
+        return {"version": self.version, "path": self.path, "encoder": self.encoder, "loaded_at": self.loaded_at}
+
+
+class ModelRegistry:
+    """Versioned model slots with background loading and atomic swaps.
+
+    A new version is loaded and warmed in a background thread; only after its
+    warmup transform succeeds does it replace the active slot. Requests read
+    the active slot once, so an in-flight prediction keeps using the model and
+    labels it started with. The previous slots stay in memory for rollback.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], label_builder: Callable[[Any], Any],
+                 warmup: Optional[Callable[[Any], None]] = None, max_slots: int = 2,
+                 normalizer_builder: Optional[Callable[[Any], Any]] = None,
+                 assigner_builder: Optional[Callable[[Any], Any]] = None,
+                 encoder_resolver: Optional[Callable[[Any], Optional[str]]] = None):
+        self.loader = loader
+        self.label_builder = label_builder
+        self.warmup = warmup
+        self.normalizer_builder = normalizer_builder
+        self.assigner_builder = assigner_builder
+        self.encoder_resolver = encoder_resolver
+        self.max_slots = max(1, max_slots)
+
+        self._slots: "OrderedDict[str, ModelSlot]" = OrderedDict()
+        self._active: Optional[ModelSlot] = None
+        self._history: List[str] = []
+        self._lock = threading.RLock()
+        self._loading: Optional[str] = None
+        self._loader_thread: Optional[threading.Thread] = None
+        self._swap_listeners: List[Callable[[ModelSlot], None]] = []
+        self.last_error: Optional[str] = None
+
+    @property
+    def active(self) -> Optional[ModelSlot]:
+        return self._active
+
+    @property
+    def active_version(self) -> Optional[str]:
+        slot = self._active
+        return slot.version if slot is not None else None
+
+    @property
+    def loading_version(self) -> Optional[str]:
+        return self._loading
+
+    def add_swap_listener(self, listener: Callable[[ModelSlot], None]):
+        """Call ``listener(slot)`` after every swap of the active slot (load, install or rollback)."""
+        self._swap_listeners.append(listener)
+
+    def _notify(self, slot: ModelSlot):
+        for listener in list(self._swap_listeners):
+            try:
+                listener(slot)
+            except Exception as e:
+                logger.warning(f"Model swap listener failed for version {slot.version}: {e}")
+
+    def _prepare(self, version: str, path: Optional[str], model=None) -> ModelSlot:
+        if model is None:
+            logger.info(f"Loading model version {version} from {path}")
+            model = self.loader(path)
+        if self.warmup is not None:
+            self.warmup(model)
+        normalizer = self.normalizer_builder(model) if self.normalizer_builder is not None else None
+        assigner = self.assigner_builder(model) if self.assigner_builder is not None else None
+        encoder = self.encoder_resolver(model) if self.encoder_resolver is not None else None
+        return ModelSlot(version, path, model, self.label_builder(model), normalizer, assigner, encoder)
+
+    def _activate(self, slot: ModelSlot):
+        with self._lock:
+            self._slots[slot.version] = slot
+            self._slots.move_to_end(slot.version)
+            if self._active is not None and self._active.version != slot.version:
+                self._history.append(self._active.version)
+            self._active = slot
+            self._evict()
+        logger.info(f"Model version {slot.version} is now active")
+        self._notify(slot)
+
+    def _evict(self):
+        keep = {self._active.version} | set(self._history[-(self.max_slots - 1):] if self.max_slots > 1 else [])
+        for version in list(self._slots):
+            if len(self._slots) <= self.max_slots:
+                break
+            if version not in keep:
+                del self._slots[version]
+        self._history = [version for version in self._history if version in self._slots]
+
+    def install(self, model, version: str, path: Optional[str] = None) -> ModelSlot:
+        """Warm an already loaded model and make it active immediately."""
+        slot = self._prepare(version, path, model=model)
+        self._activate(slot)
+        return slot
+
+    def load(self, path: str, version: Optional[str] = None) -> ModelSlot:
+        """Load, warm and activate a model synchronously."""
+        version = version or default_version(path)
+        slot = self._prepare(version, path)
+        self._activate(slot)
+        return slot
+
+    def load_async(self, path: str, version: Optional[str] = None) -> str:
+        """Start loading a model version in the background and swap it in when warm."""
+        version = version or default_version(path)
+        with self._lock:
+            if self._loading is not None:
+                raise RuntimeError(f"Model version {self._loading} is still loading")
+            self._loading = version
+            self.last_error = None
+
+        def run():
+            try:
+                self.load(path, version)
+            except Exception as e:
+                logger.error(f"Loading model version {version} failed, keeping {self.active_version}: {e}")
+                self.last_error = f"{version}: {e}"
+            finally:
+                with self._lock:
+                    self._loading = None
+
+        self._loader_thread = threading.Thread(target=run, name=f"model-loader-{version}", daemon=True)
+        self._loader_thread.start()
+        return version
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until a background load (if any) has finished."""
+        thread = self._loader_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def rollback(self) -> ModelSlot:
+        """Reactivate the previously active version that is still held in memory."""
+        with self._lock:
+            slot = None
+            while self._history and slot is None:
+                version = self._history.pop()
+                slot = self._slots.get(version)
+                if slot is not None and (self._active is None or slot.version != self._active.version):
+                    self._active = slot
+                    self._slots.move_to_end(version)
+                    logger.info(f"Rolled back to model version {version}")
+                else:
+                    slot = None
+        if slot is None:
+            raise LookupError("No previous model version available for rollback")
+        self._notify(slot)
+        return slot
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_version": self.active_version,
+                "loading_version": self._loading,
+                "rollback_version": self._history[-1] if self._history else None,
+                "slots": [slot.describe() for slot in self._slots.values()],
+                "last_error": self.last_error,
+            }
+
+
+def default_version(path: str) -> str:
+    """Version id derived from the artifact name and modification time."""
+    name = os.path.basename(os.path.normpath(path))
+    try:
+        return f"{name}@{int(os.path.getmtime(path))}"
+    except OSError:
+        return name
@@ -1,46 +1,93 @@
-import pandas as pd
 import os
+import sys
 import logging
 from bertopic import BERTopic
 from sentence_transformers import SentenceTransformer
 import joblib
 
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.artifact import refresh_bundle  # noqa: E402
+from model.embedding_cache import cached_encode  # noqa: E402
+from model.incremental import init_incremental_state  # noqa: E402
+from model.normalization import TextNormalizer  # noqa: E402
+from preprocessing.storage import read_dataset, resolve_path, title_column  # noqa: E402
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def retrain_model():
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_DIR, "../data/cleaned/cleaned_data.csv")
+MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_retrained.pkl")
+ORIGINAL_MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20.pkl")
+BACKUP_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_backup.pkl")
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+def load_training_texts(data_path: str = DATA_PATH):
+    """Non-empty titles of the training data, or None if it is missing or has no title column."""
+    logger.info("Loading training data...")
+    if not os.path.exists(resolve_path(data_path)):
+        logger.error(f"Training data not found: {data_path}")
+        return None
+    
+    # Only the title column is read
+    try:
+        column = title_column(data_path)
+    except ValueError as e:
+        logger.error(str(e))
+        return None
+    df = read_dataset(data_path, columns=[column])
+    logger.info(f"Loaded {len(df)} documents for training")
+    texts = df[column].fillna('').astype(str).tolist()
+    
+    return [text for text in texts if text.strip()]  # Remove empty texts
+
+def install_model(topic_model):
+    """Save a trained model, check that it loads, and make it the served model (keeping a backup)."""
+    logger.info(f"Saving model to {MODEL_PATH}")
+    joblib.dump(topic_model, MODEL_PATH)
+    
+    # Test the saved model
+    logger.info("Testing saved model...")
+    loaded_model = joblib.load(MODEL_PATH)
+    test_topics, _ = loaded_model.transform(["machine learning algorithms"])
+    logger.info(f"Test successful. Test topic: {test_topics}")
+    
+    # Backup original
+    if os.path.exists(ORIGINAL_MODEL_PATH):
+        os.rename(ORIGINAL_MODEL_PATH, BACKUP_PATH)
+        logger.info(f"Original model backed up to {BACKUP_PATH}")
     
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DATA_PATH = os.path.join(BASE_DIR, "../data/cleaned/cleaned_data.csv")
-    MODEL_PATH = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_retrained.pkl")
+    # Replace with retrained model
+    os.rename(MODEL_PATH, ORIGINAL_MODEL_PATH)
+    logger.info(f"Retrained model installed as {ORIGINAL_MODEL_PATH}")
+    
+    # The API serves the bundle when there is one, so it must follow the pickle
+    from model.predict import MODEL_BUNDLE_DIR
+    if refresh_bundle(topic_model, MODEL_BUNDLE_DIR):
+        logger.info(f"Serving bundle {MODEL_BUNDLE_DIR} re-exported")
+
+def retrain_model():
     
     try:
-        logger.info("Loading training data...")
-        if not os.path.exists(DATA_PATH):
-            logger.error(f"Training data not found: {DATA_PATH}")
-            return False
-        
-        df = pd.read_csv(DATA_PATH)
-        logger.info(f"Loaded {len(df)} documents for training")
-        if 'title' in df.columns:
-            texts = df['title'].fillna('').astype(str).tolist()
-        elif 'Judul' in df.columns:
-            texts = df['Judul'].fillna('').astype(str).tolist()
-        else:
-            logger.error(f"No title column found. Available columns: {df.columns.tolist()}")
+        texts = load_training_texts(DATA_PATH)
+        if texts is None:
             return False
-            
-        texts = [text for text in texts if text.strip()]  # Remove empty texts
         
         logger.info(f"Training on {len(texts)} valid texts")
         
         # Create embedding model (CPU compatible)
         logger.info("Creating embedding model...")
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
         
         # Force to CPU
         embedding_model.to('cpu')
         
+        # Reuse cached embeddings for titles encoded by earlier runs
+        logger.info("Computing embeddings...")
+        embeddings = cached_encode(EMBEDDING_MODEL, texts, embedding_model.encode)
+        
         # Create BERTopic model
         logger.info("Creating BERTopic model...")
         topic_model = BERTopic(
@@ -51,32 +98,17 @@ def retrain_model():
         
         # Train the model
         logger.info("Training BERTopic model...")
-        topics, probabilities = topic_model.fit_transform(texts)
+        topics, probabilities = topic_model.fit_transform(texts, embeddings)
         
         logger.info(f"Training completed. Found {len(set(topics))} topics")
         
-        # Save the model
-        logger.info(f"Saving model to {MODEL_PATH}")
-        joblib.dump(topic_model, MODEL_PATH)
-        
-        # Test the saved model
-        logger.info("Testing saved model...")
-        loaded_model = joblib.load(MODEL_PATH)
-        test_topics, _ = loaded_model.transform(["machine learning algorithms"])
-        logger.info(f"Test successful. Test topic: {test_topics}")
-        
-        # Replace the original model
-        original_model_path = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20.pkl")
-        backup_path = os.path.join(BASE_DIR, "bertopic_model_all-MiniLM-min20_backup.pkl")
-        
-        # Backup original
-        if os.path.exists(original_model_path):
-            os.rename(original_model_path, backup_path)
-            logger.info(f"Original model backed up to {backup_path}")
-        
-        # Replace with retrained model
-        os.rename(MODEL_PATH, original_model_path)
-        logger.info(f"Retrained model installed as {original_model_path}")
+        # Record the text cleaning so inference normalizes inputs the same way
+        topic_model.preprocessing_spec = TextNormalizer().spec()
+        # Keys the embedding cache at inference, where the encoder name is not otherwise recorded
+        topic_model.embedding_model_name = EMBEDDING_MODEL
+        # Lets model/incremental.py fold in new documents later without a full refit
+        init_incremental_state(topic_model, texts, topics, embeddings)
+        install_model(topic_model)
         
         return True
         
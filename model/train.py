@@ -1,89 +1,158 @@
-import json
 import pickle
 import nltk
 import os
+import sys
 import tempfile
-import pandas as pd
+import multiprocessing
+import numpy as np
 import mlflow
-from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sentence_transformers import SentenceTransformer
 from bertopic import BERTopic
+from hdbscan import HDBSCAN
 from nltk.tokenize import word_tokenize
-from gensim.corpora import Dictionary
-from gensim.models import CoherenceModel
 
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def main():    # Load data
-    with open("../data/cleaned/cleaned_data_v3.json", 'r', encoding='utf-8') as f:
-        data = json.load(f)
+from model.embedding_cache import cached_encode  # noqa: E402
+from model.dimensionality import PrefittedReducer, fit_shared_umap  # noqa: E402
+from model.coherence import CoherenceEvaluator  # noqa: E402
+from model.normalization import TextNormalizer  # noqa: E402
+from preprocessing.storage import LEGACY_EXPORT, read_dataset, write_dataset  # noqa: E402
 
-    df = pd.DataFrame(data)
+# Model configs (short name -> embedding model)
+EMBEDDING_MODELS = {
+    "all-MiniLM": "sentence-transformers/all-MiniLM-L6-v2",
+    # "multilingual-MiniLM": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+    # "multilingual-mpnet": "sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
+    # "multilingual-e5": "intfloat/multilingual-e5-large-instruct",
+}
+MIN_TOPIC_SIZES = [5, 10, 20]
+GRID_WORKERS = int(os.environ.get("GRID_WORKERS", "0"))  # 0 = one worker per grid point (capped by CPU count)
+
+EXPERIMENT_NAME = "BERTopic-Hyperparameter Experiment"
+
+# Shared state for grid workers, set once per process by _init_worker
+_shared = {}
+
+
+def _init_worker(df, texts, coherence_evaluator, embedding_model_name, embeddings, umap_model, reduced_embeddings):
+    _shared.update(
+        df=df,
+        texts=texts,
+        coherence_evaluator=coherence_evaluator,
+        embedding_model_name=embedding_model_name,
+        embeddings=embeddings,
+        umap_model=umap_model,
+        reduced_embeddings=reduced_embeddings,
+    )
+
+
+def run_grid_point(short_name, min_topic_size):
+    """Fit and log one grid point, reusing the shared embeddings and UMAP reduction."""
+    texts = _shared["texts"]
+    embeddings = _shared["embeddings"]
+    embedding_model_name = _shared["embedding_model_name"]
+
+    mlflow.set_experiment(EXPERIMENT_NAME)
+    with mlflow.start_run(run_name=f"{short_name}-min{min_topic_size}"):
+        mlflow.log_param("embedding_model", embedding_model_name)
+        mlflow.log_param("min_topic_size", min_topic_size)
+
+        # Only clustering and c-TF-IDF depend on min_topic_size
+        topic_model = BERTopic(
+            embedding_model=embedding_model_name,
+            umap_model=PrefittedReducer(_shared["umap_model"], embeddings, _shared["reduced_embeddings"]),
+            hdbscan_model=HDBSCAN(
+                min_cluster_size=min_topic_size,
+                metric="euclidean",
+                cluster_selection_method="eom",
+                prediction_data=True
+            ),
+            language="multilingual",
+            min_topic_size=min_topic_size,
+            calculate_probabilities=True
+            )
+
+        topics, probs = topic_model.fit_transform(texts, embeddings)
+
+        # Coherence
+        num_topics = len(set(topics)) - (1 if -1 in topics else 0)
+        topic_words = [
+            [word for word, _ in topic_model.get_topic(topic_id)]
+            for topic_id in range(num_topics)
+        ]
+        coherence_score = _shared["coherence_evaluator"].score(topic_words, measure='c_v')
+        mlflow.log_metric("coherence_score", coherence_score)
+        mlflow.log_metric("num_topics", num_topics)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Simpan model
+            model_path = os.path.join(tmpdir, f"bertopic_model_{short_name}-min{min_topic_size}.pkl")
+            # Record the text cleaning so inference normalizes inputs the same way
+            topic_model.preprocessing_spec = TextNormalizer().spec()
+            # Serving looks up cached embeddings under this name
+            topic_model.embedding_model_name = embedding_model_name
+            with open(model_path, "wb") as f:
+                pickle.dump(topic_model, f)
+            mlflow.log_artifact(model_path)
+
+            # Simpan hasil topik
+            df = _shared["df"].copy()
+            df['topics'] = topics
+            df['probabilities'] = [np.asarray(p, dtype=np.float32) for p in probs]
+
+            result_path = os.path.join(tmpdir, f"topic_results_{short_name}-min{min_topic_size}.csv")
+            mlflow.log_artifact(write_dataset(df, result_path))
+            if LEGACY_EXPORT:
+                df.assign(probabilities=[p.tolist() for p in df['probabilities']]).to_csv(result_path, index=False)
+                mlflow.log_artifact(result_path)
+
+    return short_name, min_topic_size, num_topics, coherence_score
+
+
+def main():    # Load data (the Parquet copy is used when present)
+    # All columns are read: the topic_results_* artifacts carry the full records
+    df = read_dataset("../data/cleaned/cleaned_data_v3.json")
     df['abstract'] = df['abstract'].fillna('')
     df['combined_text'] = df['title'] + ". " + df['abstract']
     texts = df['combined_text'].tolist()
-    tokenized_texts = [word_tokenize(text.lower()) for text in texts]
-    dictionary = Dictionary(tokenized_texts)
-    corpus = [dictionary.doc2bow(text) for text in tokenized_texts]
-
-    # Model configs
-    # embedding_models = [
-    #     "sentence-transformers/all-MiniLM-L6-v2",
-    #     "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-    #     "sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-    #     "intfloat/multilingual-e5-large-instruct"
-    # ]
-    embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    min_topic_sizes = [5, 10, 20]
+    # Tokenize and index the corpus once; every grid point scores against the same index
+    coherence_evaluator = CoherenceEvaluator(word_tokenize(text.lower()) for text in texts)
 
     # Set MLflow experiment
-    mlflow.set_experiment("BERTopic-Hyperparameter Experiment")
-
-    # Gridsearch
-    for min_topic_size in min_topic_sizes:
-        with mlflow.start_run(run_name=f"all-MiniLM-min{min_topic_size}"):
-            mlflow.log_param("embedding_model", embedding_model_name)
-            mlflow.log_param("min_topic_size", min_topic_size)
-
-            embedding_model = SentenceTransformer(embedding_model_name, device="cuda")
-            topic_model = BERTopic(
-                embedding_model=embedding_model,
-                language="multilingual",
-                min_topic_size=min_topic_size,
-                calculate_probabilities=True
-                )
-
-            topics, probs = topic_model.fit_transform(tqdm(texts, desc="Training BERTopic"))
-
-            # Coherenfce
-            topic_words = [
-                [word for word, _ in topic_model.get_topic(topic_id)]
-                for topic_id in range(len(set(topics)) - (1 if -1 in topics else 0))
-            ]
-            coherence_model = CoherenceModel(
-                topics=topic_words,
-                texts=tokenized_texts,
-                corpus=corpus,
-                dictionary=dictionary,
-                coherence='c_v'
-            )
-            coherence_score = coherence_model.get_coherence()
-            mlflow.log_metric("coherence_score", coherence_score)
-            mlflow.log_metric("num_topics", len(set(topics)) - (1 if -1 in topics else 0))
-
-            with tempfile.TemporaryDirectory() as tmpdir:
-                # Simpan model
-                model_path = os.path.join(tmpdir, f"bertopic_model_all-MiniLM-min{min_topic_size}.pkl")
-                with open(model_path, "wb") as f:
-                    pickle.dump(topic_model, f)
-                mlflow.log_artifact(model_path)
-
-                # Simpan hasil topik
-                df['topics'] = topics
-                df['probabilities'] = [list(p) for p in probs]
-
-                result_path = os.path.join(tmpdir, f"topic_results_all-MiniLM-min{min_topic_size}.csv")
-                df.to_csv(result_path, index=False)
-                mlflow.log_artifact(result_path)
+    mlflow.set_experiment(EXPERIMENT_NAME)
+
+    # Gridsearch: embeddings and UMAP are computed once per embedding model,
+    # the min_topic_size points then run in parallel worker processes
+    for short_name, embedding_model_name in EMBEDDING_MODELS.items():
+        # Bound now so the encoder can be released once the embeddings exist
+        encode = SentenceTransformer(embedding_model_name).encode
+        embeddings = cached_encode(
+            embedding_model_name,
+            texts,
+            lambda docs, encode=encode: encode(docs, show_progress_bar=True)
+        )
+        del encode
+
+        reducer = fit_shared_umap(embeddings)
+
+        workers = GRID_WORKERS or min(len(MIN_TOPIC_SIZES), os.cpu_count() or 1)
+        initargs = (df, texts, coherence_evaluator, embedding_model_name, embeddings,
+                    reducer.umap_model, reducer.transform(embeddings))
+
+        # spawn keeps CUDA state out of the forked workers
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=initargs
+        ) as executor:
+            futures = [executor.submit(run_grid_point, short_name, size) for size in MIN_TOPIC_SIZES]
+            for future in as_completed(futures):
+                name, size, num_topics, coherence_score = future.result()
+                print(f"{name}-min{size}: {num_topics} topics, coherence {coherence_score:.4f}")
 
 if __name__ == "__main__":
     nltk.download("punkt")
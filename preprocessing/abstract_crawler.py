@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+ABSTRACT_SELECTOR = "section.item.abstract > p"
+
+
+class AbstractCrawler:
+    """Fetch article abstracts with one shared headless browser.
+
+    A small pool of browser contexts is reused for every page, the number of
+    in-flight pages is bounded by a semaphore, requests to the same host are
+    spaced by ``host_delay`` seconds and failed fetches are retried with
+    exponential backoff.
+
+    Usage::
+
+        async with AbstractCrawler(concurrency=4) as crawler:
+            abstracts = await crawler.fetch_many(urls)
+    """
+
+    def __init__(self, concurrency: int = 4, contexts: int = 2, host_delay: float = 0.5,
+                 retries: int = 3, backoff: float = 1.0, timeout_ms: int = 60000, headless: bool = True):
+        self.concurrency = max(1, concurrency)
+        self.contexts = max(1, contexts)
+        self.host_delay = host_delay
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout_ms = timeout_ms
+        self.headless = headless
+
+        self._playwright = None
+        self._browser = None
+        self._context_pool: Optional[asyncio.Queue] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._host_last_request: Dict[str, float] = {}
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._context_pool = asyncio.Queue()
+        for _ in range(self.contexts):
+            await self._context_pool.put(await self._browser.new_context())
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = self._playwright = None
+
+    async def _wait_for_host(self, link: str):
+        host = urlparse(link).netloc
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            elapsed = time.monotonic() - self._host_last_request.get(host, 0.0)
+            if elapsed < self.host_delay:
+                await asyncio.sleep(self.host_delay - elapsed)
+            self._host_last_request[host] = time.monotonic()
+
+    async def _fetch_page(self, link: str):
+        """Load the article page and return ``(abstract, response_headers)``."""
+        context = await self._context_pool.get()
+        page = await context.new_page()
+        try:
+            response = await page.goto(link, wait_until="load", timeout=self.timeout_ms)
+            headers = response.headers if response is not None else {}
+            abstrak_element = await page.query_selector(ABSTRACT_SELECTOR)
+            if abstrak_element:
+                return await abstrak_element.inner_text(), headers
+            print(f"[WARNING] Tidak bisa temukan elemen abstrak di {link}")
+            return "", headers
+        finally:
+            await page.close()
+            await self._context_pool.put(context)
+
+    async def _is_not_modified(self, link: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """Conditional GET without rendering; True when the server answers 304."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        context = await self._context_pool.get()
+        try:
+            response = await context.request.get(link, headers=headers, timeout=self.timeout_ms, max_redirects=5)
+            try:
+                return response.status == 304
+            finally:
+                await response.dispose()
+        finally:
+            await self._context_pool.put(context)
+
+    async def _with_retries(self, link: str, operation, default):
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self._wait_for_host(link)
+                try:
+                    return await operation()
+                except Exception as e:
+                    if attempt == self.retries:
+                        print(f"[ERROR] Gagal membuka {link} setelah {attempt + 1} percobaan: {e}")
+                        return default
+                    delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+                    print(f"[WARNING] Gagal membuka {link} ({e}), coba lagi dalam {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return default
+
+    async def fetch(self, link: str) -> str:
+        """Fetch one abstract, retrying failures; returns "" when all attempts fail."""
+        async def operation():
+            abstract, _ = await self._fetch_page(link)
+            return abstract
+
+        return await self._with_retries(link, operation, "")
+
+    async def fetch_if_changed(self, link: str, etag: Optional[str] = None,
+                               last_modified: Optional[str] = None) -> Optional[Dict]:
+        """Fetch an abstract unless the server reports it unchanged.
+
+        Returns ``None`` for unchanged pages, otherwise a dict with
+        ``abstract``, ``etag`` and ``last_modified``. When every attempt fails
+        the dict's ``abstract`` is ``None``.
+        """
+        async def operation():
+            if (etag or last_modified) and await self._is_not_modified(link, etag, last_modified):
+                return None
+            abstract, headers = await self._fetch_page(link)
+            return {"abstract": abstract, "etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
+
+        return await self._with_retries(link, operation, {"abstract": None, "etag": None, "last_modified": None})
+
+    async def fetch_many(self, links: List[str]) -> List[str]:
+        """Fetch abstracts concurrently, returned in the order of ``links``."""
+        return await asyncio.gather(*(self.fetch(link) for link in links))
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+def content_hash(record: Dict) -> str:
+    """Stable hash of the fields that make an article "changed"."""
+    payload = {key: record.get(key) for key in ("title", "abstract", "authors", "year")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def record_key(record: Dict) -> str:
+    """Identity of an article across runs: its DOI link, else issue and title."""
+    return record.get("doi") or f"{record.get('issue ID')}:{record.get('title')}"
+
+
+def stored_issue_ids(records: Iterable[Dict]) -> Set[int]:
+    """Issue ids that have at least one article in a stored raw dataset."""
+    ids = set()
+    for record in records:
+        try:
+            ids.add(int(record["issue ID"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return ids
+
+
+def merge_records(existing: Iterable[Dict], records: Iterable[Dict], unchanged: Set[int]) -> Tuple[List[Dict], int]:
+    """Append new articles and replace changed ones in the existing raw dataset.
+
+    Records whose ``id()`` is in ``unchanged`` keep the stored row. Returns the
+    merged records and how many were added or replaced.
+    """
+    merged = {record_key(record): record for record in existing}
+    new_records = [record for record in records if id(record) not in unchanged and "title" in record]
+    for record in new_records:
+        merged[record_key(record)] = record
+    return list(merged.values()), len(new_records)
+
+
+class CrawlStateStore:
+    """SQLite record of what previous scraping runs already fetched.
+
+    Stores crawled issue ids and, per article URL, the HTTP validators
+    (ETag / Last-Modified) and a content hash so later runs can skip
+    unchanged articles.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS issues (
+            issue_id INTEGER PRIMARY KEY,
+            article_count INTEGER NOT NULL,
+            crawled_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS articles (
+            url TEXT PRIMARY KEY,
+            issue_id INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            crawled_at TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def crawled_issue_ids(self, present: Optional[Set[int]] = None) -> Set[int]:
+        """Crawled issue ids; with ``present`` (issues in the stored dataset), issues
+        whose articles are missing from it are not counted as crawled."""
+        with self._lock:
+            rows = self._conn.execute("SELECT issue_id, article_count FROM issues").fetchall()
+        return {row["issue_id"] for row in rows
+                if present is None or row["article_count"] == 0 or row["issue_id"] in present}
+
+    def latest_crawled_issue(self) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(issue_id) AS issue_id FROM issues").fetchone()
+        return row["issue_id"]
+
+    def mark_issue(self, issue_id: int, article_count: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO issues (issue_id, article_count, crawled_at) VALUES (?, ?, ?)",
+                (issue_id, article_count, self._now()),
+            )
+
+    def get_article(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM articles WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def save_article(self, url: str, issue_id: int, etag: Optional[str] = None,
+                     last_modified: Optional[str] = None, content_hash: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO articles (url, issue_id, etag, last_modified, content_hash, crawled_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET
+                       issue_id = excluded.issue_id,
+                       etag = COALESCE(excluded.etag, articles.etag),
+                       last_modified = COALESCE(excluded.last_modified, articles.last_modified),
+                       content_hash = COALESCE(excluded.content_hash, articles.content_hash),
+                       crawled_at = excluded.crawled_at""",
+                (url, issue_id, etag, last_modified, content_hash, self._now()),
+            )
+
+    def known_validators(self, pending: Sequence[Tuple[Dict, str]], stored_keys: Set[str]) -> List[Dict]:
+        """Saved validators per pending article; empty for articles missing from the
+        stored dataset, so they are downloaded in full instead of answering 304."""
+        return [(self.get_article(url) or {}) if record_key(record) in stored_keys else {}
+                for record, url in pending]
+
+    def apply_fetch_results(self, pending: Sequence[Tuple[Dict, str]], known: Sequence[Dict],
+                            fetched: Sequence[Optional[Dict]],
+                            stored_keys: Optional[Set[str]] = None) -> Tuple[Set[int], Set[int]]:
+        """Fill in fetched abstracts and record their validators.
+
+        Returns the ``id()`` of records that should keep their stored row
+        (not modified, same content, or fetch failed) and the issue ids with
+        a failed fetch, which must stay unmarked so they are retried. Records
+        whose key is not in ``stored_keys`` have no stored row to keep and are
+        always returned as new.
+        """
+        unchanged, failed_issues = set(), set()
+        for (record, url), info, result in zip(pending, known, fetched):
+            stored = stored_keys is None or record_key(record) in stored_keys
+            if result is None:
+                if stored:
+                    unchanged.add(id(record))
+                continue
+            if result["abstract"] is None:
+                # Keep the stored abstract; the issue is retried next run
+                if stored:
+                    unchanged.add(id(record))
+                failed_issues.add(record["issue ID"])
+                continue
+            record["abstract"] = result["abstract"]
+            digest = content_hash(record)
+            if stored and digest == info.get("content_hash"):
+                unchanged.add(id(record))
+            self.save_article(url, record["issue ID"], result["etag"], result["last_modified"], digest)
+        return unchanged, failed_issues
@@ -1,17 +1,144 @@
-import pandas as pd
-import pickle
-from sentence_transformers import SentenceTransformer
+import argparse
+import hashlib
+import json
+import os
+import sys
+from functools import partial
+import numpy as np
 
-df = pd.read_csv('../data/cleaned/cleaned_data.csv')
+# Add parent directory to path for imports; when run as a script this directory is
+# sys.path[0] and preprocessing.py would shadow the preprocessing package
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != os.path.dirname(os.path.abspath(__file__))]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Model embedding
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+from model.embedding_cache import cached_encode  # noqa: E402
+from preprocessing.storage import read_dataset  # noqa: E402
 
-# Buat embedding untuk setiap judul
-df['Embedding'] = df['Judul'].apply(lambda x: model.encode(x).tolist())
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Save
-with open('../data/embedded_titles.pkl', 'wb') as f:
-    pickle.dump(df, f)
+SOURCE_PATH = os.path.join(BASE_DIR, "../data/cleaned/cleaned_data.csv")
+OUTPUT_DIR = os.path.join(BASE_DIR, "../data")
+OUTPUT_NAME = "embedded_titles"
 
-print("Embedding berhasil disimpan!")
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+TEXT_COLUMN = "Judul"
+BATCH_SIZE = 64
+CHUNK_SIZE = 4096  # rows written to disk between checkpoints
+
+
+def output_paths(output_dir: str, name: str) -> dict:
+    return {
+        "embeddings": os.path.join(output_dir, f"{name}.npy"),
+        "row_ids": os.path.join(output_dir, f"{name}_row_ids.npy"),
+        "progress": os.path.join(output_dir, f"{name}.progress.json"),
+    }
+
+
+def texts_fingerprint(texts) -> str:
+    """sha1 over all texts in order, so an edited or re-sorted input is not resumed."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_progress(path: str, model_name: str, n_rows: int, dim: int, fingerprint: str) -> int:
+    """Return how many rows a previous, compatible run already wrote."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        progress = json.load(f)
+    if (progress.get("model") != model_name or progress.get("rows") != n_rows or progress.get("dim") != dim
+            or progress.get("texts") != fingerprint):
+        print("Progress file tidak cocok dengan run ini (model atau data input berubah), mulai dari awal")
+        return 0
+    return int(progress.get("completed", 0))
+
+
+def save_progress(path: str, model_name: str, n_rows: int, dim: int, fingerprint: str, completed: int):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "rows": n_rows, "dim": dim, "texts": fingerprint, "completed": completed}, f)
+    os.replace(tmp_path, path)
+
+
+def encode_dataset(texts, model_name=MODEL_NAME, output_dir=OUTPUT_DIR, name=OUTPUT_NAME,
+                   batch_size=BATCH_SIZE, processes=0, chunk_size=CHUNK_SIZE, resume=True):
+    """Encode texts in batches into a float32 .npy matrix, checkpointing after every chunk.
+
+    Row ``i`` of the matrix is the embedding of ``texts[i]``; the row ids are
+    written alongside so the matrix can be joined back to the source data.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    paths = output_paths(output_dir, name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device="cpu" if processes else None)
+    dim = model.get_sentence_embedding_dimension()
+    n_rows = len(texts)
+    fingerprint = texts_fingerprint(texts)
+
+    start = load_progress(paths["progress"], model_name, n_rows, dim, fingerprint) if resume else 0
+    if start and os.path.exists(paths["embeddings"]):
+        embeddings = np.load(paths["embeddings"], mmap_mode="r+")
+        print(f"Melanjutkan dari baris {start}/{n_rows}")
+    else:
+        start = 0
+        if os.path.exists(paths["progress"]):
+            os.remove(paths["progress"])
+        embeddings = np.lib.format.open_memmap(paths["embeddings"], mode="w+", dtype=np.float32, shape=(n_rows, dim))
+        np.save(paths["row_ids"], np.arange(n_rows, dtype=np.int64))
+
+    pool = model.start_multi_process_pool(["cpu"] * processes) if processes > 1 else None
+    try:
+        if pool is not None:
+            encode_fn = partial(model.encode_multi_process, pool=pool, batch_size=batch_size)
+        else:
+            encode_fn = partial(model.encode, batch_size=batch_size, convert_to_numpy=True)
+
+        for chunk_start in range(start, n_rows, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, n_rows)
+            embeddings[chunk_start:chunk_end] = cached_encode(model_name, texts[chunk_start:chunk_end], encode_fn)
+            embeddings.flush()
+            save_progress(paths["progress"], model_name, n_rows, dim, fingerprint, chunk_end)
+            print(f"Embedding {chunk_end}/{n_rows} baris selesai")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buat embedding judul dalam batch ke file .npy")
+    parser.add_argument("--input", default=SOURCE_PATH)
+    parser.add_argument("--column", default=TEXT_COLUMN)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--name", default=OUTPUT_NAME)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--processes", type=int, default=0, help="Jumlah proses encoder CPU (0 = satu proses)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--no-resume", action="store_true", help="Abaikan progress run sebelumnya")
+    args = parser.parse_args()
+
+    df = read_dataset(args.input, columns=[args.column])
+    texts = df[args.column].fillna('').astype(str).tolist()
+
+    paths = encode_dataset(
+        texts,
+        model_name=args.model,
+        output_dir=args.output_dir,
+        name=args.name,
+        batch_size=args.batch_size,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        resume=not args.no_resume,
+    )
+    print("Embedding berhasil disimpan ke", paths["embeddings"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,39 @@
-import pandas as pd
-import re
-import nltk
-from nltk.corpus import stopwords
 import os
-import json
-
-nltk.download('stopwords')
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Add parent directory to path for imports; when run as a script this directory is
+# sys.path[0] and preprocessing.py would shadow the preprocessing package
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != os.path.dirname(os.path.abspath(__file__))]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.text_cleaning import clean_series, remove_first_word_series  # noqa: E402
+from preprocessing.streaming import preprocess_stream  # noqa: E402
+from preprocessing.storage import LEGACY_EXPORT, parquet_path, read_dataset, resolve_path, write_dataset  # noqa: E402
 
 SOURCE_PATH = os.path.join(BASE_DIR, "../data/raw/data_raw_v3.json") 
 TARGET_PATH = os.path.join(BASE_DIR, "../data/cleaned/cleaned_data_v3.json")
 
-def clean_text(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r'[\d]', '', text) 
-    text = re.sub(r'[^\w\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip() 
-    stops = set(stopwords.words('indonesian'))
-    tokens = text.split()
-    tokens = [word for word in tokens if word not in stops]
-    return ' '.join(tokens)
+# Process pool size for cleaning; unset lets clean_series decide by row count
+WORKERS = int(os.getenv("PREPROCESSING_WORKERS", "0")) or None
 
-def remove_first_word(title: str) -> str:
-    words = title.split()
-    return ' '.join(words[1:]) if len(words) > 1 else ''
+# Streaming mode cleans the raw dump chunk by chunk with bounded memory
+STREAMING = os.getenv("PREPROCESSING_STREAMING", "0") == "1"
+CHUNK_SIZE = int(os.getenv("PREPROCESSING_CHUNK_SIZE", "10000"))
+SOURCE_PATH = os.getenv("PREPROCESSING_SOURCE", SOURCE_PATH)
+TARGET_PATH = os.getenv("PREPROCESSING_TARGET", TARGET_PATH)
 
-with open(SOURCE_PATH, 'r', encoding='utf-8') as f:
-    data = json.load(f)
+if STREAMING:
+    # Streaming output goes straight to Parquet unless another target is given
+    TARGET_PATH = os.getenv("PREPROCESSING_TARGET", parquet_path(TARGET_PATH))
+    stats = preprocess_stream(resolve_path(SOURCE_PATH), TARGET_PATH, chunk_size=CHUNK_SIZE, workers=WORKERS)
+    print(f"Processed {stats['read']} records ({stats['noise']} noise, {stats['duplicates']} duplicates removed)")
+    print(f"Processed data saved with {stats['written']} records")
+    print("Saved to", TARGET_PATH)
+    sys.exit(0)
 
-df = pd.DataFrame(data)
+# Typed raw dataset (the Parquet copy is used when present)
+df = read_dataset(SOURCE_PATH)
 
 # Check if DataFrame is empty or missing required columns
 if df.empty:
@@ -46,12 +50,11 @@ print(f"Processing {len(df)} records...")
 df = df[~df['title'].str.lower().str.contains('halaman sampul', na=False)]
 
 # Preprocessing
-df['title'] = df['title'].apply(clean_text)
-df['title'] = df['title'].apply(remove_first_word)
+df['title'] = remove_first_word_series(clean_series(df['title'], workers=WORKERS))
 
 # Only process abstract if it exists
 if 'abstract' in df.columns:
-    df['abstract'] = df['abstract'].apply(clean_text)
+    df['abstract'] = clean_series(df['abstract'], workers=WORKERS)
 else:
     print("Warning: 'abstract' column not found, skipping abstract processing")
 
@@ -64,6 +67,7 @@ if 'issue ID' in df.columns:
 
 print(f"Processed data saved with {len(df)} records")
 
-# Save to JSON
-df.to_json(TARGET_PATH, orient='records', indent=4, force_ascii=False)
-print("Saved to", TARGET_PATH)
+# Save as Parquet, written last so readers prefer it over the legacy JSON
+if LEGACY_EXPORT:
+    df.to_json(TARGET_PATH, orient='records', indent=4, force_ascii=False)
+print("Saved to", write_dataset(df, TARGET_PATH))
@@ -4,13 +4,36 @@ from crawl4ai import AsyncWebCrawler
 from crawl4ai.async_configs import CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy
 import json
+import logging
 import pandas as pd
 import os
-from playwright.async_api import async_playwright
 import re
 import csv
+import sys
 from datetime import datetime
 
+# Add parent directory to path for imports; when run as a script this directory is
+# sys.path[0] and preprocessing.py would shadow the preprocessing package
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != os.path.dirname(os.path.abspath(__file__))]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.abstract_crawler import AbstractCrawler  # noqa: E402
+from preprocessing.crawl_state import CrawlStateStore, merge_records, record_key, stored_issue_ids  # noqa: E402
+from preprocessing.storage import LEGACY_EXPORT, read_records, resolve_path, write_dataset  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Abstract crawler configuration
+CRAWLER_CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", "4"))
+CRAWLER_CONTEXTS = int(os.environ.get("SCRAPER_BROWSER_CONTEXTS", "2"))
+CRAWLER_HOST_DELAY = float(os.environ.get("SCRAPER_HOST_DELAY", "0.5"))
+CRAWLER_RETRIES = int(os.environ.get("SCRAPER_RETRIES", "3"))
+
+# Incremental mode only crawls new issues and changed articles, appending to the raw dataset
+INCREMENTAL = os.environ.get("SCRAPER_INCREMENTAL", "1") == "1"
+FIRST_ISSUE_ID = int(os.environ.get("SCRAPER_FIRST_ISSUE_ID", "1"))
+
 # Apply nest_asyncio to allow nested event loops
 nest_asyncio.apply()
 
@@ -89,46 +112,51 @@ async def crawl_article_titles(issue_id, crawler):
     else:
         return {issue_id: f"Gagal crawling: {result.error_message}"}
 
-async def crawl_abstract(link, crawler):
-    print(f"[DEBUG] Mengambil abstrak dari: {link}")
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)  
-        page = await browser.new_page()
-        try:
-            await page.goto(link, wait_until="load", timeout=60000) 
-        except Exception as e:
-            print(f"[ERROR] Gagal membuka {link}: {e}")
-            await browser.close()
-            return ""
-
-        # Check if abstract element exists
-        abstrak_element = await page.query_selector("section.item.abstract > p")
-        if abstrak_element:
-            abstrak = await abstrak_element.inner_text()
-            print(f"[DEBUG] Abstrak ditemukan lewat Playwright langsung.")
-            await browser.close()
-            return abstrak
-
-        html = await page.content()
-        with open("debug_abstrak.html", "w", encoding="utf-8") as f:
-            f.write(html)
-
-        print("[WARNING] Tidak bisa temukan elemen abstrak langsung dari page.")
-        await browser.close()
-        return ""
+def select_issue_ids(state, latest_issue_id, present=None):
+    """Issues not crawled yet (or missing from the stored dataset), plus the most recent
+    crawled issue to pick up late additions."""
+    crawled = state.crawled_issue_ids(present)
+    issue_ids = [i for i in range(FIRST_ISSUE_ID, latest_issue_id + 1) if i not in crawled]
+    latest_crawled = state.latest_crawled_issue()
+    if latest_crawled is not None and latest_crawled not in issue_ids:
+        issue_ids.append(latest_crawled)
+    return sorted(issue_ids)
 
+def load_existing_records():
+    if not os.path.exists(resolve_path(JSON_PATH)):
+        return []
+    return read_records(JSON_PATH)
+
+def save_records(records):
+    """Write the raw dataset as Parquet, after the legacy JSON so readers prefer the Parquet copy."""
+    if LEGACY_EXPORT:
+        with open(JSON_PATH, "w", encoding="utf-8") as json_file:
+            json.dump(records, json_file, ensure_ascii=False, indent=2)
+    write_dataset(pd.DataFrame(records), JSON_PATH)
 
 async def main():
+    state = CrawlStateStore(STATE_PATH) if INCREMENTAL else None
+    # The state is checked against what the raw dataset actually holds; it may have
+    # been overwritten by a non-incremental run or regenerated
+    existing = load_existing_records() if state is not None else []
+    stored_keys = {record_key(record) for record in existing}
     async with AsyncWebCrawler() as crawler:
         latest_issue_id = await get_latest_issue_id(crawler)
-        issue_ids = range(40, 44)  
+        if state is not None:
+            issue_ids = select_issue_ids(state, latest_issue_id, stored_issue_ids(existing))
+            logger.info("Mode incremental: %d issue akan di-crawl", len(issue_ids))
+        else:
+            issue_ids = range(40, 44)  
         tasks = [crawl_article_titles(issue_id, crawler) for issue_id in issue_ids]
         results = await asyncio.gather(*tasks)
 
         all_data = []
+        pending_abstracts = []  # (record, abstract_url), fetched concurrently below
+        crawled_issues = {}  # issue_id -> article count, for the crawl state
         for result in results:
             for issue_id, articles in result.items():
                 if isinstance(articles, list):
+                    crawled_issues[issue_id] = 0
                     common_published = None
                     for article in articles:
                         pub = article.get("published")
@@ -162,40 +190,75 @@ async def main():
                             penulis_list = ["N/A"]
 
                         link_artikel = article.get("link_artikel", "")
-                        if link_artikel:
-                            article_id = link_artikel.split("/")[-1]
-                            abstract_url = f"https://j-ptiik.ub.ac.id/index.php/j-ptiik/article/view/{article_id}/0"
-                            abstrak = await crawl_abstract(abstract_url, crawler)
-                        else:
-                            abstrak = ""
 
-                        all_data.append({
+                        record = {
                             "issue ID": issue_id,
                             "title": article.get("judul", "N/A"),
-                            "abstract": abstrak,
+                            "abstract": "",
                             "authors": penulis_list,
                             "journal_conference_name": "JPTIIK",
                             "publisher": "FILKOM UB",
                             "year": tahun,
                             "doi": link_artikel,
                             "group_name": "GuguGaga"
-                        })
+                        }
+                        all_data.append(record)
+                        crawled_issues[issue_id] += 1
+
+                        if link_artikel:
+                            article_id = link_artikel.split("/")[-1]
+                            abstract_url = f"https://j-ptiik.ub.ac.id/index.php/j-ptiik/article/view/{article_id}/0"
+                            pending_abstracts.append((record, abstract_url))
                 else:
                     all_data.append({"Issue ID": issue_id, "Judul": articles})
-        df = pd.DataFrame(all_data)
 
-        with open(JSON_PATH, "w", encoding="utf-8") as json_file:
-            json.dump(all_data, json_file, ensure_ascii=False, indent=2)
-        
+        # Fetch all abstracts with one shared headless browser instead of one browser per article
+        logger.info("Mengambil %d abstrak (concurrency=%d)", len(pending_abstracts), CRAWLER_CONCURRENCY)
+        async with AbstractCrawler(
+            concurrency=CRAWLER_CONCURRENCY,
+            contexts=CRAWLER_CONTEXTS,
+            host_delay=CRAWLER_HOST_DELAY,
+            retries=CRAWLER_RETRIES
+        ) as abstract_crawler:
+            if state is None:
+                abstracts = await abstract_crawler.fetch_many([url for _, url in pending_abstracts])
+                for (record, _), abstrak in zip(pending_abstracts, abstracts):
+                    record["abstract"] = abstrak
+            else:
+                # Known articles are only re-downloaded when their ETag/Last-Modified changed
+                known = state.known_validators(pending_abstracts, stored_keys)
+                fetched = await asyncio.gather(*(
+                    abstract_crawler.fetch_if_changed(url, info.get("etag"), info.get("last_modified"))
+                    for (_, url), info in zip(pending_abstracts, known)
+                ))
+
+        if state is None:
+            df = pd.DataFrame(all_data)
+            save_records(all_data)
+            return df
+
+        unchanged, failed_issues = state.apply_fetch_results(pending_abstracts, known, fetched, stored_keys)
+        for issue_id, article_count in crawled_issues.items():
+            if issue_id not in failed_issues:
+                state.mark_issue(issue_id, article_count)
+        state.close()
+
+        all_data, changed = merge_records(existing, all_data, unchanged)
+        logger.info("%d artikel baru/berubah, total %d artikel", changed, len(all_data))
+
+        df = pd.DataFrame(all_data)
+        save_records(all_data)
         return df
 
 # Run and save
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, "../data/raw/data_raw_v3.csv") 
 JSON_PATH = os.path.join(BASE_DIR, "../data/raw/data_raw_v3.json")
+STATE_PATH = os.path.join(BASE_DIR, "../data/raw/crawl_state.sqlite")
 
 df_articles = asyncio.run(main())
-df_articles.to_csv(DATA_PATH, index=False)
-df_articles.to_json(JSON_PATH, orient="records", indent=2, force_ascii=False)
-print("Crawling results saved to", DATA_PATH)
+# main() already wrote the JSON and Parquet datasets
+if LEGACY_EXPORT:
+    df_articles.to_csv(DATA_PATH, index=False)
+print("Crawling results saved to", os.path.dirname(os.path.abspath(JSON_PATH)))
 
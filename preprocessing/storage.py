@@ -0,0 +1,258 @@
+import os
+import ast
+import json
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+PARQUET_SUFFIX = ".parquet"
+# Also write the old JSON/CSV files for tools that still read them (dashboard, notebooks)
+LEGACY_EXPORT = os.getenv("DATASET_LEGACY_EXPORT", "1") == "1"
+
+TITLE_COLUMNS = ("title", "Judul")
+AUTHOR_COLUMNS = ("authors", "Penulis")
+YEAR_COLUMNS = ("year", "Tahun")
+INT_COLUMNS = ("issue ID", "topics")
+PROBABILITY_COLUMNS = ("probabilities",)
+
+# (column, op, value) conjunctions, the pyarrow ``filters`` format
+Filters = Sequence[Tuple[str, str, object]]
+
+
+def extract_year(series: pd.Series) -> pd.Series:
+    """Parse a year from values like 2017, "2017" or "31 Jan 2017"."""
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, errors="coerce").astype("Int32")
+    return pd.to_numeric(series.astype(str).str.extract(r"(\d{4})", expand=False), errors="coerce").astype("Int32")
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _parse_list(value) -> Optional[list]:
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return list(value)
+    if _is_missing(value):
+        return None
+    text = str(value).strip()
+    if text.startswith('['):
+        # Lists that went through a CSV round trip, e.g. "['A', 'B']"
+        try:
+            return list(ast.literal_eval(text))
+        except (ValueError, SyntaxError):
+            pass
+    return [part.strip() for part in text.split(',') if part.strip()]
+
+
+def _parse_authors(value) -> Optional[List[str]]:
+    authors = _parse_list(value)
+    return [str(author) for author in authors] if authors is not None else None
+
+
+def _parse_probabilities(value) -> Optional[np.ndarray]:
+    values = _parse_list(value)
+    return np.asarray(values, dtype=np.float32) if values is not None else None
+
+
+def normalize_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce known columns to the dataset schema (list authors, int year, float probabilities)."""
+    df = df.copy()
+    for column in df.columns:
+        if column in AUTHOR_COLUMNS:
+            df[column] = df[column].map(_parse_authors)
+        elif column in YEAR_COLUMNS:
+            df[column] = extract_year(df[column])
+        elif column in INT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int32")
+        elif column in PROBABILITY_COLUMNS:
+            if pd.api.types.is_numeric_dtype(df[column]):
+                df[column] = df[column].astype(np.float32)
+            else:
+                df[column] = df[column].map(_parse_probabilities)
+    return df
+
+
+def _arrow_type(name: str, inferred):
+    import pyarrow as pa
+
+    if name in AUTHOR_COLUMNS:
+        return pa.list_(pa.string())
+    if name in YEAR_COLUMNS or name in INT_COLUMNS:
+        return pa.int32()
+    if name in PROBABILITY_COLUMNS:
+        return pa.float32() if pa.types.is_floating(inferred) else pa.list_(pa.float32())
+    if pa.types.is_null(inferred):
+        # All-null in this frame; later chunks written with the same schema may hold text
+        return pa.string()
+    return inferred
+
+
+def to_arrow(df: pd.DataFrame, schema=None):
+    """Convert a frame to an Arrow table with the typed dataset schema.
+
+    When ``schema`` is given (e.g. from an earlier chunk) the table is
+    conformed to it: missing columns become nulls, extra columns are dropped.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(normalize_types(df), preserve_index=False)
+    if schema is None:
+        schema = pa.schema([pa.field(field.name, _arrow_type(field.name, field.type)) for field in table.schema])
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def parquet_path(path: str) -> str:
+    """The Parquet sibling of a legacy JSON/CSV dataset path."""
+    return os.path.splitext(path)[0] + PARQUET_SUFFIX
+
+
+def resolve_path(path: str) -> str:
+    """Prefer the Parquet copy of a dataset unless the legacy file is newer."""
+    if path.endswith(PARQUET_SUFFIX):
+        return path
+    candidate = parquet_path(path)
+    if os.path.exists(candidate) and (not os.path.exists(path) or os.path.getmtime(candidate) >= os.path.getmtime(path)):
+        return candidate
+    return path
+
+
+def write_dataset(df: pd.DataFrame, path: str, compression: str = "zstd") -> str:
+    """Write ``df`` as typed Parquet next to (or at) ``path`` and return the file written."""
+    import pyarrow.parquet as pq
+
+    target = parquet_path(path)
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{target}.tmp"
+    pq.write_table(to_arrow(df), tmp_path, compression=compression)
+    os.replace(tmp_path, target)
+    return target
+
+
+def _read_legacy(path: str, columns: Optional[List[str]]) -> pd.DataFrame:
+    if path.endswith(".csv"):
+        return pd.read_csv(path, usecols=columns)
+    if path.endswith((".ndjson", ".jsonl")):
+        df = pd.read_json(path, lines=True, dtype=False)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            df = pd.DataFrame(json.load(f))
+    if columns is not None:
+        missing = [column for column in columns if column not in df.columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {', '.join(missing)}")
+        df = df[columns]
+    return df
+
+
+_FILTER_OPS = {
+    "=": lambda s, v: s == v, "==": lambda s, v: s == v, "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v, "<=": lambda s, v: s <= v, ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(v), "not in": lambda s, v: ~s.isin(v),
+}
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[Filters]) -> pd.DataFrame:
+    """Evaluate pyarrow-style filters with pandas (for formats without pushdown)."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if op not in _FILTER_OPS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        mask &= _FILTER_OPS[op](df[column], value).fillna(False).astype(bool)
+    return df[mask]
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    import pyarrow as pa
+
+    integer_types = {pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+                     pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+    df = table.to_pandas(types_mapper=integer_types.get)
+    for field in table.schema:
+        if pa.types.is_list(field.type) and not pa.types.is_floating(field.type.value_type):
+            df[field.name] = df[field.name].map(lambda value: value.tolist() if isinstance(value, np.ndarray) else value)
+    return df
+
+
+def read_dataset(path: str, columns: Optional[List[str]] = None, filters: Optional[Filters] = None) -> pd.DataFrame:
+    """Read a dataset with column projection and row filters.
+
+    Parquet (preferred through ``resolve_path``) pushes both down to the
+    reader so only the needed columns and row groups are decoded; legacy
+    JSON/CSV files are parsed, typed with ``normalize_types`` and filtered
+    in pandas.
+    """
+    path = resolve_path(path)
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+        return _arrow_to_pandas(pq.read_table(path, columns=columns, filters=filters or None))
+
+    read_columns = columns
+    if columns is not None and filters:
+        read_columns = list(dict.fromkeys(list(columns) + [column for column, _, _ in filters]))
+    df = apply_filters(normalize_types(_read_legacy(path, read_columns)), filters)
+    return df[columns] if columns is not None else df
+
+
+def read_records(path: str, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Read a dataset as a list of plain Python dicts (JSON-serializable)."""
+    path = resolve_path(path)
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns).to_pylist()
+    df = _read_legacy(path, columns)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def dataset_columns(path: str) -> List[str]:
+    """Column names of a dataset, reading only the schema/header where possible."""
+    path = resolve_path(path)
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if path.endswith(".csv"):
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    return _read_legacy(path, None).columns.tolist()
+
+
+def find_title_column(columns: List[str], source: str = "dataset") -> str:
+    """The title column among ``columns`` (``title`` in scraped data, ``Judul`` in cleaned data)."""
+    columns = list(columns)
+    column = next((name for name in TITLE_COLUMNS if name in columns), None)
+    if column is None:
+        raise ValueError(f"No title column found in {source}. Available columns: {columns}")
+    return column
+
+
+def title_column(path: str) -> str:
+    """Name of the title column of a dataset file."""
+    return find_title_column(dataset_columns(path), path)
+
+
+def iter_parquet_records(path: str, batch_size: int = 10000) -> Iterator[Dict]:
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Konversi dataset JSON/CSV ke Parquet bertipe")
+    parser.add_argument("paths", nargs="+", help="File JSON/NDJSON/CSV yang akan dikonversi")
+    args = parser.parse_args()
+
+    for source in args.paths:
+        target = write_dataset(_read_legacy(source, None), source)
+        print(f"{source} ({os.path.getsize(source)} bytes) -> {target} ({os.path.getsize(target)} bytes)")
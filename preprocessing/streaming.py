@@ -0,0 +1,219 @@
+import os
+import json
+import contextlib
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.text_cleaning import clean_series, remove_first_word_series, uses_pool
+from preprocessing.storage import PARQUET_SUFFIX, iter_parquet_records, to_arrow
+
+READ_SIZE = 1 << 20
+CSV_READ_ROWS = 10000
+NOISE_PATTERN = 'halaman sampul'
+DROP_COLUMNS = ['issue ID']
+
+
+def iter_json_array(f: TextIO, read_size: int = READ_SIZE) -> Iterator:
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def more():
+        nonlocal buffer, pos, eof
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            more()
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ']':
+        return
+
+    while True:
+        skip_whitespace()
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more()
+            continue
+        if not eof and (end == len(buffer) or buffer[end] not in ',] \t\r\n'):
+            # A number cut off by the read boundary parses as a shorter number
+            more()
+            continue
+        pos = end
+        yield item
+
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {separator!r}")
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Stream records from Parquet, CSV, a JSON array file or NDJSON (one object per line)."""
+    if path.endswith(PARQUET_SUFFIX):
+        yield from iter_parquet_records(path)
+        return
+    if path.endswith(".csv"):
+        for chunk in pd.read_csv(path, chunksize=CSV_READ_ROWS):
+            yield from chunk.to_dict(orient="records")
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        first = ''
+        while True:
+            first = f.read(1)
+            if not first or not first.isspace():
+                break
+        f.seek(0)
+        if first == '[':
+            yield from iter_json_array(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_chunks(records: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _JsonRecordWriter:
+    """Append cleaned chunks to NDJSON or to a single JSON array."""
+
+    def __init__(self, path: str, ndjson: bool):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.ndjson = ndjson
+        self.count = 0
+        if not ndjson:
+            self.f.write('[')
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        # Newlines inside values are escaped, so each line is exactly one record
+        lines = df.to_json(orient='records', lines=True, force_ascii=False).rstrip('\n')
+        if self.ndjson:
+            self.f.write(lines + '\n')
+        else:
+            self.f.write((',\n' if self.count else '\n') + lines.replace('\n', ',\n'))
+        self.count += len(df)
+
+    def close(self):
+        if not self.ndjson:
+            self.f.write('\n]\n')
+        self.f.close()
+
+
+class _ParquetRecordWriter:
+    """Append cleaned chunks as row groups of one Parquet file, typed by the first chunk."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        import pyarrow.parquet as pq
+
+        if df.empty:
+            return
+        schema = self._writer.schema if self._writer is not None else None
+        table = to_arrow(df, schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+        self.count += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table({}), self.path)
+
+
+def clean_chunk(df: pd.DataFrame, workers: Optional[int] = None, pool=None) -> pd.DataFrame:
+    """Apply the preprocessing.py cleaning steps to one chunk of raw records."""
+    if 'title' not in df.columns:
+        raise ValueError(f"'title' column not found. Available columns: {df.columns.tolist()}")
+    df = df[~df['title'].str.lower().str.contains(NOISE_PATTERN, na=False)].copy()
+    df['title'] = remove_first_word_series(clean_series(df['title'], workers=workers, pool=pool))
+    if 'abstract' in df.columns:
+        df['abstract'] = clean_series(df['abstract'], workers=workers, pool=pool)
+    return df.drop(columns=[column for column in DROP_COLUMNS if column in df.columns])
+
+
+def preprocess_stream(source_path: str, target_path: str, chunk_size: int = 10000,
+                      workers: Optional[int] = None) -> Dict[str, int]:
+    """Clean a raw dump chunk by chunk with bounded memory.
+
+    Records are read incrementally, cleaned ``chunk_size`` at a time, and
+    deduplicated on the cleaned title (first occurrence wins, as with
+    ``drop_duplicates``) using a set of 64-bit title digests, so only the
+    digests grow with the corpus. Output is Parquet, NDJSON or a JSON array
+    depending on the extension of ``target_path``; it is written to a
+    temporary file, moved into place when complete and removed on failure.
+    One cleaning process pool serves every chunk of the run.
+    """
+    seen = set()
+    stats = {"read": 0, "written": 0, "noise": 0, "duplicates": 0}
+
+    tmp_path = f"{target_path}.tmp"
+    if target_path.endswith(PARQUET_SUFFIX):
+        writer = _ParquetRecordWriter(tmp_path)
+    else:
+        writer = _JsonRecordWriter(tmp_path, ndjson=target_path.endswith(('.ndjson', '.jsonl')))
+    try:
+        with Pool(processes=workers) if uses_pool(chunk_size, workers) else contextlib.nullcontext() as pool:
+            try:
+                for records in iter_chunks(iter_records(source_path), chunk_size):
+                    stats["read"] += len(records)
+                    df = clean_chunk(pd.DataFrame(records), workers=workers, pool=pool)
+                    stats["noise"] += len(records) - len(df)
+
+                    digests = pd.util.hash_pandas_object(df['title'], index=False).to_numpy()
+                    keep = ~pd.Series(digests).duplicated().to_numpy()
+                    keep &= np.fromiter((digest not in seen for digest in digests.tolist()), dtype=bool,
+                                        count=len(digests))
+                    seen.update(digests[keep].tolist())
+                    stats["duplicates"] += int((~keep).sum())
+
+                    writer.write(df[keep])
+            finally:
+                writer.close()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    stats["written"] = writer.count
+    os.replace(tmp_path, target_path)
+    return stats
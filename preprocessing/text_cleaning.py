@@ -0,0 +1,99 @@
+import re
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import FrozenSet, Optional
+
+import pandas as pd
+
+# Bump when the cleaning rules change so downstream artifacts can tell versions apart
+CLEANING_VERSION = 1
+
+DIGITS_RE = re.compile(r'[\d]')
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+PARALLEL_MIN_ROWS = 50000
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language: str = 'indonesian') -> FrozenSet[str]:
+    """Load the NLTK stopword list once per process."""
+    import nltk
+    from nltk.corpus import stopwords
+    try:
+        words = stopwords.words(language)
+    except LookupError:
+        nltk.download('stopwords', quiet=True)
+        words = stopwords.words(language)
+    return frozenset(words)
+
+
+def clean_text(text: str, stops: Optional[FrozenSet[str]] = None) -> str:
+    """Lowercase, strip digits/punctuation, collapse whitespace and drop Indonesian stopwords."""
+    if not isinstance(text, str):
+        text = '' if text is None or text != text else str(text)
+    text = text.lower()
+    text = DIGITS_RE.sub('', text)
+    text = PUNCTUATION_RE.sub('', text)
+    text = WHITESPACE_RE.sub(' ', text).strip()
+    if stops is None:
+        stops = get_stopwords()
+    return ' '.join(word for word in text.split() if word not in stops)
+
+
+@lru_cache(maxsize=8)
+def stopwords_pattern(stops: FrozenSet[str]) -> Optional["re.Pattern"]:
+    """One compiled alternation matching any stopword as a whole whitespace-separated token."""
+    if not stops:
+        return None
+    # Longest first so a stopword that prefixes another one does not end the alternation early
+    words = sorted(stops, key=lambda word: (-len(word), word))
+    return re.compile(r'(?<!\S)(?:' + '|'.join(map(re.escape, words)) + r')(?!\S)')
+
+
+def remove_first_word(title: str) -> str:
+    words = title.split()
+    return ' '.join(words[1:]) if len(words) > 1 else ''
+
+
+def _clean_series(series: pd.Series) -> pd.Series:
+    stops = get_stopwords()
+    text = series.fillna('').astype(str).str.lower()
+    text = text.str.replace(DIGITS_RE, '', regex=True)
+    text = text.str.replace(PUNCTUATION_RE, '', regex=True)
+    pattern = stopwords_pattern(stops)
+    if pattern is not None:
+        text = text.str.replace(pattern, '', regex=True)
+    return text.str.replace(WHITESPACE_RE, ' ', regex=True).str.strip()
+
+
+def uses_pool(rows: int, workers: Optional[int] = None) -> bool:
+    """Whether cleaning ``rows`` rows with ``workers`` processes is worth a process pool."""
+    if workers is None:
+        return rows >= PARALLEL_MIN_ROWS
+    return workers > 1
+
+
+def clean_series(series: pd.Series, workers: Optional[int] = None, chunk_size: int = 20000,
+                 pool=None) -> pd.Series:
+    """Vectorized ``clean_text`` over a Series.
+
+    Large inputs (at least ``PARALLEL_MIN_ROWS`` rows, or whenever ``workers``
+    is given) are split into chunks and cleaned in a process pool. Callers
+    cleaning many Series pass their own ``pool`` so it is started only once.
+    """
+    if pool is None and not uses_pool(len(series), workers):
+        return _clean_series(series)
+
+    chunks = [series.iloc[start:start + chunk_size] for start in range(0, len(series), chunk_size)]
+    if pool is not None:
+        cleaned = pool.map(_clean_series, chunks)
+    else:
+        with Pool(processes=workers) as pool:
+            cleaned = pool.map(_clean_series, chunks)
+    return pd.concat(cleaned) if cleaned else series.astype(str)
+
+
+def remove_first_word_series(series: pd.Series) -> pd.Series:
+    """Vectorized ``remove_first_word``."""
+    return series.fillna('').astype(str).str.split().str[1:].str.join(' ')
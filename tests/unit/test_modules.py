@@ -35,6 +35,62 @@ class TestAPIMain:
         except ImportError as e:
             pytest.skip(f"FastAPI test dependencies missing: {e}")
     
+    def test_predict_rejects_invalid_top_k(self):
+        """Out-of-range top_k is a client error, not a prediction failure"""
+        try:
+            from api.main import app, PREDICT_MAX_TOP_K
+            from fastapi.testclient import TestClient
+        except ImportError as e:
+            pytest.skip(f"FastAPI test dependencies missing: {e}")
+
+        client = TestClient(app)
+        for top_k in (-1, PREDICT_MAX_TOP_K + 1):
+            response = client.post("/predict", json={"texts": ["test text"], "top_k": top_k})
+            assert response.status_code == 400
+            assert "top_k" in response.json()["detail"]
+
+    def test_upload_limit_and_cleanup(self, tmp_path, monkeypatch):
+        """Oversized uploads get 413; upload files are removed when their job finishes"""
+        try:
+            from types import SimpleNamespace
+            from api import main
+            from fastapi.testclient import TestClient
+        except ImportError as e:
+            pytest.skip(f"FastAPI test dependencies missing: {e}")
+
+        monkeypatch.setattr(main, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(main, "PREDICT_UPLOAD_MAX_BYTES", 16)
+        client = TestClient(app=main.app)
+        response = client.post("/jobs/predict/upload", content=b'{"title": "a long title"}\n' * 4)
+        assert response.status_code == 413
+        assert list(tmp_path.iterdir()) == []
+
+        upload = tmp_path / "job.ndjson"
+        upload.write_text('{"title": "x"}\n')
+        main.on_job_finished(SimpleNamespace(kind="predict", status="succeeded", params={"source": str(upload)}))
+        assert not upload.exists()
+
+    def test_admin_endpoints_fail_closed(self, monkeypatch):
+        """Admin endpoints reject every request while no ADMIN_TOKEN is configured"""
+        try:
+            from api import main
+            from fastapi.testclient import TestClient
+        except ImportError as e:
+            pytest.skip(f"FastAPI test dependencies missing: {e}")
+
+        client = TestClient(main.app)
+        monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+        for token in (None, "", "guess"):
+            headers = {"X-Admin-Token": token} if token is not None else {}
+            assert client.get("/admin/model", headers=headers).status_code == 403
+            assert client.post("/admin/model/rollback", headers=headers).status_code == 403
+            response = client.post("/admin/model/swap", headers=headers, json={"path": "model.pkl"})
+            assert response.status_code == 403
+
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "rahasia")
+        assert client.get("/admin/model", headers={"X-Admin-Token": "salah"}).status_code == 403
+        assert client.get("/admin/model", headers={"X-Admin-Token": "rahasia"}).status_code == 200
+
     def test_health_endpoint(self):
         """Test health endpoint"""
         try:
@@ -52,6 +108,339 @@ class TestAPIMain:
         except ImportError as e:
             pytest.skip(f"FastAPI test dependencies missing: {e}")
 
+class TestMicroBatcher:
+    """Test request coalescing for /predict"""
+
+    def test_batches_concurrent_requests(self):
+        """Concurrent submissions are merged and each caller gets its own slice"""
+        import threading
+        from api.batching import MicroBatcher
+
+        calls = []
+
+        def fake_predict(texts):
+            calls.append(list(texts))
+            return [text.upper() for text in texts]
+
+        batcher = MicroBatcher(fake_predict, max_batch_size=64, max_wait_ms=50)
+        results = {}
+
+        def worker(i):
+            results[i] = batcher.submit([f"a{i}", f"b{i}"])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        batcher.stop()
+
+        for i in range(5):
+            assert results[i] == [f"A{i}", f"B{i}"]
+        assert sum(len(c) for c in calls) == 10
+        assert len(calls) < 5
+
+    def test_batch_size_limit_and_errors(self):
+        """Batches never exceed max size and errors reach every caller"""
+        from api.batching import MicroBatcher
+
+        def failing_predict(texts):
+            raise RuntimeError("model unavailable")
+
+        batcher = MicroBatcher(failing_predict, max_batch_size=2, max_wait_ms=1)
+        with pytest.raises(RuntimeError):
+            batcher.submit(["x"])
+        batcher.stop()
+
+        sizes = []
+        batcher = MicroBatcher(lambda texts: sizes.append(len(texts)) or texts, max_batch_size=2, max_wait_ms=1)
+        assert batcher.submit(["a", "b", "c"]) == ["a", "b", "c"]
+        batcher.stop()
+        assert sizes == [3]  # Oversized requests run alone rather than being split
+
+    def test_concurrent_batches_on_worker_pool(self):
+        """Batches are dispatched to forked workers that follow the parent's model version"""
+        import gc
+        import threading
+        from api.batching import MicroBatcher
+        from api.inference_pool import InferencePool
+
+        state = {"version": "v1"}
+
+        def worker_predict(texts):
+            return [f"{os.getpid()}:{state['version']}:{text}" for text in texts]
+
+        pool = InferencePool(worker_predict, lambda: (state["version"], None), lambda snapshot: None, workers=2)
+        create_executor, forking_threads = pool._create_executor, []
+
+        def recording_create_executor(snapshot):
+            forking_threads.append(threading.current_thread().name)
+            return create_executor(snapshot)
+
+        pool._create_executor = recording_create_executor
+        batcher = MicroBatcher(pool.predict, max_batch_size=1, max_wait_ms=1, max_concurrent_batches=2)
+        try:
+            results = {}
+            threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.submit([str(i)])}))
+                       for i in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            for i in range(6):
+                pid, version, text = results[i][0].split(":")
+                assert int(pid) != os.getpid() and version == "v1" and text == str(i)
+
+            # A registry swap re-forks the pool before the next request arrives
+            state["version"] = "v2"
+            threading.Thread(target=pool.refresh, name="model-loader-v2").start()
+            assert pool.predict(["x"])[0].endswith(":v2:x")
+            pool.refresh()
+            assert pool.version == "v2"
+
+            # Forks run on the pool's own thread and the parent's collector is unfrozen afterwards
+            assert len(forking_threads) == 2
+            assert all(name.startswith("inference-pool") for name in forking_threads)
+            assert gc.get_freeze_count() == 0
+        finally:
+            batcher.stop()
+            pool.stop()
+
+    def test_worker_init_without_torch_threads(self, monkeypatch):
+        """A torch build without set_num_threads does not break worker startup"""
+        import types
+        from api import inference_pool
+
+        restored = []
+        monkeypatch.setattr(inference_pool, "_worker_state", {})
+        monkeypatch.setitem(sys.modules, "torch", types.ModuleType("torch"))
+        monkeypatch.setenv("ONNX_INTRA_OP_THREADS", "1")
+        inference_pool._init_worker(str.upper, restored.append, ("v1", None), threads=2)
+        assert restored == [("v1", None)]
+
+class TestJobManager:
+    """Test the background pipeline job runner"""
+
+    def test_dedup_success_and_failure(self, tmp_path):
+        """Duplicate submissions share a job; failing stages are reported"""
+        from api.jobs import JobManager, SUCCEEDED, FAILED
+
+        ok = tmp_path / "ok.py"
+        ok.write_text("import time\ntime.sleep(0.5)\nprint('stage done')\n")
+        fail = tmp_path / "fail.py"
+        fail.write_text("import sys\nsys.exit(3)\n")
+        manager = JobManager(job_kinds={"ok": ["ok"], "fail": ["fail"]},
+                             stages={"ok": ("script", str(ok)), "fail": ("script", str(fail))}, preload=())
+        try:
+            job, created = manager.submit("ok")
+            duplicate, duplicate_created = manager.submit("ok")
+            assert created and not duplicate_created
+            assert duplicate is job
+            with pytest.raises(ValueError):
+                manager.submit("missing")
+
+            assert manager.wait(job.id, timeout=30).status == SUCCEEDED
+            assert any(event.get("message") == "stage done" for event in job.events)
+
+            failed, _ = manager.submit("fail")
+            assert manager.wait(failed.id, timeout=30).status == FAILED
+            assert "status 3" in failed.error
+        finally:
+            manager.stop()
+
+class TestBatchPredict:
+    """Test streaming batch prediction over a dataset"""
+
+    def test_labels_in_chunks_and_resumes(self, tmp_path):
+        """Every record is labeled once; a finished checkpoint is reused on rerun"""
+        try:
+            import types
+            import numpy as np
+            import pandas as pd
+            from model import batch_predict
+        except ImportError as e:
+            pytest.skip(f"Batch predict import failed: {e}")
+
+        calls = []
+        def assign(texts):
+            calls.append(len(texts))
+            topics = np.array([len(text) % 3 - 1 for text in texts])
+            return topics, np.full(len(texts), 0.5), [f"Topic_{topic}" for topic in topics]
+
+        fake_predict = types.ModuleType("model.predict")
+        fake_predict.activate_latest_model = lambda path=None: Mock(version="v1")
+        fake_predict.predict_topic_assignments = assign
+
+        source = tmp_path / "data.ndjson"
+        pd.DataFrame({"title": ["a", "bb", "ccc", "dddd", "eeeee"], "year": [2017, 2018, 2019, 2020, 2021]}).to_json(
+            source, orient="records", lines=True)
+        target = tmp_path / "out.csv"
+        progress = []
+        with patch.dict(sys.modules, {"model.predict": fake_predict}):
+            stats = batch_predict.predict_dataset(str(source), str(target), chunk_size=2,
+                                                  progress=lambda **fields: progress.append(fields))
+
+            result = pd.read_csv(target)
+            assert stats["rows"] == 5 and stats["chunks"] == 3
+            assert calls == [2, 2, 1]
+            assert result["title"].tolist() == ["a", "bb", "ccc", "dddd", "eeeee"]
+            assert result["topics"].tolist() == [0, 1, -1, 0, 1]
+            assert set(result.columns) >= {"year", "probabilities", "topic_label"}
+            assert progress[-1]["rows_done"] == 5
+
+            # Simulate a run interrupted after the first chunk
+            parts_dir = batch_predict._parts_dir(str(target))
+            os.makedirs(parts_dir)
+            first = batch_predict.to_arrow(result.head(2).assign(topics=[7, 7]))
+            import pyarrow.parquet as pq
+            pq.write_table(first, batch_predict._part_path(parts_dir, 0))
+            expected = {"source": batch_predict._source_identity(str(source)), "column": None, "chunk_size": 2,
+                        "columns": None, "model_version": "v1"}
+            batch_predict._save_checkpoint(parts_dir, dict(expected, chunks=1, rows=2))
+            calls.clear()
+            batch_predict.predict_dataset(str(source), str(target), chunk_size=2)
+            assert calls == [2, 1]
+            assert pd.read_csv(target)["topics"].tolist() == [7, 7, -1, 0, 1]
+            assert not os.path.exists(parts_dir)
+
+class TestPredictionCache:
+    """Test the prediction result cache"""
+
+    def test_misses_computed_once_and_invalidated_on_model_change(self, tmp_path):
+        """Only distinct misses reach the model; a new version or expired TTL recomputes"""
+        import time
+        from api.prediction_cache import PredictionCache
+
+        calls = []
+        def compute(texts):
+            calls.append(list(texts))
+            return [text.upper() for text in texts]
+
+        hits, misses = Mock(), Mock()
+        cache = PredictionCache(max_items=10, ttl_seconds=60, disk_path=str(tmp_path / "cache.sqlite"),
+                                hit_counter=hits, miss_counter=misses)
+        assert cache.get_or_compute("v1", "labels", ["a", "b", "a"], ["A ", "b", " a"], compute) == ["A ", "B", "A "]
+        assert calls == [["A ", "b"]]
+        misses.inc.assert_called_with(3)
+
+        assert cache.get_or_compute("v1", "labels", ["b", "c"], ["b", "c"], compute) == ["B", "C"]
+        assert calls[-1] == ["c"]
+        hits.inc.assert_called_with(1)
+
+        # Entries survive a restart through the disk store
+        restarted = PredictionCache(disk_path=str(tmp_path / "cache.sqlite"))
+        assert restarted.lookup("v1", "labels", ["a", "c", "d"]) == ["A ", "C", None]
+        assert restarted.lookup("v1", "top_k", ["a"]) == [None]
+
+        # A new model version never sees the old results
+        assert cache.lookup("v2", "labels", ["a", "b"]) == [None, None]
+        assert len(cache) == 0
+        cache.get_or_compute("v2", "labels", ["a"], ["a"], lambda texts: ["v2:a"])
+        # ...but a process still serving v1 on the same file keeps its entries, as does a rollback
+        assert PredictionCache(disk_path=str(tmp_path / "cache.sqlite")).lookup("v1", "labels", ["a"]) == ["A "]
+        assert cache.lookup("v1", "labels", ["a"]) == ["A "]
+        assert cache.lookup("v2", "labels", ["a"]) == ["v2:a"]
+
+        # The disk tier is capped, dropping the oldest rows first
+        capped = PredictionCache(disk_path=str(tmp_path / "capped.sqlite"), disk_max_rows=2)
+        for version in ("v1", "v2", "v3"):
+            capped.get_or_compute(version, "labels", ["x"], ["x"], lambda texts: [version])
+        capped._disk.prune(0.0)
+        assert PredictionCache(disk_path=str(tmp_path / "capped.sqlite")).lookup("v1", "labels", ["x"]) == [None]
+        assert PredictionCache(disk_path=str(tmp_path / "capped.sqlite")).lookup("v3", "labels", ["x"]) == ["v3"]
+
+        # Results depend on inference settings too; they are part of the stored version
+        from api.prediction_cache import settings_fingerprint
+        fast = settings_fingerprint({"fast_inference": True, "max_top_k": 10})
+        assert fast == settings_fingerprint({"max_top_k": 10, "fast_inference": True})
+        assert fast != settings_fingerprint({"fast_inference": False, "max_top_k": 10})
+        cache.get_or_compute(f"v2#{fast}", "labels", ["a"], ["a"], compute)
+        assert cache.lookup("v2#other", "labels", ["a"]) == [None]
+
+        expiring = PredictionCache(ttl_seconds=60)
+        expiring.get_or_compute("v1", "labels", ["x"], ["x"], compute)
+        with patch("api.prediction_cache.time.time", return_value=time.time() + 120):
+            assert expiring.lookup("v1", "labels", ["x"]) == [None]
+
+class TestDataset:
+    """Test the cached, paginated dataset behind /data"""
+
+    def test_cache_filters_and_cursor(self, tmp_path):
+        """Dataset is reloaded on change and supports projection, filters and cursors"""
+        try:
+            import pandas as pd
+            from api import dataset
+        except ImportError as e:
+            pytest.skip(f"Dataset import failed: {e}")
+
+        path = tmp_path / "data.csv"
+        pd.DataFrame({"Judul": ["a", "b", "c"], "Tahun": ["31 Jan 2017", "1 Feb 2018", "2018"]}).to_csv(path, index=False)
+
+        cached = dataset.CachedDataset(str(path))
+        df, version = cached.get()
+        assert cached.get()[0] is df
+
+        selected = dataset.select(df, ["Judul"], year=2018)
+        assert selected["Judul"].tolist() == ["b", "c"]
+        assert list(selected.columns) == ["Judul"]
+        with pytest.raises(ValueError):
+            dataset.select(df, ["missing"])
+        with pytest.raises(ValueError):
+            dataset.select(df, topic=1)
+
+        query = dataset.query_fingerprint(["Judul"], year=2018)
+        assert dataset.decode_cursor(dataset.encode_cursor(2, version, query), query) == (2, version)
+        for other in (dataset.query_fingerprint(["Judul"], year=2017), dataset.query_fingerprint(year=2018),
+                      dataset.query_fingerprint(["Judul"], year=2018, topic=1)):
+            with pytest.raises(ValueError, match="different filters"):
+                dataset.decode_cursor(dataset.encode_cursor(2, version, query), other)
+        assert b"".join(dataset.iter_ndjson(selected)).count(b"\n") == 2
+
+        pd.DataFrame({"Judul": ["d"], "Tahun": [2019]}).to_csv(path, index=False)
+        os.utime(path, ns=(1, 1))
+        reloaded, new_version = cached.get()
+        assert reloaded["Judul"].tolist() == ["d"]
+        assert new_version != version
+
+class TestDatasetStorage:
+    """Test the typed Parquet dataset layer"""
+
+    def test_parquet_roundtrip_projection_and_filters(self, tmp_path):
+        """Legacy CSV is typed, written as Parquet and preferred by readers"""
+        try:
+            import pyarrow  # noqa: F401
+            import pandas as pd
+            from preprocessing.storage import read_dataset, resolve_path, write_dataset, dataset_columns, title_column
+        except ImportError as e:
+            pytest.skip(f"Storage import failed: {e}")
+
+        legacy = tmp_path / "cleaned.csv"
+        pd.DataFrame({
+            "Judul": ["a", "b", "c"],
+            "Penulis": ["A, B", "['C', 'D']", None],
+            "Tahun": ["31 Jan 2017", "2018", "1 Feb 2018"],
+            "probabilities": ["[0.1, 0.9]", "[0.5, 0.5]", "[1.0, 0.0]"],
+        }).to_csv(legacy, index=False)
+
+        typed = read_dataset(str(legacy))
+        assert typed["Penulis"].tolist() == [["A", "B"], ["C", "D"], None]
+        assert typed["Tahun"].tolist() == [2017, 2018, 2018]
+
+        written = write_dataset(typed, str(legacy))
+        assert written.endswith(".parquet") and resolve_path(str(legacy)) == written
+        assert dataset_columns(str(legacy)) == ["Judul", "Penulis", "Tahun", "probabilities"]
+        assert title_column(str(legacy)) == "Judul"
+
+        df = read_dataset(str(legacy), columns=["Judul", "probabilities"], filters=[("Tahun", "=", 2018)])
+        assert df["Judul"].tolist() == ["b", "c"]
+        assert list(df.columns) == ["Judul", "probabilities"]
+        assert df["probabilities"].iloc[0].dtype.name == "float32"
+
+        os.utime(written, ns=(1, 1))
+        assert resolve_path(str(legacy)) == str(legacy)
+        assert read_dataset(str(legacy), columns=["Judul"], filters=[("Tahun", "<", 2018)])["Judul"].tolist() == ["a"]
+
 class TestModelPredict:
     """Test model prediction functionality"""
     
@@ -81,6 +470,655 @@ class TestModelPredict:
         except ImportError as e:
             pytest.skip(f"Model predict test failed: {e}")
 
+    def test_topic_label_table(self):
+        """Test that topic labels are gathered from the precomputed table"""
+        try:
+            from model.predict import build_topic_label_table, get_topic_labels
+
+            mock_model = Mock()
+            mock_model.get_topics.return_value = {-1: [], 0: [("data", 0.5)], 1: [("web", 0.4), ("app", 0.3)]}
+            mock_model.get_topic.side_effect = lambda topic: mock_model.get_topics.return_value[topic]
+
+            labels = build_topic_label_table(mock_model)
+            assert labels[0] == "Outlier"
+
+            result = get_topic_labels([1, -1, 0, 7], labels)
+            assert result == ["Topic_1: web, app", "Outlier", "Topic_0: data", "Topic_7"]
+
+        except ImportError as e:
+            pytest.skip(f"Model predict import failed: {e}")
+
+    def test_duplicates_transformed_once(self):
+        """Duplicate texts reach the model once, shortest first, and results keep input order"""
+        try:
+            import numpy as np
+            from model import predict
+            from model.registry import ModelSlot
+        except ImportError as e:
+            pytest.skip(f"Model predict import failed: {e}")
+
+        documents, inverse = predict.deduplicate_documents(["ccc", "a", "ccc", "bb", "a"])
+        assert documents == ["a", "bb", "ccc"]
+        assert inverse.tolist() == [2, 0, 2, 1, 0]
+
+        mock_model = Mock()
+        mock_model.transform.side_effect = lambda docs, embeddings=None: (np.array([len(doc) for doc in docs]), None)
+        labels = np.array(["Outlier", "Topic_0", "Topic_1", "Topic_2", "Topic_3"], dtype=object)
+        slot = ModelSlot("test", None, mock_model, labels, normalizer=lambda texts: texts)
+        with patch.object(predict, "get_active_slot", return_value=slot), \
+             patch.object(predict, "embed_documents", return_value=None):
+            assert predict.predict_topic(["ccc", "a", "ccc", "bb", "a"]) == \
+                ["Topic_3", "Topic_1", "Topic_3", "Topic_2", "Topic_1"]
+        assert mock_model.transform.call_args[0][0] == ["a", "bb", "ccc"]
+
+    def test_text_normalizer_follows_model_spec(self):
+        """Inference inputs are cleaned with the rules stored in the model artifact"""
+        from model.normalization import TextNormalizer, build_normalizer
+
+        mock_model = Mock()
+        mock_model.preprocessing_spec = {"version": 1, "steps": ["clean_text"], "stopwords": ["dan", "untuk"]}
+        normalizer = build_normalizer(mock_model)
+
+        texts = ["Sistem Rekomendasi 2024, dan Klasifikasi!", None, "Sistem Rekomendasi 2024, dan Klasifikasi!"]
+        assert normalizer(texts) == ["sistem rekomendasi klasifikasi", "", "sistem rekomendasi klasifikasi"]
+        assert normalizer._normalize_one.cache_info().misses == 2
+
+        restored = TextNormalizer.from_spec(normalizer.spec())
+        assert restored.steps == ("clean_text",)
+        assert restored.stopwords == frozenset({"dan", "untuk"})
+
+        with pytest.raises(ValueError):
+            TextNormalizer(steps=["stem"], stopwords=[])
+
+    def test_legacy_model_resolves_stopwords_at_build(self):
+        """Without a stored spec the stopword list is resolved when the normalizer is built"""
+        from types import SimpleNamespace
+        from model.normalization import build_normalizer
+
+        legacy_model = SimpleNamespace()
+        with patch("model.normalization.get_stopwords", side_effect=LookupError("stopwords not found")):
+            with pytest.raises(LookupError):
+                build_normalizer(legacy_model)
+
+        with patch("model.normalization.get_stopwords", return_value=frozenset({"dan"})) as mock_stopwords:
+            normalizer = build_normalizer(legacy_model)
+            assert mock_stopwords.call_count == 1
+        assert normalizer(["Data dan Web"]) == ["data web"]
+        assert normalizer.spec()["stopwords"] == ["dan"]
+
+class TestEmbeddingCache:
+    """Test the shared embedding cache"""
+
+    def test_cache_encodes_each_text_once(self, tmp_path):
+        """Duplicate and previously seen texts are not re-encoded, across instances"""
+        try:
+            import numpy as np
+            from model.embedding_cache import EmbeddingCache, text_hash
+        except ImportError as e:
+            pytest.skip(f"Embedding cache import failed: {e}")
+
+        encoded = []
+
+        def fake_encode(texts):
+            encoded.extend(texts)
+            return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+        cache = EmbeddingCache("sentence-transformers/test-model", cache_dir=str(tmp_path))
+        first = cache.encode(["a b", "a  b", "ccc"], fake_encode)
+        assert first.shape == (3, 2)
+        assert encoded == ["a b", "ccc"]
+
+        # A fresh instance reads the persisted disk tier
+        reloaded = EmbeddingCache("test-model", cache_dir=str(tmp_path))
+        second = reloaded.encode(["ccc", "dd"], fake_encode)
+        assert encoded == ["a b", "ccc", "dd"]
+        assert np.allclose(second[0], first[2])
+
+        # Serving lookups read the disk tier but only remember new texts in memory
+        size = os.path.getsize(reloaded._hashes_path)
+        served = reloaded.encode(["ccc", "request text"], fake_encode, persist=False)
+        assert encoded == ["a b", "ccc", "dd", "request text"]
+        assert np.allclose(served[0], first[2])
+        assert os.path.getsize(reloaded._hashes_path) == size
+        assert text_hash("request text") not in EmbeddingCache("test-model", cache_dir=str(tmp_path))._index
+
+    def test_concurrent_writers_keep_rows_aligned(self, tmp_path):
+        """Processes appending to one cache directory never mix up rows, and a torn append is dropped"""
+        try:
+            import multiprocessing
+            import numpy as np
+            from model.embedding_cache import EmbeddingCache
+        except ImportError as e:
+            pytest.skip(f"Embedding cache import failed: {e}")
+
+        def vector(text):
+            return [float(sum(map(ord, text))), float(len(text))]
+
+        def writer(worker):
+            # Each process starts from the same (empty) view of the disk tier
+            cache = EmbeddingCache("test-model", cache_dir=str(tmp_path), memory_items=0)
+            for start in range(0, 40, 5):
+                texts = [f"w{worker} text {i}" for i in range(start, start + 5)] + ["shared text"]
+                cache.encode(texts, lambda batch: np.array([vector(t) for t in batch], dtype=np.float32))
+
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            pytest.skip("fork start method not available")
+        processes = [context.Process(target=writer, args=(worker,)) for worker in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+        assert all(process.exitcode == 0 for process in processes)
+
+        cache = EmbeddingCache("test-model", cache_dir=str(tmp_path), memory_items=0)
+        texts = [f"w{worker} text {i}" for worker in range(4) for i in range(40)] + ["shared text"]
+
+        def never(batch):
+            pytest.fail(f"re-encoded {batch}")
+
+        assert np.array_equal(cache.encode(texts, never), np.array([vector(t) for t in texts], dtype=np.float32))
+
+        # A writer that died between the two appends leaves an extra embedding row
+        with open(cache._embeddings_path, "ab") as f:
+            f.write(np.zeros(2, dtype=np.float32).tobytes())
+        reloaded = EmbeddingCache("test-model", cache_dir=str(tmp_path), memory_items=0)
+        assert len(reloaded._index) == len(cache._index)
+        assert os.path.getsize(reloaded._embeddings_path) == reloaded._rows * 2 * 4
+        assert np.array_equal(reloaded.encode(texts[:3], never), np.array([vector(t) for t in texts[:3]], dtype=np.float32))
+
+    def test_models_with_different_encoders_do_not_share_entries(self, tmp_path):
+        """The cache namespace follows each model's encoder, not a global default"""
+        try:
+            from types import SimpleNamespace
+            import numpy as np
+            from model.embedding_cache import cached_encode, encoder_name
+        except ImportError as e:
+            pytest.skip(f"Embedding cache import failed: {e}")
+
+        # A pickled model that only knows its encoder through the loaded SentenceTransformer
+        sentence_model = SimpleNamespace(tokenizer=SimpleNamespace(name_or_path="org/encoder-a"))
+        first = SimpleNamespace(embedding_model=SimpleNamespace(embedding_model=sentence_model))
+        second = SimpleNamespace(embedding_model=None, embedding_model_name="encoder-b")
+        assert encoder_name(first) == "org/encoder-a"
+        assert encoder_name(second) == "encoder-b"
+        assert encoder_name(SimpleNamespace(embedding_model=None)) is None
+
+        calls = []
+        for model, value in ((first, 1.0), (second, 2.0)):
+            def encode(batch, value=value):
+                calls.append(value)
+                return np.full((len(batch), 2), value, dtype=np.float32)
+            embeddings = cached_encode(encoder_name(model), ["same text"], encode, cache_dir=str(tmp_path))
+            assert np.all(embeddings == value)
+        assert calls == [1.0, 2.0]
+
+class TestOnnxEmbeddingBackend:
+    """Test the ONNX Runtime embedding backend"""
+
+    def test_pooling_and_batch_order(self, tmp_path):
+        """Length-sorted batches are returned in input order with the exported pooling"""
+        import json
+        import pickle
+        import numpy as np
+        from model.onnx_backend import CONFIG_NAME, OnnxEmbeddingBackend, pool, use_onnx_backend
+
+        tokens = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        mask = np.array([[1, 1, 0], [1, 1, 1]])
+        mean = pool(tokens, mask, "mean", normalize=False)
+        assert np.allclose(mean[0], tokens[0, :2].mean(axis=0))
+        assert np.allclose(np.linalg.norm(pool(tokens, mask, "cls", normalize=True), axis=1), 1.0)
+
+        (tmp_path / CONFIG_NAME).write_text(json.dumps({
+            "format": "ptiik-onnx-embedding", "source": "all-MiniLM-L6-v2", "inputs": ["input_ids", "attention_mask"],
+            "pooling": "mean", "normalize": False, "max_seq_length": 8, "quantized": True}))
+        backend = OnnxEmbeddingBackend(str(tmp_path), batch_size=2)
+        assert backend.cache_name == "all-MiniLM-L6-v2#onnx-int8"
+
+        def tokenize(documents, **kwargs):
+            width = max(len(document) for document in documents)
+            ids = np.array([[len(document)] * width for document in documents])
+            return {"input_ids": ids, "attention_mask": np.ones_like(ids)}
+
+        batches = []
+        def run(outputs, feeds):
+            batches.append(feeds["input_ids"][:, 0].tolist())
+            return [np.repeat(feeds["input_ids"][..., None].astype(np.float32), 3, axis=2)]
+
+        backend._tokenizer = tokenize
+        backend._session, backend._session_pid = Mock(run=run), os.getpid()
+        embeddings = backend.embed_documents(["aaaa", "b", "ccc", "dd", "eeeee"])
+        assert embeddings[:, 0].tolist() == [4, 1, 3, 2, 5]
+        assert batches == [[1, 2], [3, 4], [5]]
+
+        restored = pickle.loads(pickle.dumps(backend))
+        assert restored._session is None and restored.config == backend.config
+        assert not use_onnx_backend(Mock(), str(tmp_path / "missing"))
+
+class TestPrefittedReducer:
+    """Test the shared UMAP reducer used by the training grid"""
+
+    def test_reuses_training_reduction(self):
+        """Training embeddings return the cached reduction, new ones go through UMAP"""
+        try:
+            import pickle
+            import numpy as np
+            from model.dimensionality import PrefittedReducer
+        except ImportError as e:
+            pytest.skip(f"Dimensionality import failed: {e}")
+
+        umap_model = Mock()
+        umap_model.transform.return_value = np.zeros((1, 2))
+        train = np.ones((3, 4))
+        reduced = np.full((3, 2), 7.0)
+
+        reducer = PrefittedReducer(umap_model, train, reduced)
+        assert reducer.fit(train) is reducer
+        assert reducer.transform(train.copy()) is reduced
+        reducer.transform(np.ones((1, 4)))
+        umap_model.transform.assert_called_once()
+
+        restored = pickle.loads(pickle.dumps(PrefittedReducer(None, train, reduced)))
+        assert restored._reduced_embeddings is None
+
+class TestCentroidAssigner:
+    """Test centroid-similarity topic assignment"""
+
+    def test_assigns_nearest_topic_and_reports_parity(self):
+        """Documents go to the most similar non-outlier topic; the report compares with transform"""
+        try:
+            import numpy as np
+            from model.centroid import CentroidAssigner, build_assigner, parity_report
+        except ImportError as e:
+            pytest.skip(f"Centroid import failed: {e}")
+
+        topic_embeddings = np.array([[1.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        embeddings = np.array([[5.0, 0.1, 0.0], [0.2, 3.0, 0.0], [0.0, 0.0, 1.0]])
+
+        topics, scores = CentroidAssigner(topic_embeddings, [-1, 0, 1]).assign(embeddings)
+        assert topics[:2].tolist() == [0, 1]
+        assert scores[0] == pytest.approx(0.9998, abs=1e-4)
+        topics, _ = CentroidAssigner(topic_embeddings, [-1, 0, 1], min_similarity=0.5).assign(embeddings)
+        assert topics.tolist() == [0, 1, -1]
+
+        model = Mock(topic_embeddings_=topic_embeddings, _outliers=1)
+        model.transform.return_value = (np.array([0, 0, -1]), None)
+        report = parity_report(model, ["a", "b", "c"], embeddings)
+        assert build_assigner(model).topic_ids.tolist() == [0, 1]
+        assert report["documents"] == 3
+        assert report["agreement_excluding_outliers"] == 0.5
+        assert report["full_transform_outliers"] == 1
+        assert report["top_mismatches"][0]["count"] == 1
+
+    def test_top_k_matches_full_sort(self):
+        """argpartition-based top-k equals a full descending sort"""
+        try:
+            import numpy as np
+            from model.centroid import CentroidAssigner, top_k
+        except ImportError as e:
+            pytest.skip(f"Centroid import failed: {e}")
+
+        scores = np.random.default_rng(0).random((50, 30))
+        indices, values = top_k(scores, 5)
+        expected = np.argsort(-scores, axis=1)[:, :5]
+        assert np.array_equal(indices, expected)
+        assert np.allclose(values, np.take_along_axis(scores, expected, axis=1))
+        assert top_k(scores, 100)[0].shape == (50, 30)
+
+        assigner = CentroidAssigner(np.eye(4), [-1, 0, 1, 2])
+        topics, ids, similarities = assigner.assign_top_k(np.array([[0.0, 1.0, 0.5, 0.0]]), 2)
+        assert topics.tolist() == [0]
+        assert ids.tolist() == [[0, 1]]
+        assert similarities[0, 0] > similarities[0, 1]
+
+class TestCoherenceEvaluator:
+    """Test the shared coherence index"""
+
+    def test_scores_topics_against_shared_index(self):
+        """Words that always co-occur score higher than unrelated words"""
+        try:
+            from model.coherence import CoherenceEvaluator
+        except ImportError as e:
+            pytest.skip(f"Coherence import failed: {e}")
+
+        texts = [["data", "mining", "web"], ["data", "mining"], ["web", "app"], ["app", "mobile"]] * 5
+        evaluator = CoherenceEvaluator(texts, window_size=10)
+
+        related, unrelated = evaluator.score_topics([["data", "mining"], ["data", "mobile"]], measure="c_npmi")
+        assert related > unrelated
+        assert related == pytest.approx(1.0, abs=1e-6)
+
+        topic_sets = [[["data", "mining", "web"]], [["app", "mobile", "unknown"]]]
+        assert evaluator.score_many(topic_sets) == pytest.approx([evaluator.score(t) for t in topic_sets])
+
+class TestServingBundle:
+    """Test the lazily loaded serving bundle format"""
+
+    def test_bundle_metadata_and_topic_mapping(self, tmp_path):
+        """Bundle exposes topics, labels and BERTopic's cluster-to-topic mapping"""
+        try:
+            import json
+            import numpy as np
+            from model import artifact
+        except ImportError as e:
+            pytest.skip(f"Artifact import failed: {e}")
+
+        manifest = {"format": artifact.BUNDLE_FORMAT, "version": 1, "embedding_model": "test-model",
+                    "outliers": 1, "c_tf_idf_shape": None}
+        (tmp_path / artifact.MANIFEST_NAME).write_text(json.dumps(manifest))
+        (tmp_path / artifact.TOPICS_FILE).write_text(json.dumps({"-1": [], "0": [["data", 0.5]], "1": [["web", 0.4]]}))
+        (tmp_path / artifact.LABELS_FILE).write_text(json.dumps(["Outlier", "Topic_0: data", "Topic_1: web"]))
+        np.save(tmp_path / artifact.TOPIC_MAPPING_FILE, np.array([[-1, -1], [0, 1], [1, 0]]))
+
+        assert artifact.is_bundle(str(tmp_path))
+        model = artifact.load_bundle(str(tmp_path))
+        assert model.embedding_model is None
+        assert model.topic_embeddings_ is None
+        assert model.get_topic(0) == [("data", 0.5)]
+        assert model.topic_label_table[2] == "Topic_1: web"
+        assert model._map_predictions([0, 1, -1, 5]).tolist() == [1, 0, -1, -1]
+        assert model._map_probabilities(np.array([[0.2, 0.7]])).tolist() == [[0.7, 0.2]]
+
+    def test_checksums_detect_corrupted_files(self, tmp_path):
+        """Bundles whose files no longer match the manifest checksums are refused"""
+        try:
+            import json
+            import numpy as np
+            from model import artifact
+        except ImportError as e:
+            pytest.skip(f"Artifact import failed: {e}")
+
+        (tmp_path / artifact.TOPICS_FILE).write_text(json.dumps({"-1": [], "0": [["data", 0.5]]}))
+        (tmp_path / artifact.LABELS_FILE).write_text(json.dumps(["Outlier", "Topic_0: data"]))
+        np.save(tmp_path / artifact.TOPIC_MAPPING_FILE, np.array([[-1, -1], [0, 0]]))
+        manifest = {"format": artifact.BUNDLE_FORMAT, "version": 1, "outliers": 1, "c_tf_idf_shape": None,
+                    "checksums": artifact.compute_checksums(str(tmp_path))}
+        (tmp_path / artifact.MANIFEST_NAME).write_text(json.dumps(manifest))
+
+        expected = [artifact.TOPICS_FILE, artifact.LABELS_FILE, artifact.TOPIC_MAPPING_FILE]
+        assert sorted(manifest["checksums"]) == sorted(expected)
+        assert artifact.verify_bundle(str(tmp_path)) == []
+        artifact.BundledTopicModel(str(tmp_path), verify=True)
+
+        (tmp_path / artifact.LABELS_FILE).write_text(json.dumps(["Outlier", "Topic_0: web"]))
+        assert artifact.verify_bundle(str(tmp_path)) == [artifact.LABELS_FILE]
+        assert artifact.verify_bundle(str(tmp_path), names=[artifact.TOPICS_FILE]) == []
+        with pytest.raises(ValueError):
+            artifact.BundledTopicModel(str(tmp_path), verify=True)
+        # Loading does not hash the bundle unless asked to
+        assert artifact.load_bundle(str(tmp_path)).topic_label_table[1] == "Topic_0: web"
+
+    def test_components_are_verified_when_loaded(self, tmp_path):
+        """With verification on, a component's files are only hashed when that component loads"""
+        try:
+            import json
+            import numpy as np
+            from model import artifact
+        except ImportError as e:
+            pytest.skip(f"Artifact import failed: {e}")
+
+        (tmp_path / artifact.TOPICS_FILE).write_text(json.dumps({"-1": [], "0": [["data", 0.5]]}))
+        (tmp_path / artifact.LABELS_FILE).write_text(json.dumps(["Outlier", "Topic_0: data"]))
+        np.save(tmp_path / artifact.TOPIC_MAPPING_FILE, np.array([[-1, -1], [0, 0]]))
+        np.save(tmp_path / artifact.TOPIC_EMBEDDINGS_FILE, np.ones((2, 3), dtype=np.float32))
+        manifest = {"format": artifact.BUNDLE_FORMAT, "version": 1, "outliers": 1, "c_tf_idf_shape": None,
+                    "checksums": artifact.compute_checksums(str(tmp_path))}
+        (tmp_path / artifact.MANIFEST_NAME).write_text(json.dumps(manifest))
+        np.save(tmp_path / artifact.TOPIC_EMBEDDINGS_FILE, np.zeros((2, 3), dtype=np.float32))
+
+        model = artifact.BundledTopicModel(str(tmp_path), verify=True)
+        with pytest.raises(ValueError, match=artifact.TOPIC_EMBEDDINGS_FILE):
+            model.topic_embeddings_
+        assert artifact.BundledTopicModel(str(tmp_path)).topic_embeddings_.sum() == 0
+
+    def test_refresh_bundle_follows_retrained_model(self, tmp_path, monkeypatch):
+        """An existing bundle is re-exported from a retrained model, or removed if that fails"""
+        try:
+            from model import artifact
+            from model.registry import default_version
+        except ImportError as e:
+            pytest.skip(f"Artifact import failed: {e}")
+
+        bundle_dir = tmp_path / "bundle"
+        assert not artifact.refresh_bundle(Mock(), str(bundle_dir))
+
+        bundle_dir.mkdir()
+        (bundle_dir / artifact.MANIFEST_NAME).write_text(
+            '{"embedding_model": "test-model", "files": ["%s"]}' % artifact.EMBEDDING_ONNX_DIR)
+        os.utime(bundle_dir, (0, 0))
+        before = default_version(str(bundle_dir))
+
+        exported = []
+
+        def export(model, path, name, **kwargs):
+            exported.append((name, kwargs))
+            (tmp_path / "bundle" / artifact.MANIFEST_NAME).write_text('{"embedding_model": "test-model", "files": []}')
+            os.utime(path)
+
+        monkeypatch.setattr(artifact, "export_bundle", export)
+        assert artifact.refresh_bundle(Mock(), str(bundle_dir))
+        assert exported == [("test-model", {"onnx": True})]
+        assert default_version(str(bundle_dir)) != before
+
+        # A retrained model that records its encoder keeps that name in the manifest
+        assert artifact.refresh_bundle(Mock(embedding_model_name="other-model"), str(bundle_dir))
+        assert exported[-1] == ("other-model", {"onnx": False})
+
+        monkeypatch.setattr(artifact, "export_bundle", Mock(side_effect=RuntimeError("no encoder")))
+        assert not artifact.refresh_bundle(Mock(), str(bundle_dir))
+        assert not artifact.is_bundle(str(bundle_dir))
+
+    def test_strip_training_state(self):
+        """Training-only UMAP/HDBSCAN state is dropped, state used by transform is kept"""
+        try:
+            import numpy as np
+            from types import SimpleNamespace
+            from model.convert_to_cpu import strip_training_state
+        except ImportError as e:
+            pytest.skip(f"Converter import failed: {e}")
+
+        umap_model = SimpleNamespace(graph_=np.zeros(10), _knn_indices=np.zeros((5, 2)), embedding_=np.ones(4))
+        model = SimpleNamespace(umap_model=SimpleNamespace(umap_model=umap_model),
+                                hdbscan_model=SimpleNamespace(_min_spanning_tree=np.zeros(3)))
+
+        cleared = strip_training_state(model)
+        assert cleared == {"umap.graph_": 80, "umap._knn_indices": 80, "hdbscan._min_spanning_tree": 24}
+        assert umap_model.graph_ is None and model.hdbscan_model._min_spanning_tree is None
+        assert umap_model.embedding_.tolist() == [1, 1, 1, 1]
+
+class TestIncrementalUpdate:
+    """Test folding new documents into a fitted topic model"""
+
+    def _model(self):
+        import numpy as np
+        import scipy.sparse as sp
+        from types import SimpleNamespace
+
+        vocabulary = ["data", "web", "mining", "network"]
+
+        def count(documents):
+            rows = [[document.split().count(word) for word in vocabulary] for document in documents]
+            return sp.csr_matrix(np.array(rows, dtype=np.float32))
+
+        def l1(counts):
+            counts = sp.csr_matrix(counts, dtype=np.float32)
+            return sp.diags(1 / np.maximum(np.asarray(counts.sum(axis=1)).ravel(), 1)) @ counts
+
+        return SimpleNamespace(
+            _outliers=1, top_n_words=2, topic_sizes_={-1: 1, 0: 2, 1: 2}, topics_=[-1, 0, 0, 1, 1],
+            topic_embeddings_=np.array([[0, 0, 1], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+            c_tf_idf_=l1(np.array([[0, 0, 0, 1], [2, 0, 1, 0], [0, 2, 0, 0]])),
+            topic_representations_={}, topic_labels_={},
+            vectorizer_model=SimpleNamespace(transform=count, get_feature_names_out=lambda: np.array(vocabulary)),
+            ctfidf_model=SimpleNamespace(transform=l1), _preprocess_text=lambda documents: [str(d).lower() for d in documents],
+        )
+
+    def test_update_touches_only_affected_topics(self):
+        """New documents update counts, c-TF-IDF rows, words, sizes and embeddings of their topics only"""
+        try:
+            import numpy as np
+            from model import incremental
+        except ImportError as e:
+            pytest.skip(f"Incremental import failed: {e}")
+
+        model = self._model()
+        texts = ["network", "data mining", "data", "web", "web"]
+        embeddings = np.array([[0, 0, 1], [1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 0]], dtype=np.float32)
+        incremental.init_incremental_state(model, texts, model.topics_, embeddings)
+        assert model.incremental_state_["outlier_ratio"] == pytest.approx(0.2)
+        assert model.topic_term_counts_.toarray()[1].tolist() == [2, 0, 1, 0]
+
+        web_row = model.c_tf_idf_.toarray()[2].copy()
+        model.transform = lambda documents, embeddings=None: ([0] * len(documents), None)
+        new_texts = incremental.new_documents(model, ["data", "mining mining", "mining mining"])
+        assert new_texts == ["mining mining"]
+
+        result = incremental.update_topic_model(model, new_texts, np.array([[0.96, 0.28, 0]], dtype=np.float32))
+        assert result["refit"] is None and result["topics_updated"] == 1
+        assert model.topic_term_counts_.toarray()[1].tolist() == [2, 0, 3, 0]
+        assert model.topic_representations_[0][0][0] == "mining"
+        assert model.topic_labels_[0] == "0_mining_data"
+        assert model.topic_sizes_ == {-1: 1, 0: 3, 1: 2}
+        assert model.topic_embeddings_[1].tolist() == pytest.approx([2.96 / 3, 0.28 / 3, 0])
+        assert model.c_tf_idf_.toarray()[2].tolist() == web_row.tolist()
+        assert len(model.document_hashes_) == 6 and model.incremental_state_["added_documents"] == 1
+
+    def test_model_without_outlier_topic(self):
+        """Outliers returned by transform are skipped when the model has no outlier row"""
+        try:
+            import numpy as np
+            from model import incremental
+        except ImportError as e:
+            pytest.skip(f"Incremental import failed: {e}")
+
+        model = self._model()
+        model._outliers = 0
+        model.topic_sizes_ = {0: 2, 1: 2}
+        model.topics_ = [0, 0, 1, 1]
+        model.topic_embeddings_ = model.topic_embeddings_[1:]
+        model.c_tf_idf_ = model.c_tf_idf_[1:]
+        embeddings = np.array([[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 0]], dtype=np.float32)
+        incremental.init_incremental_state(model, ["data mining", "data", "web", "web"], model.topics_, embeddings)
+        assert model.topic_term_counts_.toarray().tolist() == [[2, 0, 1, 0], [0, 2, 0, 0]]
+
+        model.transform = lambda documents, embeddings=None: ([-1, 0], None)
+        result = incremental.update_topic_model(model, ["network", "mining"],
+                                                np.array([[0, 0, 1], [1, 0, 0]], dtype=np.float32), force=True)
+        assert result["topics_updated"] == 1
+        assert model.topic_term_counts_.toarray().tolist() == [[2, 0, 2, 0], [0, 2, 0, 0]]
+        assert model.topic_sizes_ == {0: 3, 1: 2}
+        assert model.topics_[-2:] == [-1, 0]
+
+    def test_drift_thresholds_request_full_refit(self):
+        """Outlier spikes, similarity drops and corpus growth call for a full refit"""
+        try:
+            from model import incremental
+        except ImportError as e:
+            pytest.skip(f"Incremental import failed: {e}")
+
+        state = {"base_documents": 100, "added_documents": 0, "outlier_ratio": 0.3, "topic_similarity": 0.6}
+        assert incremental.refit_reason(state, 10, 0.35, 0.58) is None
+        assert "outlier" in incremental.refit_reason(state, 10, 0.6, 0.58)
+        assert "similarity" in incremental.refit_reason(state, 10, 0.3, 0.4)
+        assert "grew" in incremental.refit_reason(dict(state, added_documents=45), 10, 0.3, 0.6)
+
+    def test_installed_model_reaches_bundle_serving(self, tmp_path, monkeypatch):
+        """After install_model the served artifact is the new model, also when a bundle is deployed"""
+        try:
+            from model import artifact, predict, retrain_model
+        except ImportError as e:
+            pytest.skip(f"Retrain import failed: {e}")
+
+        bundle_dir = tmp_path / "bundle"
+        bundle_dir.mkdir()
+        (bundle_dir / artifact.MANIFEST_NAME).write_text('{"embedding_model": "test-model", "files": []}')
+        os.utime(bundle_dir, (0, 0))
+        for name, value in {"MODEL_PATH": "retrained.pkl", "ORIGINAL_MODEL_PATH": "model.pkl",
+                            "BACKUP_PATH": "backup.pkl"}.items():
+            monkeypatch.setattr(retrain_model, name, str(tmp_path / value))
+        monkeypatch.setattr(predict, "MODEL_BUNDLE_DIR", str(bundle_dir))
+        monkeypatch.setattr(predict, "MODEL_PATH", str(tmp_path / "model.pkl"))
+        fake_joblib = Mock(dump=lambda model, path: open(path, "w").close(),
+                           load=lambda path: Mock(transform=lambda texts: ([0], None)))
+        monkeypatch.setattr(retrain_model, "joblib", fake_joblib)
+
+        before = predict.default_version(predict.default_model_path())
+        exported = []
+        monkeypatch.setattr(artifact, "export_bundle", lambda model, path, name, **kwargs: exported.append(name))
+        retrain_model.install_model(Mock())
+        assert exported == ["test-model"]
+
+        # A failed re-export removes the stale bundle so the new pickle is served
+        monkeypatch.setattr(artifact, "export_bundle", Mock(side_effect=RuntimeError("no encoder")))
+        retrain_model.install_model(Mock())
+        assert predict.default_model_path() == str(tmp_path / "model.pkl")
+        assert predict.default_version(predict.default_model_path()) != before
+
+class TestModelRegistry:
+    """Test versioned model slots and hot swapping"""
+
+    def test_swap_and_rollback(self):
+        """A warmed model is swapped in atomically and the previous one can be restored"""
+        from model.registry import ModelRegistry
+
+        def loader(path):
+            if path == "broken":
+                raise ValueError("corrupt artifact")
+            return f"model:{path}"
+
+        warmed = []
+        registry = ModelRegistry(loader, lambda model: f"labels:{model}", warmup=warmed.append)
+        registry.load("v1", version="v1")
+        assert registry.active_version == "v1"
+
+        registry.load_async("v2", version="v2")
+        registry.wait(5)
+        assert registry.active_version == "v2"
+        assert registry.active.labels == "labels:model:v2"
+        assert warmed == ["model:v1", "model:v2"]
+
+        # A failing load keeps serving the current version
+        registry.load_async("broken", version="v3")
+        registry.wait(5)
+        assert registry.active_version == "v2"
+        assert "corrupt artifact" in registry.status()["last_error"]
+
+        assert registry.rollback().version == "v1"
+        with pytest.raises(LookupError):
+            registry.rollback()
+
+    def test_slot_records_encoder_of_each_version(self):
+        """A hot swap to a model with another encoder switches the embedding cache namespace with it"""
+        from types import SimpleNamespace
+        from model.embedding_cache import encoder_name
+        from model.registry import ModelRegistry
+
+        models = {"v1": SimpleNamespace(embedding_model_name="encoder-a"),
+                  "v2": SimpleNamespace(embedding_model_name="encoder-b")}
+        registry = ModelRegistry(models.get, lambda model: None, encoder_resolver=encoder_name)
+        registry.load("v1", version="v1")
+        assert registry.active.encoder == "encoder-a"
+
+        registry.load("v2", version="v2")
+        assert registry.active.encoder == "encoder-b"
+        assert registry.status()["slots"][-1]["encoder"] == "encoder-b"
+        assert registry.rollback().encoder == "encoder-a"
+
+    def test_swap_listeners_follow_loads_and_rollbacks(self):
+        """Listeners see every newly active slot; a failing listener does not undo the swap"""
+        from model.registry import ModelRegistry
+
+        registry = ModelRegistry(lambda path: f"model:{path}", lambda model: None)
+        swapped = []
+        registry.add_swap_listener(lambda slot: swapped.append(slot.version))
+        registry.add_swap_listener(Mock(side_effect=RuntimeError("fork failed")))
+        registry.load("v1", version="v1")
+        registry.install("model:v2", "v2")
+        registry.rollback()
+        assert swapped == ["v1", "v2", "v1"]
+        assert registry.active_version == "v1"
+
 class TestMLflowDriftMonitor:
     """Test MLflow drift monitoring functionality"""
     
@@ -150,5 +1188,215 @@ class TestPreprocessing:
         except ImportError as e:
             pytest.skip(f"Preprocessing test failed: {e}")
 
+    @patch('preprocessing.text_cleaning.get_stopwords', return_value=frozenset({'dan', 'ini', 'untuk'}))
+    def test_clean_series_matches_clean_text(self, mock_stopwords):
+        """Vectorized cleaning gives the same output as the scalar cleaner"""
+        import pandas as pd
+        from preprocessing.text_cleaning import clean_text, clean_series, remove_first_word, remove_first_word_series
+
+        titles = pd.Series([
+            "Ini Sistem 2024: Deteksi, dan Klasifikasi!!",
+            "  Rancang   Bangun Aplikasi untuk UMKM  ",
+            None,
+            "Satu",
+        ])
+        expected = titles.apply(clean_text)
+        cleaned = clean_series(titles)
+
+        assert cleaned.tolist() == expected.tolist()
+        assert cleaned.tolist()[0] == "sistem deteksi klasifikasi"
+        assert remove_first_word_series(cleaned).tolist() == [remove_first_word(t) for t in expected]
+
+    @patch('preprocessing.text_cleaning.get_stopwords', return_value=frozenset({'dan'}))
+    def test_streaming_preprocess_matches_in_memory(self, mock_stopwords, tmp_path):
+        """Chunked streaming output equals cleaning and deduplicating the whole frame"""
+        import io
+        import json
+        import pandas as pd
+        from preprocessing.streaming import clean_chunk, iter_json_array, preprocess_stream
+
+        records = [
+            {"title": f"{i}. Analisis Sistem {i % 5} dan Data", "abstract": "Abstrak\n baris 1", "issue ID": i}
+            for i in range(40)
+        ] + [{"title": "Halaman Sampul", "abstract": "", "issue ID": 99}]
+        source = tmp_path / "raw.json"
+        source.write_text(json.dumps(records, indent=2), encoding="utf-8")
+
+        expected = clean_chunk(pd.DataFrame(records)).drop_duplicates(subset=['title'])
+        expected = json.loads(expected.to_json(orient='records', force_ascii=False))
+
+        stats = preprocess_stream(str(source), str(tmp_path / "out.json"), chunk_size=7)
+        assert json.loads((tmp_path / "out.json").read_text(encoding="utf-8")) == expected
+        assert stats == {"read": 41, "written": len(expected), "noise": 1, "duplicates": 40 - len(expected)}
+
+        ndjson_source = tmp_path / "raw.ndjson"
+        ndjson_source.write_text("\n".join(json.dumps(r) for r in records), encoding="utf-8")
+        preprocess_stream(str(ndjson_source), str(tmp_path / "out.ndjson"), chunk_size=3)
+        lines = (tmp_path / "out.ndjson").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == expected
+
+        try:
+            from preprocessing.storage import read_records
+            preprocess_stream(str(ndjson_source), str(tmp_path / "out.parquet"), chunk_size=4)
+            assert read_records(str(tmp_path / "out.parquet")) == expected
+        except ImportError:
+            pass
+
+        # One worker pool serves every chunk and column of a run
+        from multiprocessing import Pool
+        from preprocessing import streaming
+        with patch.object(streaming, "Pool", side_effect=Pool) as pool:
+            preprocess_stream(str(source), str(tmp_path / "pooled.json"), chunk_size=7, workers=2)
+        assert pool.call_count == 1
+        assert json.loads((tmp_path / "pooled.json").read_text(encoding="utf-8")) == expected
+
+        # A failing run leaves neither the output nor its temporary file behind
+        broken = tmp_path / "broken.ndjson"
+        broken.write_text(json.dumps(records[0]) + "\n{not json\n", encoding="utf-8")
+        with pytest.raises(ValueError):
+            preprocess_stream(str(broken), str(tmp_path / "failed.json"), chunk_size=1)
+        assert not (tmp_path / "failed.json").exists()
+        assert not (tmp_path / "failed.json.tmp").exists()
+
+        text = json.dumps([{"a": 1}, 12.5e-3, "x"])
+        assert list(iter_json_array(io.StringIO(text), read_size=2)) == [{"a": 1}, 12.5e-3, "x"]
+
+class TestEmbeddingGeneration:
+    """Test the resumable batch embedding script"""
+
+    def _fake_model(self, encoded, fail_after=None):
+        import numpy as np
+
+        class FakeModel:
+            def __init__(self, name, device=None):
+                pass
+
+            def get_sentence_embedding_dimension(self):
+                return 2
+
+            def encode(self, docs, batch_size=None, convert_to_numpy=True):
+                if fail_after is not None and len(encoded) >= fail_after:
+                    raise KeyboardInterrupt
+                encoded.extend(docs)
+                return np.array([[len(doc), sum(map(ord, doc))] for doc in docs], dtype=np.float32)
+
+        return FakeModel
+
+    def test_resume_matches_full_run(self, tmp_path, monkeypatch):
+        """An interrupted run resumes after its last chunk; changed input starts over"""
+        try:
+            import types
+            import numpy as np
+            from preprocessing import embedding
+        except ImportError as e:
+            pytest.skip(f"Embedding import failed: {e}")
+
+        monkeypatch.setattr(embedding, "cached_encode", lambda name, texts, encode_fn: encode_fn(list(texts)))
+        texts = [f"judul {i}" * (i + 1) for i in range(10)]
+
+        def run(directory, encoded, fail_after=None, data=texts):
+            module = types.SimpleNamespace(SentenceTransformer=self._fake_model(encoded, fail_after))
+            monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+            paths = embedding.encode_dataset(data, output_dir=str(directory), chunk_size=4)
+            return np.load(paths["embeddings"])
+
+        full = run(tmp_path / "full", [])
+
+        encoded = []
+        with pytest.raises(KeyboardInterrupt):
+            run(tmp_path / "resumed", encoded, fail_after=4)
+        assert encoded == texts[:4]
+        encoded.clear()
+        resumed = run(tmp_path / "resumed", encoded)
+        assert encoded == texts[4:]
+        assert np.array_equal(resumed, full)
+
+        # Same row count, different order: stale rows must not be reused
+        encoded.clear()
+        reordered = run(tmp_path / "resumed", encoded, data=texts[::-1])
+        assert encoded == texts[::-1]
+        assert np.array_equal(reordered, full[::-1])
+
+class TestCrawlState:
+    """Test the incremental scraping state store"""
+
+    def test_tracks_issues_and_article_validators(self, tmp_path):
+        """Issues and article validators persist across store instances"""
+        from preprocessing.crawl_state import CrawlStateStore, content_hash
+
+        path = str(tmp_path / "state.sqlite")
+        with CrawlStateStore(path) as state:
+            state.mark_issue(40, 12)
+            state.mark_issue(41, 10)
+            state.save_article("https://example.org/a/1", 41, etag='"abc"', content_hash="h1")
+            state.save_article("https://example.org/a/1", 41, last_modified="Tue, 01 Jul 2025 00:00:00 GMT")
+
+        with CrawlStateStore(path) as state:
+            assert state.crawled_issue_ids() == {40, 41}
+            assert state.latest_crawled_issue() == 41
+            article = state.get_article("https://example.org/a/1")
+            assert article["etag"] == '"abc"'
+            assert article["last_modified"].startswith("Tue")
+            assert article["content_hash"] == "h1"
+            assert state.get_article("https://example.org/a/2") is None
+
+        record = {"title": "judul", "abstract": "abstrak", "authors": ["A"], "year": 2024}
+        assert content_hash(record) == content_hash(dict(record, doi="ignored"))
+        assert content_hash(record) != content_hash(dict(record, abstract="berubah"))
+
+    def test_state_is_checked_against_stored_dataset(self, tmp_path):
+        """Issues and articles missing from the raw dataset are crawled again in full"""
+        from preprocessing.crawl_state import CrawlStateStore, merge_records, record_key, stored_issue_ids
+
+        # A non-incremental run overwrote the dataset with issue 40 only
+        kept = {"issue ID": 40, "title": "a", "abstract": "abstrak a", "doi": "https://example.org/a/1"}
+        existing = [kept, {"Issue ID": 42, "Judul": "Gagal crawling"}]
+        stored_keys = {record_key(record) for record in existing}
+        assert stored_issue_ids(existing) == {40}
+
+        with CrawlStateStore(str(tmp_path / "state.sqlite")) as state:
+            for issue_id, count in ((40, 1), (41, 1), (42, 0)):
+                state.mark_issue(issue_id, count)
+            assert state.crawled_issue_ids(stored_issue_ids(existing)) == {40, 42}
+
+            lost = {"issue ID": 41, "title": "b", "abstract": "", "doi": "https://example.org/a/2"}
+            fresh = dict(kept, abstract="")
+            for record in (fresh, lost):
+                state.save_article(record["doi"], record["issue ID"], etag='"e"', content_hash="h")
+            pending = [(fresh, fresh["doi"]), (lost, lost["doi"])]
+            known = state.known_validators(pending, stored_keys)
+            assert known[0]["etag"] == '"e"' and known[1] == {}
+
+            unchanged, failed_issues = state.apply_fetch_results(pending, known, [None, None], stored_keys)
+            assert unchanged == {id(fresh)} and not failed_issues
+
+        merged, changed = merge_records(existing, [fresh, lost], unchanged)
+        assert changed == 1
+        assert {record.get("doi") for record in merged} == {kept["doi"], lost["doi"], None}
+
+    def test_failed_fetch_keeps_stored_abstract(self, tmp_path):
+        """A failed abstract fetch leaves the stored row and the issue unmarked"""
+        from preprocessing.crawl_state import CrawlStateStore, merge_records
+
+        stored = {"issue ID": 41, "title": "judul", "abstract": "abstrak lama", "doi": "https://example.org/a/1"}
+        fresh = {"issue ID": 41, "title": "judul", "abstract": "", "doi": "https://example.org/a/1"}
+        added = {"issue ID": 41, "title": "baru", "abstract": "", "doi": "https://example.org/a/2"}
+        pending = [(fresh, fresh["doi"]), (added, added["doi"])]
+        fetched = [
+            {"abstract": None, "etag": None, "last_modified": None},
+            {"abstract": "abstrak baru", "etag": '"x"', "last_modified": None},
+        ]
+
+        with CrawlStateStore(str(tmp_path / "state.sqlite")) as state:
+            unchanged, failed_issues = state.apply_fetch_results(pending, [{}, {}], fetched)
+            assert failed_issues == {41}
+            assert state.get_article(fresh["doi"]) is None
+            assert state.get_article(added["doi"])["etag"] == '"x"'
+
+        merged, changed = merge_records([stored], [fresh, added], unchanged)
+        assert changed == 1
+        by_doi = {record["doi"]: record["abstract"] for record in merged}
+        assert by_doi == {"https://example.org/a/1": "abstrak lama", "https://example.org/a/2": "abstrak baru"}
+
 if __name__ == "__main__":
     pytest.main([__file__])